@@ -0,0 +1,106 @@
+"""Step time and peak memory of the attention modes (joint, time, axial) against the window length, and their MAPE.
+
+Every (mode, sequence length) runs in a new process on synthetic windows, so the peak RSS is that of the one model only.
+With --output-dir (the prepared data of python -m eth_forecast prepare) every mode is also trained for --epochs on the
+prepared train split and its test MAPE is compared with the joint mode.
+Run from the repository root with: python -m benchmarks.attention --sequence-lengths 42 84 168 --small
+"""
+import argparse
+import multiprocessing
+import time
+
+import numpy as np
+
+MODES = ('joint', 'time', 'axial')
+
+
+def measureSteps(mode, sequence_length, week_length, batch_size, steps, seed, model_kwargs):
+  #runs in its own process, returns (train step ms, predict step ms, peak rss in MB)
+  import tensorflow as tf
+  from eth_forecast.cli import compileModel
+  from eth_forecast.model import Transformer
+  from eth_forecast.resources import peakRss
+
+  tf.keras.utils.set_random_seed(seed)
+  rng = np.random.default_rng(seed)
+  window_length = sequence_length + week_length
+  inputs = (rng.normal(size=(batch_size, window_length, 5)).astype(np.float32), rng.normal(size=(batch_size, window_length, 5)).astype(np.float32),
+            rng.normal(size=(batch_size, 7, 1)).astype(np.float32))
+  target = rng.normal(size=(batch_size, 7)).astype(np.float32)
+  model = Transformer(batch_size=batch_size, time_table=True, sequence_length=sequence_length, week_length=week_length, attention_mode=mode,
+                      **model_kwargs)
+  compileModel(model)
+  #first calls trace the functions, they are not timed
+  model.train_on_batch(inputs, target)
+  model.predict_on_batch(inputs)
+  start = time.perf_counter()
+  for _ in range(steps):
+    model.train_on_batch(inputs, target)
+  train_ms = 1000*(time.perf_counter() - start)/steps
+  start = time.perf_counter()
+  for _ in range(steps):
+    model.predict_on_batch(inputs)
+  predict_ms = 1000*(time.perf_counter() - start)/steps
+  return train_ms, predict_ms, peakRss()
+
+def benchmarkAttention(sequence_lengths=(42, 84, 168), week_length=8, batch_size=16, steps=5, seed=0, modes=MODES, **model_kwargs):
+  results = {}
+  context = multiprocessing.get_context('spawn')
+  for sequence_length in sequence_lengths:
+    for mode in modes:
+      with context.Pool(1) as pool:
+        train_ms, predict_ms, peak_rss = pool.apply(measureSteps, (mode, sequence_length, week_length, batch_size, steps, seed, model_kwargs))
+      results[(mode, sequence_length)] = {'train_step_ms': train_ms, 'predict_step_ms': predict_ms, 'peak_rss_mb': peak_rss}
+      print("%-5s sequence_length=%-4d train step %8.1f ms  predict step %8.1f ms  peak rss %6.0f MB" % (mode, sequence_length, train_ms,
+                                                                                                         predict_ms, peak_rss))
+  return results
+
+def trainAndEvaluate(output_dir, mode, epochs, batch_size, seed):
+  #runs in its own process, trains the model config of output_dir with the attention mode, returns the test mape (scaled values, as predict)
+  import tensorflow as tf
+  from eth_forecast.cli import ASSETS, compileModel, createModel, loadConfig, loadPreparedArrays
+  from eth_forecast.pipeline import createTrainDataset
+
+  tf.keras.utils.set_random_seed(seed)
+  config = loadConfig(output_dir)
+  arrays = loadPreparedArrays(output_dir)
+  assets = config.get('assets', ASSETS)
+  asset_series = [(arrays[asset + '_daily_train'], arrays[asset + '_weekly_train']) for asset in assets]
+  train_dataset, _ = createTrainDataset(asset_series, config['sequence_length'], config['week_length'], batch_size, validation_split=0.0,
+                                        seed=seed, time_column=False)
+  model = createModel(config, batch_size=batch_size, attention_mode=mode)
+  compileModel(model)
+  start = time.perf_counter()
+  model.fit(train_dataset, epochs=epochs, verbose=0)
+  seconds = time.perf_counter() - start
+  predictions = model.forecast(tuple(arrays[asset + '_test_windows'] for asset in assets) + (arrays['decoder_test'],), horizon=7)
+  target = arrays['target_test']
+  return float(100*np.mean(np.abs(target - predictions)/np.maximum(np.abs(target), 1e-7))), seconds
+
+def compareMape(output_dir, epochs=5, batch_size=16, seed=0, modes=MODES):
+  results = {}
+  context = multiprocessing.get_context('spawn')
+  for mode in modes:
+    with context.Pool(1) as pool:
+      mape, seconds = pool.apply(trainAndEvaluate, (output_dir, mode, epochs, batch_size, seed))
+    results[mode] = {'mape': mape, 'train_seconds': seconds}
+    reference = results[modes[0]]['mape']
+    print("%-5s test mape %.3f (%+.3f against %s), trained in %.0fs" % (mode, mape, mape - reference, modes[0], seconds))
+  return results
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--sequence-lengths', type=int, nargs='+', default=[42, 84, 168])
+  parser.add_argument('--week-length', type=int, default=8)
+  parser.add_argument('--batch-size', type=int, default=16)
+  parser.add_argument('--steps', type=int, default=5)
+  parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+  parser.add_argument('--small', action='store_true', help="a small Transformer (1 encoder/decoder, 2 heads of 8) for a quick run")
+  parser.add_argument('--output-dir', default=None, help="prepared data, to also compare the test mape of the modes")
+  parser.add_argument('--epochs', type=int, default=5, help="epochs of the mape comparison")
+  args = parser.parse_args()
+
+  model_kwargs = dict(encoder_number=1, decoder_number=1, amount_of_heads=2, size_of_head=8) if args.small else {}
+  benchmarkAttention(args.sequence_lengths, args.week_length, args.batch_size, args.steps, modes=tuple(args.modes), **model_kwargs)
+  if args.output_dir:
+    compareMape(args.output_dir, args.epochs, args.batch_size, modes=tuple(args.modes))
@@ -0,0 +1,75 @@
+"""Latency and MAPE of the autoregressive against the direct (all days in one pass) decoding of the 7 day forecast.
+
+Every mode is trained in a new process for --epochs on the prepared train split of --output-dir (the output of
+python -m eth_forecast prepare, nothing in it is overwritten), then the test set is forecast with model.forecast and
+single windows with the compiled forecast graph (forecastFunction, as the service and the inference export run it).
+Run from the repository root with: python -m benchmarks.decoding --output-dir artifacts --epochs 5
+"""
+import argparse
+import multiprocessing
+import time
+
+import numpy as np
+
+MODES = ('autoregressive', 'direct')
+
+
+def trainAndMeasure(output_dir, mode, epochs, batch_size, repeats, seed):
+  #runs in its own process, returns {test mape, train seconds, forecast ms of the test set and of a single window}
+  import tensorflow as tf
+  from eth_forecast.cli import ASSETS, compileModel, createModel, loadConfig, loadPreparedArrays
+  from eth_forecast.pipeline import createTrainDataset
+
+  tf.keras.utils.set_random_seed(seed)
+  config = loadConfig(output_dir)
+  arrays = loadPreparedArrays(output_dir)
+  assets = config.get('assets', ASSETS)
+  asset_series = [(arrays[asset + '_daily_train'], arrays[asset + '_weekly_train']) for asset in assets]
+  train_dataset, _ = createTrainDataset(asset_series, config['sequence_length'], config['week_length'], batch_size, validation_split=0.0,
+                                        seed=seed, time_column=False, decoding=mode)
+  model = createModel(config, batch_size=batch_size, decoding=mode)
+  compileModel(model)
+  start = time.perf_counter()
+  model.fit(train_dataset, epochs=epochs, verbose=0)
+  train_seconds = time.perf_counter() - start
+
+  test_inputs = tuple(np.asarray(arrays[asset + '_test_windows'], np.float32) for asset in assets) + (np.asarray(arrays['decoder_test'], np.float32),)
+  start = time.perf_counter()
+  predictions = model.forecast(test_inputs, horizon=7, batch_size=64)
+  test_set_ms = 1000*(time.perf_counter() - start)
+  target = arrays['target_test']
+  mape = float(100*np.mean(np.abs(target - predictions)/np.maximum(np.abs(target), 1e-7)))
+
+  forecast = model.forecastFunction(7)
+  single = [tf.constant(values[:1]) for values in test_inputs]
+  #the first call traces the graph, it is not timed
+  forecast(*single)
+  seconds = []
+  for _ in range(repeats):
+    start = time.perf_counter()
+    forecast(*single).numpy()
+    seconds.append(time.perf_counter() - start)
+  return {'mape': mape, 'train_seconds': train_seconds, 'test_set_ms': test_set_ms, 'single_window_ms': 1000*float(np.median(seconds))}
+
+def benchmarkDecoding(output_dir, epochs=5, batch_size=16, repeats=50, seed=0, modes=MODES):
+  results = {}
+  context = multiprocessing.get_context('spawn')
+  for mode in modes:
+    with context.Pool(1) as pool:
+      results[mode] = pool.apply(trainAndMeasure, (output_dir, mode, epochs, batch_size, repeats, seed))
+    result, reference = results[mode], results[modes[0]]
+    print("%-14s test mape %.3f (%+.3f against %s), single window %6.2f ms (x%.2f), test set %7.1f ms, trained in %.0fs" % (
+          mode, result['mape'], result['mape'] - reference['mape'], modes[0], result['single_window_ms'],
+          reference['single_window_ms']/result['single_window_ms'], result['test_set_ms'], result['train_seconds']))
+  return results
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--output-dir', default='artifacts', help="output directory of prepare (its config and cache entry are used)")
+  parser.add_argument('--epochs', type=int, default=5)
+  parser.add_argument('--batch-size', type=int, default=16)
+  parser.add_argument('--repeats', type=int, default=50, help="single window forecasts to take the median latency of")
+  parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args()
+  benchmarkDecoding(args.output_dir, args.epochs, args.batch_size, args.repeats, args.seed, tuple(args.modes))
@@ -0,0 +1,51 @@
+"""CPU benchmark of the TimeDistributed feed forward path against the fused path, with and without XLA.
+
+Run from the repository root with: python -m benchmarks.feed_forward
+"""
+import time
+
+import numpy as np
+import tensorflow as tf
+from keras.optimizers import Adam
+
+from eth_forecast.model import CustomLearningRateSchedule, Transformer
+
+def benchmarkFeedForward(batch_size=16, steps=20, seed=0, **model_kwargs):
+  #cpu benchmark of the old TimeDistributed feed forward path against the fused path, with and without XLA
+  #all variants get the same weights, the outputs are compared before the train steps change them
+  #model_kwargs are passed to Transformer, e.g. a smaller amount_of_heads for a quick run
+  rng = np.random.default_rng(seed)
+  inputs = (rng.normal(size=(batch_size, 50, 6)).astype(np.float32), rng.normal(size=(batch_size, 50, 6)).astype(np.float32),
+            rng.normal(size=(batch_size, 7, 2)).astype(np.float32))
+  target = rng.normal(size=(batch_size, 7)).astype(np.float32)
+  variants = [('timedistributed', False, False), ('fused', True, False), ('fused_xla', True, True)]
+  reference_weights, reference_output, results = None, None, {}
+  for name, fused_ffn, jit_compile in variants:
+    tf.random.set_seed(seed)
+    benchmark_model = Transformer(batch_size=batch_size, fused_ffn=fused_ffn, **model_kwargs)
+    benchmark_model.compile(loss='mse', optimizer=Adam(learning_rate = CustomLearningRateSchedule(), epsilon=1e-9, beta_2 = 0.98), jit_compile=jit_compile)
+    benchmark_model(inputs)
+    if reference_weights is None:
+      reference_weights = benchmark_model.get_weights()
+    benchmark_model.set_weights(reference_weights)
+    output = benchmark_model.predict_on_batch(inputs)
+    if reference_output is None:
+      reference_output = output
+    #first calls trace (and compile) the functions, they are not timed
+    benchmark_model.train_on_batch(inputs, target)
+    start = time.perf_counter()
+    for _ in range(steps):
+      benchmark_model.predict_on_batch(inputs)
+    predict_time = (time.perf_counter()-start)/steps
+    start = time.perf_counter()
+    for _ in range(steps):
+      benchmark_model.train_on_batch(inputs, target)
+    train_time = (time.perf_counter()-start)/steps
+    results[name] = {'train_step_ms': 1000*train_time, 'predict_step_ms': 1000*predict_time,
+                     'max_abs_difference': float(np.max(np.abs(output-reference_output)))}
+    print(name, results[name])
+  return results
+
+
+if __name__ == '__main__':
+  benchmarkFeedForward()
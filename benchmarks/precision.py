@@ -0,0 +1,51 @@
+"""CPU benchmark of the float32 Transformer against the mixed_float16 and mixed_bfloat16 policies.
+
+Run from the repository root with: python -m benchmarks.precision
+"""
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from eth_forecast.cli import compileModel
+from eth_forecast.model import Transformer
+from eth_forecast.resources import peakRss
+
+def benchmarkPrecision(batch_size=16, steps=20, seed=0, **model_kwargs):
+  #train and predict step time per precision, with the deviation of the outputs from float32 (same weights) as the accuracy loss
+  #the peak rss only grows, it is the peak up to and including that precision
+  rng = np.random.default_rng(seed)
+  inputs = (rng.normal(size=(batch_size, 50, 6)).astype(np.float32), rng.normal(size=(batch_size, 50, 6)).astype(np.float32),
+            rng.normal(size=(batch_size, 7, 2)).astype(np.float32))
+  target = rng.normal(size=(batch_size, 7)).astype(np.float32)
+  reference_weights, reference_output, results = None, None, {}
+  for precision in ('float32', 'mixed_float16', 'mixed_bfloat16'):
+    tf.random.set_seed(seed)
+    benchmark_model = Transformer(batch_size=batch_size, precision=precision, **model_kwargs)
+    compileModel(benchmark_model)
+    benchmark_model(inputs)
+    if reference_weights is None:
+      reference_weights = benchmark_model.get_weights()
+    benchmark_model.set_weights(reference_weights)
+    output = benchmark_model.predict_on_batch(inputs)
+    if reference_output is None:
+      reference_output = output
+    #first calls trace the functions, they are not timed
+    benchmark_model.train_on_batch(inputs, target)
+    start = time.perf_counter()
+    for _ in range(steps):
+      benchmark_model.predict_on_batch(inputs)
+    predict_time = (time.perf_counter()-start)/steps
+    start = time.perf_counter()
+    for _ in range(steps):
+      benchmark_model.train_on_batch(inputs, target)
+    train_time = (time.perf_counter()-start)/steps
+    results[precision] = {'train_step_ms': 1000*train_time, 'predict_step_ms': 1000*predict_time,
+                          'mape_vs_float32': float(100*np.mean(np.abs(output-reference_output)/np.maximum(np.abs(reference_output), 1e-7))),
+                          'peak_rss_mb': peakRss()}
+    print(precision, results[precision])
+  return results
+
+
+if __name__ == '__main__':
+  benchmarkPrecision()
@@ -0,0 +1,53 @@
+"""Scaling efficiency of the data-parallel cpu training (train --workers) from 1 to N local worker processes.
+
+Trains the prepared data of --output-dir (its config and cache entry, nothing in it is overwritten) with 1..N workers and the
+same global batch size, the throughput is the samples/sec of the last epoch (without the tracing of the first one) of the chief.
+The efficiency of N workers is their throughput divided by N times the throughput of one worker.
+Run from the repository root with: python -m benchmarks.scaling --output-dir artifacts --workers 1 2 4 8
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+from eth_forecast.cli import CONFIG_FILE
+from eth_forecast.cluster import runCluster
+
+
+def measureWorkers(output_dir, workers, epochs=2, batch_size=64, seed=0):
+  #returns the samples/sec of the last epoch with workers processes
+  run_dir = tempfile.mkdtemp()
+  try:
+    shutil.copy(os.path.join(output_dir, CONFIG_FILE), run_dir)
+    log_dir = os.path.join(run_dir, "logs")
+    argv = ['--output-dir', run_dir, 'train', '--epochs', str(epochs), '--batch-size', str(batch_size), '--workers', str(workers),
+            '--seed', str(seed), '--log-dir', log_dir]
+    code = runCluster(workers, argv)
+    if code != 0:
+      raise RuntimeError("training with %d workers failed with exit code %d" % (workers, code))
+    with open(os.path.join(log_dir, "metrics.jsonl")) as metrics_file:
+      records = [json.loads(line) for line in metrics_file]
+    return records[-1]['samples/sec'], records[-1]['val_loss']
+  finally:
+    shutil.rmtree(run_dir, ignore_errors=True)
+
+def benchmarkScaling(output_dir, worker_counts=(1, 2, 4), epochs=2, batch_size=64, seed=0):
+  #the efficiency is against the throughput per worker of the first (smallest) amount of workers
+  results, per_worker = {}, None
+  for workers in worker_counts:
+    samples_per_second, val_loss = measureWorkers(output_dir, workers, epochs, batch_size, seed)
+    per_worker = per_worker or samples_per_second/workers
+    results[workers] = {'samples/sec': samples_per_second, 'efficiency': samples_per_second/(per_worker*workers), 'val_loss': val_loss}
+    print("%2d workers: %8.1f samples/sec, efficiency %.2f, val_loss %.4f" % (workers, samples_per_second, results[workers]['efficiency'], val_loss))
+  return results
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--output-dir', default='artifacts', help="output directory of prepare (its config and cache entry are used)")
+  parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+  parser.add_argument('--epochs', type=int, default=2)
+  parser.add_argument('--batch-size', type=int, default=64, help="global batch size, split over the workers")
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args()
+  benchmarkScaling(args.output_dir, tuple(args.workers), args.epochs, args.batch_size, args.seed)
@@ -0,0 +1,60 @@
+"""Load test of the forecasting service: concurrent clients posting bars and requesting forecasts over http.
+
+Needs a trained output directory (prepare and train). Run from the repository root with:
+python -m benchmarks.service --output-dir artifacts --clients 4 --requests 200
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+from eth_forecast.service import createServer, loadService
+
+
+def request(url, body=None):
+  data = None if body is None else json.dumps(body).encode()
+  with urllib.request.urlopen(urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})) as response:
+    return json.loads(response.read())
+
+def runClient(base_url, requests, bar_every, latencies, seed):
+  #every bar_every-th request posts a new daily eth bar before forecasting
+  rng = np.random.default_rng(seed)
+  for index in range(requests):
+    if bar_every and index % bar_every == 0:
+      close = float(rng.uniform(1500, 2500))
+      request(base_url + "/bar", {'series': 'eth_daily', 'bar': [close, close*1.01, close*0.99, close, float(rng.uniform(1e9, 2e9))]})
+    start = time.perf_counter()
+    request(base_url + "/forecast")
+    latencies.append(time.perf_counter() - start)
+
+def benchmarkService(output_dir='artifacts', clients=4, requests=200, bar_every=10):
+  server = createServer(loadService(output_dir), port=0)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  base_url = "http://%s:%d" % server.server_address[:2]
+  latencies = []
+  threads = [threading.Thread(target=runClient, args=(base_url, requests, bar_every, latencies, seed)) for seed in range(clients)]
+  start = time.perf_counter()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  seconds = time.perf_counter() - start
+  server.shutdown()
+  server.server_close()
+  latencies = 1000*np.array(latencies)
+  results = {'forecasts_per_sec': len(latencies)/seconds, 'p50_ms': float(np.percentile(latencies, 50)),
+             'p99_ms': float(np.percentile(latencies, 99)), 'max_ms': float(latencies.max())}
+  print(results)
+  return results
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--output-dir', default='artifacts')
+  parser.add_argument('--clients', type=int, default=4)
+  parser.add_argument('--requests', type=int, default=200, help="forecasts per client")
+  parser.add_argument('--bar-every', type=int, default=10, help="post a new bar every this many forecasts (0 never)")
+  args = parser.parse_args()
+  benchmarkService(args.output_dir, args.clients, args.requests, args.bar_every)
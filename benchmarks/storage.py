@@ -0,0 +1,59 @@
+"""Load time and peak memory of the csv files against the columnar float32 store.
+
+Creates a synthetic OHLCV csv file of minute bars, ingests it and loads it (all rows and one month) from both formats,
+every measurement runs in a new process so the peak RSS is that of the load only.
+Run from the repository root with: python -m benchmarks.storage --rows 2000000
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from eth_forecast.data import retrieve_data
+from eth_forecast.resources import peakRss
+from eth_forecast.storage import ingestCsv
+
+
+def writeSyntheticCsv(filename, rows, seed=0):
+  import pandas as pd
+  rng = np.random.default_rng(seed)
+  close = 1000*np.exp(np.cumsum(rng.normal(0, 0.001, rows)))
+  data = pd.DataFrame({'Date': pd.date_range('2018-01-01', periods=rows, freq='min'), 'Open': close*0.999, 'High': close*1.001,
+                       'Low': close*0.998, 'Close': close, 'Adj Close': close, 'Volume': rng.uniform(1e5, 1e6, rows)})
+  data.to_csv(filename, index=False)
+
+def measureLoad(filename, start, end):
+  #runs in its own process, returns (seconds, peak rss in MB, rows)
+  begin = time.perf_counter()
+  data = retrieve_data(filename, start, end)
+  #touch every value, a memory mapped load should not win by not reading the data
+  float(np.asarray(data[:, 3], dtype=np.float64).sum())
+  seconds = time.perf_counter() - begin
+  return seconds, peakRss(), len(data)
+
+def benchmarkStorage(rows=1000000, directory=None):
+  directory = directory or tempfile.mkdtemp()
+  csv_path = os.path.join(directory, "synthetic.csv")
+  writeSyntheticCsv(csv_path, rows)
+  begin = time.perf_counter()
+  store_path = ingestCsv(csv_path, os.path.join(directory, "synthetic.ohlcv"))
+  print("ingest: %.2fs" % (time.perf_counter() - begin))
+  results = {}
+  context = multiprocessing.get_context('spawn')
+  for label, path in (('csv', csv_path), ('store', store_path)):
+    for range_label, start, end in (('all', None, None), ('one month', '2018-02-01', '2018-03-01')):
+      with context.Pool(1) as pool:
+        seconds, peak_rss, loaded_rows = pool.apply(measureLoad, (path, start, end))
+      results[(label, range_label)] = {'seconds': seconds, 'peak_rss_mb': peak_rss, 'rows': loaded_rows}
+      print("%-5s %-9s rows=%-8d %.3fs  peak rss %.0f MB" % (label, range_label, loaded_rows, seconds, peak_rss))
+  return results
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--rows', type=int, default=1000000)
+  parser.add_argument('--directory', default=None)
+  args = parser.parse_args()
+  benchmarkStorage(args.rows, args.directory)
@@ -0,0 +1,167 @@
+"""CPU benchmark suite: data preparation, the Time2Vec/Encoder/Decoder forward passes, train steps and the 7 day forecast.
+
+Runs on synthetic OHLCV series with fixed seeds, writes the results as json and compares them with a baseline json,
+a result that is more than --tolerance worse than the baseline is a regression (exit code 1).
+Run from the repository root with: python -m benchmarks.suite --output results.json --baseline baseline.json
+(--save-baseline writes the results as the new baseline)
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+
+def syntheticSeries(days, seed=0):
+  #scaled (days, 5) daily and (days//7, 5) weekly OHLCV series, like scaleAndFilterData returns them
+  rng = np.random.default_rng(seed)
+  close = np.cumsum(rng.normal(0, 0.05, days))
+  daily = np.stack([close - 0.01, close + 0.02, close - 0.02, close, rng.normal(0, 1, days)], axis=-1).astype(np.float32)
+  weekly = daily[:(days//7)*7].reshape(days//7, 7, 5).mean(axis=1)
+  return daily, weekly
+
+def medianSeconds(function, repeats=5, warmup=1):
+  for _ in range(warmup):
+    function()
+  seconds = []
+  for _ in range(repeats):
+    start = time.perf_counter()
+    function()
+    seconds.append(time.perf_counter() - start)
+  return float(np.median(seconds))
+
+def result(value, unit, better='lower'):
+  return {'value': value, 'unit': unit, 'better': better}
+
+def benchmarkDataPreparation(days, sequence_length=42, week_length=8, repeats=5, seed=0):
+  from eth_forecast.data import prepareDecoderData, prepareTargetDataY, prepareTrainDataX, shuffleLists
+  daily, weekly = syntheticSeries(days, seed)
+  eth = prepareTrainDataX(daily, weekly, sequence_length, week_length)
+  btc = prepareTrainDataX(daily, weekly, sequence_length, week_length)
+  target = prepareTargetDataY(daily, sequence_length, week_length)
+  decoder = prepareDecoderData(daily, sequence_length, week_length)
+  amount = min(len(eth), len(target), len(decoder))
+  np.random.seed(seed)
+  results = {}
+  for name, function in (('prepareTrainDataX', lambda: prepareTrainDataX(daily, weekly, sequence_length, week_length)),
+                         ('prepareDecoderData', lambda: prepareDecoderData(daily, sequence_length, week_length)),
+                         ('shuffleLists', lambda: shuffleLists(eth[:amount], btc[:amount], target[:amount], decoder[:amount]))):
+    results['data/%s/windows_per_sec' % name] = result(amount/medianSeconds(function, repeats), 'windows/s', 'higher')
+  return results
+
+def benchmarkLayers(batch_size=16, window_length=50, k=4, amount_of_heads=16, size_of_head=64, repeats=20, seed=0):
+  #forward latency of a single layer, run as a tf.function like inside model.fit
+  import tensorflow as tf
+  from eth_forecast.layers import Decoder, Encoder, Time2Vec
+  tf.keras.utils.set_random_seed(seed)
+  rng = np.random.default_rng(seed)
+  time_input = tf.constant(rng.uniform(size=(batch_size, window_length, 1)), tf.float32)
+  #the encoders see the k+1 Time2Vec features next to the 5 OHLCV features, the decoders next to the close price
+  encoder_input = tf.constant(rng.normal(size=(batch_size, window_length, k+6)), tf.float32)
+  decoder_input = tf.constant(rng.normal(size=(batch_size, 7, k+2)), tf.float32)
+  layers = {'Time2Vec': (Time2Vec(k), lambda layer: layer(time_input)),
+            'Encoder': (Encoder(0.4, amount_of_heads, size_of_head, output_dim=k+5), lambda layer: layer(encoder_input)),
+            'Decoder': (Decoder(dropout=0.4, amount_of_heads=amount_of_heads, size_of_head=size_of_head, output_dim=k+5, dim_list=[36,18,6]),
+                        lambda layer: layer((encoder_input, decoder_input)))}
+  results = {}
+  for name, (layer, call) in layers.items():
+    forward = tf.function(lambda layer=layer, call=call: call(layer))
+    seconds = medianSeconds(lambda: forward().numpy(), repeats, warmup=2)
+    results['layers/%s/forward_ms' % name] = result(1000*seconds, 'ms')
+  return results
+
+def benchmarkTrainSteps(batch_sizes=(8, 16, 32), window_length=50, steps=10, seed=0, **model_kwargs):
+  import tensorflow as tf
+  from eth_forecast.cli import compileModel
+  from eth_forecast.model import Transformer
+  results = {}
+  for batch_size in batch_sizes:
+    tf.keras.utils.set_random_seed(seed)
+    rng = np.random.default_rng(seed)
+    inputs = (rng.normal(size=(batch_size, window_length, 6)).astype(np.float32), rng.normal(size=(batch_size, window_length, 6)).astype(np.float32),
+              rng.normal(size=(batch_size, 7, 2)).astype(np.float32))
+    target = rng.normal(size=(batch_size, 7)).astype(np.float32)
+    model = Transformer(batch_size=batch_size, **model_kwargs)
+    compileModel(model)
+    seconds = medianSeconds(lambda: model.train_on_batch(inputs, target), steps, warmup=2)
+    results['train/batch_%d/samples_per_sec' % batch_size] = result(batch_size/seconds, 'samples/s', 'higher')
+  return results
+
+def benchmarkForecast(windows=256, batch_size=32, window_length=50, repeats=3, seed=0, **model_kwargs):
+  #end to end 7 day autoregressive forecast (encoders once, cached decoder steps), as predict runs it
+  import tensorflow as tf
+  from eth_forecast.model import Transformer
+  tf.keras.utils.set_random_seed(seed)
+  rng = np.random.default_rng(seed)
+  eth = rng.normal(size=(windows, window_length, 6)).astype(np.float32)
+  btc = rng.normal(size=(windows, window_length, 6)).astype(np.float32)
+  decoder_start = rng.normal(size=(windows, 1, 1)).astype(np.float32)
+  model = Transformer(**model_kwargs)
+  model((eth[:1], btc[:1], rng.normal(size=(1, 7, 2)).astype(np.float32)))
+  seconds = medianSeconds(lambda: model.forecast((eth, btc, decoder_start), horizon=7, batch_size=batch_size), repeats)
+  single_seconds = medianSeconds(lambda: model.forecast((eth[:1], btc[:1], decoder_start[:1]), horizon=7), repeats)
+  return {'forecast/batch_%d/ms_per_window' % batch_size: result(1000*seconds/windows, 'ms'),
+          'forecast/single_window/latency_ms': result(1000*single_seconds, 'ms')}
+
+def compareWithBaseline(results, baseline, tolerance=0.2):
+  #returns {name: (baseline value, value, relative change)} of the regressions, a change is positive when it is worse
+  regressions = {}
+  for name, current in results.items():
+    if name not in baseline:
+      continue
+    reference = baseline[name]['value']
+    change = (current['value'] - reference)/reference
+    if current['better'] == 'higher':
+      change = -change
+    if change > tolerance:
+      regressions[name] = (reference, current['value'], change)
+  return regressions
+
+def runSuite(days=5000, batch_sizes=(8, 16, 32), seed=0, **model_kwargs):
+  results = {}
+  results.update(benchmarkDataPreparation(days, seed=seed))
+  layer_kwargs = {name: model_kwargs[name] for name in ('k', 'amount_of_heads', 'size_of_head') if name in model_kwargs}
+  results.update(benchmarkLayers(seed=seed, **layer_kwargs))
+  results.update(benchmarkTrainSteps(batch_sizes, seed=seed, **model_kwargs))
+  results.update(benchmarkForecast(seed=seed, **model_kwargs))
+  return results
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--days', type=int, default=5000, help="length of the synthetic daily series")
+  parser.add_argument('--batch-sizes', type=int, nargs='+', default=[8, 16, 32])
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--small', action='store_true', help="a small Transformer (1 encoder/decoder, 2 heads of 8) for a quick run")
+  parser.add_argument('--output', default=None, help="json file for the results")
+  parser.add_argument('--baseline', default=None, help="json file of an earlier run to compare with")
+  parser.add_argument('--save-baseline', action='store_true', help="write the results to the --baseline file instead of comparing")
+  parser.add_argument('--tolerance', type=float, default=0.2, help="relative change that counts as a regression")
+  args = parser.parse_args()
+
+  model_kwargs = dict(encoder_number=1, decoder_number=1, amount_of_heads=2, size_of_head=8) if args.small else {}
+  results = runSuite(args.days, tuple(args.batch_sizes), args.seed, **model_kwargs)
+  import tensorflow as tf
+  report = {'meta': {'days': args.days, 'seed': args.seed, 'model': model_kwargs, 'python': platform.python_version(),
+                     'tensorflow': tf.__version__, 'machine': platform.machine(), 'processor': platform.processor()},
+            'results': results}
+  for name, values in results.items():
+    print("%-45s %12.3f %s" % (name, values['value'], values['unit']))
+  if args.output:
+    with open(args.output, 'w') as output_file:
+      json.dump(report, output_file, indent=2)
+  if args.baseline and args.save_baseline:
+    with open(args.baseline, 'w') as baseline_file:
+      json.dump(report, baseline_file, indent=2)
+  elif args.baseline:
+    with open(args.baseline) as baseline_file:
+      baseline = json.load(baseline_file)
+    if baseline['meta']['model'] != model_kwargs or baseline['meta']['days'] != args.days:
+      print("the baseline was run with other settings:", baseline['meta'])
+    regressions = compareWithBaseline(results, baseline['results'], args.tolerance)
+    for name, (reference, value, change) in regressions.items():
+      print("REGRESSION %s: %.3f -> %.3f (%.0f%% worse)" % (name, reference, value, 100*change))
+    if regressions:
+      sys.exit(1)
+    print("no regressions against", args.baseline)
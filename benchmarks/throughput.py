@@ -0,0 +1,65 @@
+"""Train throughput (samples/sec) of batch size, gradient accumulation and steps per execution configurations.
+
+Every configuration runs in a new process on synthetic windows with model.fit, the throughput is that of the second
+epoch (the first one traces the train function) and the peak RSS is that of the one configuration only.
+A configuration is batch_size[:accumulation_steps[:steps_per_execution]].
+Run from the repository root with: python -m benchmarks.throughput --configurations 16 64 256:4 256:1:8 --small
+"""
+import argparse
+import multiprocessing
+import time
+
+import numpy as np
+
+
+def parseConfiguration(text):
+  #'256:4:8' -> (256, 4, 8), the accumulation steps and steps per execution are 1 by default
+  values = [int(value) for value in text.split(":")] + [1, 1]
+  return tuple(values[:3])
+
+def measureThroughput(batch_size, accumulation_steps, steps_per_execution, samples, sequence_length, week_length, seed, model_kwargs):
+  #runs in its own process, returns (samples/sec of the second epoch, peak rss in MB)
+  import tensorflow as tf
+  from eth_forecast.cli import compileModel
+  from eth_forecast.model import Transformer
+  from eth_forecast.resources import peakRss
+
+  tf.keras.utils.set_random_seed(seed)
+  rng = np.random.default_rng(seed)
+  window_length = sequence_length + week_length
+  inputs = (rng.normal(size=(samples, window_length, 5)).astype(np.float32), rng.normal(size=(samples, window_length, 5)).astype(np.float32),
+            rng.normal(size=(samples, 7, 1)).astype(np.float32))
+  target = rng.normal(size=(samples, 7)).astype(np.float32)
+  dataset = tf.data.Dataset.from_tensor_slices((inputs, target)).batch(batch_size).prefetch(tf.data.AUTOTUNE)
+  model = Transformer(batch_size=batch_size, time_table=True, sequence_length=sequence_length, week_length=week_length, **model_kwargs)
+  compileModel(model, batch_size=batch_size, steps_per_execution=steps_per_execution, accumulation_steps=accumulation_steps)
+  model.fit(dataset, epochs=1, verbose=0)
+  start = time.perf_counter()
+  model.fit(dataset, epochs=1, verbose=0)
+  return samples/(time.perf_counter() - start), peakRss()
+
+def benchmarkThroughput(configurations=((16, 1, 1), (64, 1, 1)), samples=2048, sequence_length=42, week_length=8, seed=0, **model_kwargs):
+  results = {}
+  context = multiprocessing.get_context('spawn')
+  for batch_size, accumulation_steps, steps_per_execution in configurations:
+    with context.Pool(1) as pool:
+      samples_per_second, peak_rss = pool.apply(measureThroughput, (batch_size, accumulation_steps, steps_per_execution, samples, sequence_length,
+                                                                    week_length, seed, model_kwargs))
+    results[(batch_size, accumulation_steps, steps_per_execution)] = {'samples/sec': samples_per_second, 'peak_rss_mb': peak_rss}
+    print("batch %5d accumulation %2d steps/execution %3d: %8.1f samples/sec, peak rss %6.0f MB" % (batch_size, accumulation_steps,
+                                                                                                      steps_per_execution, samples_per_second, peak_rss))
+  return results
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--configurations', nargs='+', default=['16', '16:1:8', '64', '256:4', '256:4:8'],
+                      help="batch_size[:accumulation_steps[:steps_per_execution]]")
+  parser.add_argument('--samples', type=int, default=2048, help="synthetic samples per epoch")
+  parser.add_argument('--sequence-length', type=int, default=42)
+  parser.add_argument('--week-length', type=int, default=8)
+  parser.add_argument('--small', action='store_true', help="a small Transformer (1 encoder/decoder, 2 heads of 8) for a quick run")
+  args = parser.parse_args()
+
+  model_kwargs = dict(encoder_number=1, decoder_number=1, amount_of_heads=2, size_of_head=8) if args.small else {}
+  benchmarkThroughput(tuple(parseConfiguration(text) for text in args.configurations), args.samples, args.sequence_length, args.week_length,
+                      **model_kwargs)
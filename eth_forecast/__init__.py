@@ -0,0 +1,33 @@
+"""Ethereum price forecast with a Time2Vec transformer on daily and weekly ETH and BTC data."""
+import importlib
+
+#the names are imported from their module on first use, so importing the package does not load tensorflow,
+#pandas or sklearn, and importing eth_forecast.data only loads numpy
+_exports = {
+  'Time2Vec': 'layers',
+  'Encoder': 'layers',
+  'Decoder': 'layers',
+  'Linear': 'layers',
+  'HorizonQueries': 'layers',
+  'Transformer': 'model',
+  'CustomLearningRateSchedule': 'model',
+  'SaveModelH5': 'model',
+  'createStrategy': 'strategy',
+  'createTrainDataset': 'pipeline',
+  'retrieve_data': 'data',
+  'scaleAndFilterData': 'data',
+  'prepareTrainDataX': 'data',
+  'prepareTargetDataY': 'data',
+  'prepareDecoderData': 'data',
+  'prepareTestDataX': 'data',
+  'prepareTargetDataYTest': 'data',
+  'prepareDecoderDataTest': 'data',
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+  if name in _exports:
+    return getattr(importlib.import_module('.' + _exports[name], __name__), name)
+  raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -0,0 +1,95 @@
+"""The largest train batch that fits a memory budget, probed with a few train steps per batch size.
+
+Every batch size runs in a new process (its peak RSS is that of the one batch size only) on random windows of the model
+config, the batch size doubles until the peak RSS of the next one, extrapolated from the last two, would not fit anymore.
+A process that is killed (e.g. by the out of memory killer) or fails counts as a batch size that does not fit.
+train --auto-batch-size uses the largest one, at most --batch-size, as micro batch and accumulates the gradients up to --batch-size.
+"""
+import multiprocessing
+import time
+
+import numpy as np
+
+from .resources import availableMemory
+
+
+def probeStep(config, batch_size, steps=3, seed=0):
+  #runs in its own process, returns (samples/sec, peak rss in MB) of train steps with batch_size or None when it does not fit
+  import tensorflow as tf
+  from .cli import compileModel, createModel
+  from .resources import peakRss
+
+  tf.keras.utils.set_random_seed(seed)
+  rng = np.random.default_rng(seed)
+  model = createModel(config, batch_size=batch_size)
+  compileModel(model, batch_size=batch_size)
+  window_length = config['sequence_length'] + config['week_length']
+  decoder_days = 1 if model.decoding == 'direct' else 7
+  inputs = tuple(rng.normal(size=(batch_size, window_length, 5)).astype(np.float32) for _ in model.assets) + \
+           (rng.normal(size=(batch_size, decoder_days, 1)).astype(np.float32),)
+  target = rng.normal(size=(batch_size, 7)).astype(np.float32)
+  try:
+    #the first step traces the train function, it is not timed
+    model.train_on_batch(inputs, target)
+    start = time.perf_counter()
+    for _ in range(steps):
+      model.train_on_batch(inputs, target)
+    seconds = time.perf_counter() - start
+  except (tf.errors.ResourceExhaustedError, MemoryError):
+    return None
+  return steps*batch_size/seconds, peakRss()
+
+def sendProbe(connection, config, batch_size, steps, seed):
+  #runs in its own process, a process that is killed sends nothing
+  connection.send(probeStep(config, batch_size, steps, seed))
+  connection.close()
+
+def runProbe(context, config, batch_size, steps=3, seed=0):
+  #probeStep in a new process, None when it does not fit, also when the process died or exited with an error
+  receiver, sender = context.Pipe(duplex=False)
+  process = context.Process(target=sendProbe, args=(sender, config, batch_size, steps, seed))
+  process.start()
+  #only the process holds the sending end now, so recv raises EOFError instead of waiting forever when it dies
+  sender.close()
+  try:
+    measured = receiver.recv()
+  except EOFError:
+    measured = None
+  process.join()
+  receiver.close()
+  return measured if process.exitcode == 0 else None
+
+def memoryBudget(fraction=0.8):
+  #by default a fraction of the memory that is available now, in MB
+  available = availableMemory()
+  if available is None:
+    raise RuntimeError("the available memory is unknown, pass a memory budget")
+  return fraction*available
+
+def probeBatchSize(config, memory_budget=None, smallest=16, largest=1024, steps=3, seed=0, verbose=True):
+  #returns (largest batch size that fits, {batch size: {'samples/sec', 'peak rss MB'}} of every probed batch size)
+  #the batch sizes are smallest, 2*smallest, ... up to largest, memory_budget is the peak rss in MB (memoryBudget() by default)
+  memory_budget = memory_budget or memoryBudget()
+  context = multiprocessing.get_context('spawn')
+  results, fitting, batch_size = {}, None, smallest
+  while batch_size <= largest:
+    measured = runProbe(context, config, batch_size, steps, seed)
+    if measured is None or measured[1] > memory_budget:
+      break
+    results[batch_size] = {'samples/sec': measured[0], 'peak rss MB': measured[1]}
+    if verbose:
+      print("batch size %5d: %8.1f samples/sec, peak rss %6.0f MB" % (batch_size, measured[0], measured[1]))
+    fitting = batch_size
+    #the memory grows about linearly with the batch size, a batch size that would not fit is not started at all
+    if batch_size//2 in results:
+      growth = results[batch_size]['peak rss MB'] - results[batch_size//2]['peak rss MB']
+      if results[batch_size]['peak rss MB'] + 2*growth > memory_budget:
+        break
+    batch_size *= 2
+  if fitting is None:
+    raise RuntimeError("a batch of %d samples does not fit in %.0f MB" % (smallest, memory_budget))
+  return fitting, results
+
+def accumulationSteps(batch_size, micro_batch_size):
+  #the amount of micro batches of at most micro_batch_size samples per batch
+  return max(1, -(-batch_size//micro_batch_size))
@@ -0,0 +1,132 @@
+"""Walk-forward backtest: the model is trained and evaluated at many forecast origins (folds) in a pool of processes.
+
+Fold i only uses the data up to its end: the part before its cutoff is the train data (the scalers are fitted on that part only)
+and the part after it is the test data. The windows of every fold are stored in the preprocessing cache, so the worker processes
+memory map them instead of receiving copies and a second backtest (e.g. with other model parameters) does not preprocess again.
+The per fold, per horizon errors are appended to a csv file as soon as a fold is done.
+"""
+import csv
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+RESULT_FIELDS = ['fold', 'cutoff', 'end', 'horizon', 'samples', 'mape', 'mape_scaled', 'mae', 'rmse', 'train_seconds']
+
+
+def foldCutoffs(folds=8, first_cutoff=0.6, last_cutoff=0.87):
+  #the cutoffs as fractions of the series, evenly spaced
+  return [round(float(cutoff), 6) for cutoff in np.linspace(first_cutoff, last_cutoff, folds)]
+
+def foldParameters(cutoff, test_fraction):
+  #(end_fraction, testsize) such that the train part ends at cutoff and the test part is the next test_fraction of the series
+  end_fraction = min(1.0, cutoff + test_fraction)
+  return round(end_fraction, 6), round((end_fraction - cutoff)/end_fraction, 6)
+
+def prepareFolds(data_files, config, cutoffs, test_fraction=0.1, cache_dir=None, max_bytes=None):
+  #preprocesses every fold into the cache (the csv files are read once), returns a list of {fold, cutoff, end, key}
+  from .cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, cacheKey, preprocess
+  from .data import retrieve_data
+
+  cache_dir = cache_dir or DEFAULT_CACHE_DIR
+  raw_data = {name: retrieve_data(filename) for name, filename in data_files.items()}
+  parameters = [foldParameters(cutoff, test_fraction) for cutoff in cutoffs]
+  #storing a fold must not evict the other folds, runFold needs all of them
+  keys = tuple(cacheKey(data_files, config['sequence_length'], config['week_length'], testsize, end_fraction=end_fraction)
+               for end_fraction, testsize in parameters)
+  folds = []
+  for fold, (cutoff, (end_fraction, testsize)) in enumerate(zip(cutoffs, parameters)):
+    key, arrays = preprocess(data_files, config['sequence_length'], config['week_length'], testsize, cache_dir, max_bytes or DEFAULT_MAX_BYTES,
+                             end_fraction=end_fraction, raw_data=raw_data, keep=keys)
+    if len(arrays['target_test']) == 0:
+      raise ValueError("fold %d (cutoff %g) has no test windows, use a larger test_fraction" % (fold, cutoff))
+    folds.append({'fold': fold, 'cutoff': cutoff, 'end': end_fraction, 'key': key})
+  return folds
+
+def horizonErrors(targets, predictions, mean, scale):
+  #returns one row per forecast day: mape and mae/rmse on the reverted close prices, mape_scaled on the scaled values (as predict prints)
+  targets, predictions = np.asarray(targets, np.float64), np.asarray(predictions, np.float64)
+  reverted_targets, reverted_predictions = targets*scale + mean, predictions*scale + mean
+  errors = reverted_predictions - reverted_targets
+  rows = []
+  for horizon in range(targets.shape[1]):
+    rows.append({'horizon': horizon + 1, 'samples': len(targets),
+                 'mape': float(100*np.mean(np.abs(errors[:, horizon])/np.maximum(np.abs(reverted_targets[:, horizon]), 1e-7))),
+                 'mape_scaled': float(100*np.mean(np.abs(targets[:, horizon] - predictions[:, horizon])/np.maximum(np.abs(targets[:, horizon]), 1e-7))),
+                 'mae': float(np.mean(np.abs(errors[:, horizon]))),
+                 'rmse': float(np.sqrt(np.mean(errors[:, horizon]**2)))})
+  return rows
+
+def initWorker(threads):
+  #the cores are divided over the worker processes, instead of every process starting a thread per core
+  import tensorflow as tf
+  tf.config.threading.set_intra_op_parallelism_threads(threads)
+  tf.config.threading.set_inter_op_parallelism_threads(1)
+
+def runFold(task):
+  #trains (or refits from initial_weights) one fold and forecasts its test windows, returns the rows of horizonErrors
+  import tensorflow as tf
+  from .cache import loadEntry
+  from .cli import compileModel, createModel
+  from .pipeline import createTrainDataset
+
+  arrays = loadEntry(task['cache_dir'], task['key'])
+  if arrays is None:
+    raise FileNotFoundError("fold %d is not in the cache anymore, use a larger cache" % task['fold'])
+  config = task['config']
+  tf.keras.utils.set_random_seed(task['seed'] + task['fold'])
+  model = createModel(config, batch_size=task['batch_size'])
+  compileModel(model, batch_size=task['batch_size'])
+  test_windows = [arrays[asset + '_test_windows'] for asset in model.assets]
+  #the subclassed model creates its variables on the first call
+  model(tuple(windows[:1] for windows in test_windows) + (np.zeros((1, 7, 1), np.float32),))
+  if task['initial_weights']:
+    model.load_weights(task['initial_weights']).expect_partial()
+  start = time.perf_counter()
+  if task['epochs'] > 0:
+    asset_series = [(arrays[asset + '_daily_train'], arrays[asset + '_weekly_train']) for asset in model.assets]
+    train_dataset, _ = createTrainDataset(asset_series, config['sequence_length'], config['week_length'], task['batch_size'], validation_split=0.0,
+                                          seed=task['seed'], time_column=False, decoding=model.decoding)
+    model.fit(train_dataset, epochs=task['epochs'], verbose=0)
+  train_seconds = time.perf_counter() - start
+  predictions = model.forecast(tuple(test_windows) + (arrays['decoder_test'],), horizon=7, batch_size=64)
+  target = model.assets[0] + '_daily'
+  rows = horizonErrors(arrays['target_test'], predictions, arrays[target + '_scaler_mean'][3], arrays[target + '_scaler_scale'][3])
+  fold_values = {'fold': task['fold'], 'cutoff': task['cutoff'], 'end': task['end'], 'train_seconds': train_seconds}
+  return [dict(row, **fold_values) for row in rows]
+
+def runBacktest(data_files, config, cutoffs, results_file, test_fraction=0.1, epochs=5, batch_size=16, processes=None,
+                initial_weights=None, cache_dir=None, max_bytes=None, seed=0):
+  #config has the model config and the window lengths (like config.json), initial_weights refits every fold from a trained model
+  #instead of training it from scratch (with epochs=0 the trained model is only evaluated), returns all rows sorted by fold and horizon
+  from .cache import DEFAULT_CACHE_DIR, assetNames
+  cache_dir = os.path.abspath(cache_dir or DEFAULT_CACHE_DIR)
+  #the model has an encoder tower per asset of the data files
+  config = dict(config, assets=assetNames(data_files))
+  folds = prepareFolds(data_files, config, cutoffs, test_fraction, cache_dir, max_bytes)
+  tasks = [dict(fold, cache_dir=cache_dir, config=config, epochs=epochs, batch_size=batch_size, seed=seed,
+                initial_weights=initial_weights and os.path.abspath(initial_weights)) for fold in folds]
+  processes = processes or min(len(tasks), os.cpu_count() or 1)
+  threads = max(1, (os.cpu_count() or 1)//processes)
+  rows = []
+  #spawn, a forked child would inherit the state of tensorflow when it is already loaded in this process
+  context = multiprocessing.get_context('spawn')
+  with open(results_file, 'w', newline='') as file, context.Pool(processes, initializer=initWorker, initargs=(threads,)) as pool:
+    writer = csv.DictWriter(file, RESULT_FIELDS)
+    writer.writeheader()
+    for fold_rows in pool.imap_unordered(runFold, tasks):
+      writer.writerows(fold_rows)
+      file.flush()
+      rows.extend(fold_rows)
+      print("fold %d (cutoff %.3f): mape %.3f" % (fold_rows[0]['fold'], fold_rows[0]['cutoff'], np.mean([row['mape'] for row in fold_rows])))
+  rows.sort(key=lambda row: (row['fold'], row['horizon']))
+  return rows
+
+def summarizeByHorizon(rows):
+  #mean over the folds per horizon, {horizon: {'mape': ..., 'mae': ..., 'rmse': ...}}
+  summary = {}
+  for horizon in sorted({row['horizon'] for row in rows}):
+    horizon_rows = [row for row in rows if row['horizon'] == horizon]
+    summary[horizon] = {name: float(np.mean([row[name] for row in horizon_rows])) for name in ('mape', 'mae', 'rmse')}
+  return summary
@@ -0,0 +1,150 @@
+"""On-disk cache of the preprocessed data, keyed on the content of the csv files and the window parameters.
+
+Every entry is a directory with one .npy file per array, which are memory mapped when loaded (no copy),
+so a run that only changes a hyperparameter of the Transformer does not read, scale or window the csv files again.
+"""
+import hashlib
+import json
+import math
+import os
+import shutil
+import time
+
+import numpy as np
+
+from .data import (COLUMNS, prepareDecoderData, prepareDecoderDataTest, prepareTargetDataY, prepareTargetDataYTest,
+                   prepareTestDataX, prepareTrainDataX, retrieve_data, scaleAndFilterData)
+from .storage import resolveDataPath, sourceHash
+
+DEFAULT_CACHE_DIR = os.environ.get('ETH_FORECAST_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'eth_forecast'))
+#old entries are evicted (least recently used first) when the cache grows beyond this
+DEFAULT_MAX_BYTES = 2*1024**3
+META_FILE = "meta.json"
+#bump when the arrays in an entry change, such that old entries are not used anymore
+CACHE_VERSION = 3
+
+
+def assetNames(series_names):
+  #the assets of {asset}_daily/{asset}_weekly series names, in their order (the first one is the asset that is forecast)
+  return [name[:-len("_daily")] for name in series_names if name.endswith("_daily")]
+
+def cacheKey(data_files, sequence_length, week_length, testsize, columns=COLUMNS, end_fraction=None):
+  #data_files is {name: csv path}, only the content of the files counts, not their path or modification time
+  #(when a csv file is read from its columnar store, the store counts, as its data is float32)
+  description = {
+    'version': CACHE_VERSION,
+    'assets': assetNames(data_files),
+    'files': {name: sourceHash(resolveDataPath(filename)) for name, filename in sorted(data_files.items())},
+    'sequence_length': sequence_length,
+    'week_length': week_length,
+    'testsize': testsize,
+    'columns': list(columns),
+  }
+  if end_fraction is not None:
+    description['end_fraction'] = end_fraction
+  return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()[:32]
+
+def buildPreprocessedArrays(raw_data, sequence_length, week_length, testsize):
+  #raw_data is {'eth_daily': array, 'eth_weekly': ..., 'btc_daily': ..., 'btc_weekly': ...} as returned by retrieve_data,
+  #with a daily and weekly series per asset, the target and decoder windows are of the first asset
+  #returns {array name: array} with the scaled series, the scaler parameters and the train and test windows
+  #the windows do not have the time embedding column, it is the same for every sample (see Transformer(time_table=True))
+  arrays = {}
+  for name, data in raw_data.items():
+    scaler, scaled_train, scaled_test = scaleAndFilterData(data, testsize=testsize)
+    arrays[name + "_train"] = scaled_train
+    arrays[name + "_test"] = scaled_test
+    arrays[name + "_scaler_mean"] = scaler.mean_
+    arrays[name + "_scaler_scale"] = scaler.scale_
+  assets = assetNames(raw_data)
+  for asset in assets:
+    arrays[asset + "_train_windows"] = prepareTrainDataX(arrays[asset + "_daily_train"], arrays[asset + "_weekly_train"], sequence_length, week_length, time_column=False)
+    arrays[asset + "_test_windows"] = prepareTestDataX(arrays[asset + "_daily_test"], arrays[asset + "_weekly_test"], sequence_length, week_length, time_column=False)
+  target = assets[0] + "_daily"
+  arrays["target_train"] = prepareTargetDataY(arrays[target + "_train"], sequence_length, week_length)[:, :, 0]
+  arrays["decoder_train"] = prepareDecoderData(arrays[target + "_train"], sequence_length, week_length, time_column=False)
+  arrays["target_test"] = prepareTargetDataYTest(arrays[target + "_test"], sequence_length, week_length)[:, :, 0]
+  arrays["decoder_test"] = prepareDecoderDataTest(arrays[target + "_test"], sequence_length, week_length)
+  return arrays
+
+def entryDir(cache_dir, key):
+  return os.path.join(cache_dir, key)
+
+def loadEntry(cache_dir, key):
+  #returns {array name: memory mapped array} or None when the entry is not in the cache
+  directory = entryDir(cache_dir, key)
+  meta_path = os.path.join(directory, META_FILE)
+  if not os.path.exists(meta_path):
+    return None
+  with open(meta_path) as meta_file:
+    meta = json.load(meta_file)
+  #the modification time of the meta file is the last use, for the eviction
+  os.utime(meta_path)
+  return {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode='r') for name in meta['arrays']}
+
+def storeEntry(cache_dir, key, arrays, meta=None):
+  #the arrays are written to a temporary directory that is renamed at the end, so a crashed run never leaves a half written entry
+  os.makedirs(cache_dir, exist_ok=True)
+  directory = entryDir(cache_dir, key)
+  temporary_directory = directory + ".tmp%d" % os.getpid()
+  shutil.rmtree(temporary_directory, ignore_errors=True)
+  os.makedirs(temporary_directory)
+  for name, array in arrays.items():
+    np.save(os.path.join(temporary_directory, name + ".npy"), np.ascontiguousarray(array))
+  with open(os.path.join(temporary_directory, META_FILE), 'w') as meta_file:
+    json.dump(dict(meta or {}, arrays=sorted(arrays), created=time.time()), meta_file, indent=2)
+  try:
+    os.rename(temporary_directory, directory)
+  except OSError:
+    #another process stored the same entry first
+    shutil.rmtree(temporary_directory, ignore_errors=True)
+
+def entrySize(directory):
+  return sum(os.path.getsize(os.path.join(directory, filename)) for filename in os.listdir(directory))
+
+def evictEntries(cache_dir, max_bytes=DEFAULT_MAX_BYTES, keep=()):
+  #removes the least recently used entries until the cache is at most max_bytes, the entries in keep are never removed
+  if not os.path.isdir(cache_dir):
+    return []
+  entries = []
+  for key in os.listdir(cache_dir):
+    meta_path = os.path.join(cache_dir, key, META_FILE)
+    if os.path.exists(meta_path):
+      entries.append((os.path.getmtime(meta_path), key, entrySize(os.path.join(cache_dir, key))))
+  total_size = sum(size for _, _, size in entries)
+  evicted = []
+  for _, key, size in sorted(entries):
+    if total_size <= max_bytes:
+      break
+    if key in keep:
+      continue
+    shutil.rmtree(os.path.join(cache_dir, key), ignore_errors=True)
+    total_size -= size
+    evicted.append(key)
+  return evicted
+
+def truncateSeries(raw_data, end_fraction):
+  #keeps the first end_fraction of every series (a backtest fold only sees the data up to its end)
+  return {name: data[:math.floor(end_fraction*len(data))] for name, data in raw_data.items()}
+
+def preprocess(data_files, sequence_length, week_length, testsize, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES, refresh=False,
+               end_fraction=None, raw_data=None, keep=()):
+  #returns (key, {array name: memory mapped array}), the csv files are only read and windowed when the entry is not cached yet
+  #end_fraction only uses the first part of every series, raw_data are the already loaded series (to load them once for many entries)
+  #keep are the keys of other entries that are not evicted to make room for this one (the other entries of a sweep or backtest)
+  cache_dir = cache_dir or DEFAULT_CACHE_DIR
+  key = cacheKey(data_files, sequence_length, week_length, testsize, end_fraction=end_fraction)
+  arrays = None if refresh else loadEntry(cache_dir, key)
+  if arrays is None:
+    if refresh:
+      shutil.rmtree(entryDir(cache_dir, key), ignore_errors=True)
+    if raw_data is None:
+      raw_data = {name: retrieve_data(filename) for name, filename in data_files.items()}
+    if end_fraction is not None:
+      raw_data = truncateSeries(raw_data, end_fraction)
+    meta = {'assets': assetNames(data_files), 'sequence_length': sequence_length, 'week_length': week_length, 'testsize': testsize, 'end_fraction': end_fraction, 'columns': list(COLUMNS),
+            'files': {name: os.path.abspath(resolveDataPath(filename)) for name, filename in data_files.items()}}
+    storeEntry(cache_dir, key, buildPreprocessedArrays(raw_data, sequence_length, week_length, testsize), meta)
+    evictEntries(cache_dir, max_bytes, keep=(key,) + tuple(keep))
+    arrays = loadEntry(cache_dir, key)
+  return key, arrays
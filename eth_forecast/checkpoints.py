@@ -0,0 +1,162 @@
+"""Rotating weights and optimizer checkpoints, written on a background thread.
+
+Every checkpoint is a directory ckpt-<epoch> with the model weights, the optimizer variables and a meta.json. The variables are
+copied to numpy on the training thread (a fast host copy), the files are written by a background thread to a temporary directory
+that is renamed at the end, so a crashed run never leaves a half written checkpoint. The last keep_last checkpoints and the best one
+(on the monitored metric) are kept, older ones are removed. A run that does not resume starts from an empty directory, so the
+checkpoints of an earlier run are never ranked, rotated or exported with the new ones.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+import numpy as np
+import tensorflow as tf
+
+CHECKPOINT_PATTERN = re.compile(r'^ckpt-(\d+)$')
+META_FILE = "meta.json"
+
+
+def checkpointPath(directory, epoch):
+  return os.path.join(directory, "ckpt-%04d" % epoch)
+
+def listCheckpoints(directory):
+  #returns [(epoch, path)] of the complete checkpoints, oldest first
+  if not os.path.isdir(directory):
+    return []
+  checkpoints = []
+  for name in os.listdir(directory):
+    match = CHECKPOINT_PATTERN.match(name)
+    if match and os.path.exists(os.path.join(directory, name, META_FILE)):
+      checkpoints.append((int(match.group(1)), os.path.join(directory, name)))
+  return sorted(checkpoints)
+
+def readCheckpointMeta(path):
+  with open(os.path.join(path, META_FILE)) as meta_file:
+    return json.load(meta_file)
+
+def latestCheckpoint(directory):
+  checkpoints = listCheckpoints(directory)
+  return checkpoints[-1][1] if checkpoints else None
+
+def bestCheckpoint(directory, monitor='val_loss', mode='min'):
+  scored = [(readCheckpointMeta(path).get(monitor), path) for _, path in listCheckpoints(directory)]
+  scored = [(value, path) for value, path in scored if value is not None]
+  if not scored:
+    return None
+  return (min(scored) if mode == 'min' else max(scored))[1]
+
+def clearCheckpoints(directory):
+  #removes the checkpoints (and the temporary directories of unfinished ones) of an earlier run
+  if not os.path.isdir(directory):
+    return
+  for name in os.listdir(directory):
+    if CHECKPOINT_PATTERN.match(name.split(".tmp")[0]):
+      shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+def optimizerVariables(optimizer):
+  #the variables of the optimizer (iterations and slots) in a fixed order, they are created by build
+  return list(optimizer.variables)
+
+def writeCheckpoint(path, weights, optimizer_weights, meta):
+  #writes the numpy arrays to path, through a temporary directory that is renamed once everything is on disk
+  temporary_path = path + ".tmp%d" % os.getpid()
+  shutil.rmtree(temporary_path, ignore_errors=True)
+  os.makedirs(temporary_path)
+  np.savez(os.path.join(temporary_path, "weights.npz"), *weights)
+  np.savez(os.path.join(temporary_path, "optimizer.npz"), *optimizer_weights)
+  with open(os.path.join(temporary_path, META_FILE), 'w') as meta_file:
+    json.dump(meta, meta_file, indent=2)
+  shutil.rmtree(path, ignore_errors=True)
+  os.rename(temporary_path, path)
+
+def loadArrays(filename):
+  with np.load(filename) as arrays:
+    return [arrays['arr_%d' % index] for index in range(len(arrays.files))]
+
+def restoreCheckpoint(model, path):
+  #restores the weights and optimizer state of a checkpoint into a built and compiled model, returns its meta (with the epoch)
+  model.set_weights(loadArrays(os.path.join(path, "weights.npz")))
+  optimizer_weights = loadArrays(os.path.join(path, "optimizer.npz"))
+  if optimizer_weights:
+    #the slots of the optimizer only exist after its first step or an explicit build
+    model.optimizer.build(model.trainable_variables)
+    for variable, value in zip(optimizerVariables(model.optimizer), optimizer_weights):
+      variable.assign(value)
+  return readCheckpointMeta(path)
+
+class CheckpointCallback(tf.keras.callbacks.Callback):
+    #saves a checkpoint at the end of every epoch (every_epochs) in the background, keeps the last keep_last and the best one
+    #without resume the checkpoints already in directory are removed, with resume they belong to the run that continues
+
+    def __init__(self, directory, monitor='val_loss', mode='min', keep_last=3, keep_best=True, every_epochs=1, resume=False):
+      super().__init__()
+      self.directory = directory
+      self.monitor = monitor
+      self.mode = mode
+      self.keep_last = keep_last
+      self.keep_best = keep_best
+      self.every_epochs = every_epochs
+      self.thread = None
+      self.error = None
+      #the best value is kept up to date instead of taking the minimum over the whole history every epoch
+      self.best = None
+      self.best_path = None
+      if not resume:
+        clearCheckpoints(directory)
+        return
+      best_path = bestCheckpoint(directory, monitor, mode)
+      if best_path is not None:
+        self.best, self.best_path = readCheckpointMeta(best_path)[monitor], best_path
+
+    def isImprovement(self, value):
+      if value is None:
+        return False
+      if self.best is None:
+        return True
+      return value < self.best if self.mode == 'min' else value > self.best
+
+    def wait(self):
+      #waits for the checkpoint that is being written, raises its error when it failed
+      if self.thread is not None:
+        self.thread.join()
+        self.thread = None
+      if self.error is not None:
+        error, self.error = self.error, None
+        raise error
+
+    def on_epoch_end(self, epoch, logs=None):
+      if (epoch + 1) % self.every_epochs != 0:
+        return
+      logs = logs or {}
+      value = logs.get(self.monitor)
+      value = None if value is None else float(value)
+      #only one checkpoint is written at a time, the previous one is normally done long before the next epoch ends
+      self.wait()
+      weights = self.model.get_weights()
+      optimizer_weights = [variable.numpy() for variable in optimizerVariables(self.model.optimizer)]
+      path = checkpointPath(self.directory, epoch)
+      meta = dict({key: float(logs_value) for key, logs_value in logs.items()}, epoch=epoch, monitor=self.monitor, time=time.time())
+      if self.isImprovement(value):
+        self.best, self.best_path = value, path
+      os.makedirs(self.directory, exist_ok=True)
+      self.thread = threading.Thread(target=self.writeAndRotate, args=(path, weights, optimizer_weights, meta), daemon=True)
+      self.thread.start()
+
+    def writeAndRotate(self, path, weights, optimizer_weights, meta):
+      try:
+        writeCheckpoint(path, weights, optimizer_weights, meta)
+        keep = {checkpoint_path for _, checkpoint_path in listCheckpoints(self.directory)[-self.keep_last:]} if self.keep_last else set()
+        if self.keep_best and self.best_path is not None:
+          keep.add(self.best_path)
+        for _, checkpoint_path in listCheckpoints(self.directory):
+          if checkpoint_path not in keep:
+            shutil.rmtree(checkpoint_path, ignore_errors=True)
+      except Exception as error:
+        self.error = error
+
+    def on_train_end(self, logs=None):
+      self.wait()
@@ -0,0 +1,494 @@
+"""Command line entry points: python -m eth_forecast ingest|prepare|train|predict|intervals|backtest|sweep|serve|export|quantize.
+
+Only the standard library is imported at module level, numpy, tensorflow, pandas, sklearn and matplotlib are
+imported by the command that needs them, so the command line starts before any of them is loaded.
+"""
+import argparse
+import json
+import os
+
+#the four csv files, data for all dataset: Nov 09, 2017 - Jan 10, 2024
+DATA_FILES = {
+  'eth_daily': "ETH-USD - daily.csv",
+  'eth_weekly': "ETH-USD - weekly.csv",
+  'btc_daily': "BTC-USD - daily.csv",
+  'btc_weekly': "BTC-USD - weekly.csv",
+}
+#the assets of the encoder towers, the first one is forecast
+ASSETS = ['eth', 'btc']
+CONFIG_FILE = "config.json"
+WEIGHTS_DIR = "weights"
+CHECKPOINT_DIR = "checkpoints"
+EXPORT_DIR = "export"
+INFERENCE_DIR = "inference"
+QUANTIZED_DIR = "quantized"
+
+
+def dataFiles(data_dir='.', assets=ASSETS):
+  #{series name: csv path} of a daily and a weekly csv file per asset, named like the four csv files ("SOL-USD - daily.csv")
+  data_files = {}
+  for asset in assets:
+    for period in ('daily', 'weekly'):
+      name = asset + "_" + period
+      data_files[name] = os.path.join(data_dir, DATA_FILES.get(name, "%s-USD - %s.csv" % (asset.upper(), period)))
+  return data_files
+
+def loadConfig(output_dir):
+  with open(os.path.join(output_dir, CONFIG_FILE)) as config_file:
+    return json.load(config_file)
+
+def saveConfig(output_dir, config):
+  with open(os.path.join(output_dir, CONFIG_FILE), 'w') as config_file:
+    json.dump(config, config_file, indent=2)
+
+def ingest(data_dir='.', assets=ASSETS):
+  #converts the csv files once into the columnar float32 store, which prepare then reads instead of the csv files
+  from .storage import ingestCsv
+  #the paths of dataFiles already include data_dir
+  for path in dataFiles(data_dir, assets).values():
+    print("ingested", ingestCsv(path))
+
+def prepare(data_dir='.', output_dir='artifacts', sequence_length=42, week_length=8, testsize=0.13, cache_dir=None, cache_size=None, refresh=False,
+            assets=ASSETS):
+  #loads the csv files, scales them with the standardscaler of the train part and creates the windows, the result is stored
+  #in the preprocessing cache (and reused when the csv files and parameters did not change), the output directory refers to the entry
+  #assets are the assets of the encoder towers, the first one is forecast
+  from .cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, preprocess
+
+  cache_dir = os.path.abspath(cache_dir or DEFAULT_CACHE_DIR)
+  data_files = dataFiles(data_dir, assets)
+  key, _ = preprocess(data_files, sequence_length, week_length, testsize, cache_dir, cache_size or DEFAULT_MAX_BYTES, refresh)
+  os.makedirs(output_dir, exist_ok=True)
+  config = loadConfig(output_dir) if os.path.exists(os.path.join(output_dir, CONFIG_FILE)) else {'model': {}}
+  config.update({'assets': list(assets), 'sequence_length': sequence_length, 'week_length': week_length, 'testsize': testsize, 'cache_dir': cache_dir, 'cache_key': key})
+  saveConfig(output_dir, config)
+  print("prepared data", key, "in", cache_dir)
+
+def loadPreparedArrays(output_dir):
+  #returns {array name: memory mapped array} of the cache entry prepare created
+  from .cache import loadEntry
+  config = loadConfig(output_dir)
+  arrays = loadEntry(config['cache_dir'], config['cache_key'])
+  if arrays is None:
+    raise FileNotFoundError("the prepared data is not in the cache anymore, run prepare again")
+  return arrays
+
+def loadPrepared(output_dir, split):
+  #returns {name: scaled series} of the train or test split, the arrays are memory mapped
+  arrays = loadPreparedArrays(output_dir)
+  return {name: arrays[name + "_" + split] for name in dataFiles('.', loadConfig(output_dir).get('assets', ASSETS))}
+
+def loadScaler(output_dir, name):
+  #returns (mean, scale) of the standardscaler of one series
+  arrays = loadPreparedArrays(output_dir)
+  return arrays[name + "_scaler_mean"], arrays[name + "_scaler_scale"]
+
+def createModel(config, **overrides):
+  #the prepared windows do not have the time embedding column, so the model computes Time2Vec as tables
+  from .model import Transformer
+  return Transformer(**dict(config['model'], time_table=True, sequence_length=config['sequence_length'], week_length=config['week_length'],
+                            assets=config.get('assets', ASSETS), **overrides))
+
+def compileModel(model, jit_compile=False, learning_rate=0.005, batch_size=None, steps_per_execution=1, accumulation_steps=1):
+  #with batch_size the learning rate decays with the samples seen (see CustomLearningRateSchedule), otherwise per step
+  #steps_per_execution runs that many train steps in one call of the train function instead of one call per step from python,
+  #accumulation_steps splits every batch into micro batches of which the gradients are summed (see Transformer.accumulatedTrainStep)
+  from keras.optimizers import Adam
+  from .model import CustomLearningRateSchedule
+  learning_rate = CustomLearningRateSchedule(learning_rate, samples_per_step=batch_size)
+  optimizer = Adam(learning_rate = learning_rate, epsilon=1e-9, beta_2 = 0.98)
+  if model.precision == 'mixed_float16':
+    #float16 gradients underflow without loss scaling (bfloat16 has the exponent range of float32 and does not need it)
+    import tensorflow as tf
+    optimizer = tf.keras.mixed_precision.LossScaleOptimizer(optimizer)
+  model.accumulation_steps = accumulation_steps
+  model.compile(loss='mse', optimizer=optimizer, metrics='mape', jit_compile=jit_compile, steps_per_execution=steps_per_execution)
+
+def printReport(name, report):
+  print(name + ": " + ", ".join("%s %.4g" % (key, value) for key, value in report.items()))
+
+def train(output_dir='artifacts', epochs=25, batch_size=16, device=None, jit_compile=False, plot=False, precision=None,
+          log_dir=None, profile_blocks=False, profile_steps=None, keep_last=3, resume=False, export=False, shared_encoder=None, fusion=None,
+          attention_mode=None, seed=None, decoding=None, steps_per_execution=1, accumulation_steps=1, auto_batch_size=False,
+          memory_budget=None):
+  #trains the transformer on the prepared train split and stores its weights and the training history
+  #precision is 'float32', 'mixed_float16' or 'mixed_bfloat16', it is stored with the model config (None keeps the stored one)
+  #log_dir logs the throughput per epoch, profile_blocks also the forward time of the blocks of the model and
+  #profile_steps=(first, last) captures a profiler trace of those steps (both need log_dir)
+  #every epoch a checkpoint (weights and optimizer) is written in the background, resume continues from the latest one
+  #and export saves the best checkpoint once as a full SavedModel at the end, without resume the checkpoints of an earlier run are removed first
+  #shared_encoder, fusion, attention_mode and decoding are stored with the model config as precision (None keeps the stored one)
+  #in a worker process of train --workers (cluster.py) the batches are split over the workers, only the chief writes files
+  #batch_size is the amount of samples per optimizer step, the learning rate decays with the samples seen, so runs with another
+  #batch size stay comparable, accumulation_steps computes every step in that amount of micro batches (less memory) and
+  #auto_batch_size probes the largest micro batch that fits memory_budget (MB, autobatch.memoryBudget() by default) instead
+  from .cluster import isChief, isWorker, pinWorker
+  if isWorker():
+    pinWorker()
+    device = 'workers'
+    #every worker has to shuffle and split the samples the same way
+    seed = 0 if seed is None else seed
+  from .checkpoints import CheckpointCallback, latestCheckpoint, restoreCheckpoint
+  from .pipeline import createTrainDataset
+  from .resources import Timer, peakRss
+  from .strategy import createStrategy
+
+  #tpu, gpu, cpu, workers or None to detect it, the accelerator is only initialized here, when training starts
+  strategy = createStrategy(device)
+  chief = isChief()
+  if seed is not None:
+    import tensorflow as tf
+    tf.keras.utils.set_random_seed(seed)
+  config = loadConfig(output_dir)
+  model_settings = {'precision': precision, 'shared_encoder': shared_encoder, 'fusion': fusion, 'attention_mode': attention_mode,
+                    'decoding': decoding}
+  model_settings = {name: value for name, value in model_settings.items() if value is not None}
+  if model_settings:
+    config['model'].update(model_settings)
+    if chief:
+      saveConfig(output_dir, config)
+  if auto_batch_size:
+    from .autobatch import accumulationSteps, probeBatchSize
+    micro_batch_size, _ = probeBatchSize(config, memory_budget, smallest=min(16, batch_size), largest=batch_size)
+    accumulation_steps = accumulationSteps(batch_size, micro_batch_size)
+  if accumulation_steps > 1:
+    print("batches of %d samples in %d micro batches of at most %d" % (batch_size, accumulation_steps, -(-batch_size//accumulation_steps)))
+  series = loadPrepared(output_dir, 'train')
+  asset_series = [(series[asset + '_daily'], series[asset + '_weekly']) for asset in config.get('assets', ASSETS)]
+  #the windows are not materialized, the tf.data pipeline creates them per batch from the scaled series
+  train_dataset, validation_dataset = createTrainDataset(asset_series, config['sequence_length'], config['week_length'], batch_size,
+                                                         validation_split=0.1, seed=seed, time_column=False,
+                                                         decoding=config['model'].get('decoding', 'autoregressive'))
+  if device == 'workers':
+    #the datasets are built from tensors (no files), every worker takes its part of every batch
+    import tensorflow as tf
+    options = tf.data.Options()
+    options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.DATA
+    train_dataset, validation_dataset = train_dataset.with_options(options), validation_dataset.with_options(options)
+  #the model, its variables and the optimizer have to be created inside the scope of the strategy
+  with strategy.scope():
+    model = createModel(config, batch_size=batch_size, profile_blocks=profile_blocks)
+    compileModel(model, jit_compile=jit_compile, batch_size=batch_size, steps_per_execution=steps_per_execution, accumulation_steps=accumulation_steps)
+    checkpoint_dir = os.path.join(output_dir, CHECKPOINT_DIR)
+    initial_epoch = 0
+    latest = latestCheckpoint(checkpoint_dir) if resume else None
+    if latest is not None:
+      #the variables are created by a first call, after which they are overwritten by the checkpoint
+      model(next(iter(train_dataset))[0])
+      initial_epoch = restoreCheckpoint(model, latest)['epoch'] + 1
+      print("resuming from", latest)
+  callbacks = [CheckpointCallback(checkpoint_dir, keep_last=keep_last, resume=resume)] if chief else []
+  if log_dir and chief:
+    from .instrumentation import InstrumentationCallback
+    callbacks.append(InstrumentationCallback(log_dir, batch_size, profile_steps, steps_per_execution=steps_per_execution))
+  with Timer() as timer:
+    history = model.fit(train_dataset, epochs=epochs, initial_epoch=initial_epoch, validation_data=validation_dataset, callbacks=callbacks,
+                        verbose=1 if chief else 0)
+  #the samples per second include the first epoch, in which the train step is traced
+  samples = max(epochs - initial_epoch, 0)*int(train_dataset.cardinality())*batch_size
+  train_report = {'batch size': batch_size, 'accumulation steps': accumulation_steps, 'steps/execution': steps_per_execution,
+                  'loss': history.history.get('loss', [float('nan')])[-1], 'mape': history.history.get('mape', [float('nan')])[-1], 'seconds': timer.seconds,
+                  'samples/sec': samples/timer.seconds, 'peak rss MB': peakRss()}
+  if not chief:
+    #all workers save (the variables can be distributed), the other workers to a directory that is removed again
+    import shutil
+    import tempfile
+    worker_dir = tempfile.mkdtemp()
+    model.save_weights(os.path.join(worker_dir, "model"))
+    shutil.rmtree(worker_dir, ignore_errors=True)
+    return model, history
+  printReport("train " + model.precision, train_report)
+  model.save_weights(os.path.join(output_dir, WEIGHTS_DIR, "model"))
+  with open(os.path.join(output_dir, "history.json"), 'w') as history_file:
+    json.dump(dict({key: [float(value) for value in values] for key, values in history.history.items()}, report=train_report), history_file)
+  if plot:
+    from .plots import plotLossProgression
+    plotLossProgression(history.history, os.path.join(output_dir, "loss_metric_progression.png"))
+  if export:
+    export_model = model
+    if profile_blocks:
+      #the variables of the block timer are not tracked (they are not weights), so a SavedModel cannot capture the timing ops,
+      #the weights are exported with a model without them
+      export_model = createModel(config, batch_size=batch_size)
+      export_model(next(iter(train_dataset))[0])
+      export_model.set_weights(model.get_weights())
+    exportBest(export_model, output_dir)
+  return model, history
+
+def exportBest(model, output_dir):
+  #one full SavedModel of the best checkpoint, instead of one every time the validation loss improved (the old SaveModelH5)
+  from .checkpoints import bestCheckpoint, loadArrays
+  best = bestCheckpoint(os.path.join(output_dir, CHECKPOINT_DIR))
+  if best is not None:
+    model.set_weights(loadArrays(os.path.join(best, "weights.npz")))
+  model.save(os.path.join(output_dir, EXPORT_DIR), save_format='tf', include_optimizer=False)
+  print("exported", best or "the last weights", "to", os.path.join(output_dir, EXPORT_DIR))
+
+def exportInference(output_dir='artifacts', horizon=7, jit_compile=False):
+  #inference-only SavedModel of the trained weights with fixed input signatures, loaded by inference.InferenceModel
+  from .inference import exportInference as exportForecastGraph
+  path = exportForecastGraph(loadTrainedModel(output_dir, loadConfig(output_dir)), os.path.join(output_dir, INFERENCE_DIR), horizon, jit_compile)
+  print("exported the forecast graph to", path)
+  return path
+
+def quantize(output_dir='artifacts', mode='dynamic', max_mape_drift=1.0, calibration_samples=200):
+  #int8 tensorflow lite forecast of the trained weights in output_dir/quantized/<mode>, see quantize.py
+  #it is not written (exit code 1) when its test MAPE drifts more than max_mape_drift percentage points from the float model
+  import sys
+  from .quantize import quantizeModel
+  config = loadConfig(output_dir)
+  path = os.path.join(output_dir, QUANTIZED_DIR, mode)
+  report = quantizeModel(loadTrainedModel(output_dir, config), loadPreparedArrays(output_dir), path, mode, max_mape_drift, calibration_samples)
+  printReport("quantize " + mode, {key: value for key, value in report.items() if isinstance(value, (int, float)) and not isinstance(value, bool)})
+  if not report['accepted']:
+    sys.exit("the mape drift %.3f is larger than %.3f, no quantized model is written" % (report['mape_drift'], max_mape_drift))
+  print("quantized forecast written to", path)
+  return report
+
+def loadTrainedModel(output_dir, config):
+  #the subclassed model only creates its variables when it is called, so it is called once on zeros before loading the weights
+  import numpy as np
+  model = createModel(config)
+  window_length = config['sequence_length'] + config['week_length']
+  model(tuple(np.zeros((1, window_length, 5), np.float32) for _ in model.assets) + (np.zeros((1, 7, 1), np.float32),))
+  model.load_weights(os.path.join(output_dir, WEIGHTS_DIR, "model")).expect_partial()
+  return model
+
+def predict(output_dir='artifacts', batch_size=32, plot=False):
+  #7 day forecast for every window of the test split, prints the mape and stores the (reverted) predictions
+  import numpy as np
+  from .resources import Timer, peakRss
+
+  config = loadConfig(output_dir)
+  #the test windows are created by prepare and memory mapped from the cache
+  arrays = loadPreparedArrays(output_dir)
+  assets = config.get('assets', ASSETS)
+  test_windows = tuple(arrays[asset + '_test_windows'] for asset in assets)
+  target_eth_test, decoder_data_test = arrays['target_test'], arrays['decoder_test']
+
+  model = loadTrainedModel(output_dir, config)
+  #we predict 7 days ahead, each time feeding the predicted value to the decoder, the encoders run only once
+  #and the decoders only compute the newest day (cached keys/values of the previous days)
+  with Timer() as timer:
+    saved_predictions = model.forecast(test_windows + (decoder_data_test,), horizon=7, batch_size=batch_size)
+  #same as tf.keras.losses.MeanAbsolutePercentageError
+  mape_value = 100*np.mean(np.abs(target_eth_test - saved_predictions)/np.maximum(np.abs(target_eth_test), 1e-7))
+  print("MAPE:", mape_value)
+  #the speed and memory next to the mape, to weigh a lower precision against its loss of accuracy
+  batches = -(-len(decoder_data_test)//batch_size)
+  predict_report = {'mape': mape_value, 'seconds': timer.seconds, 'samples/sec': len(decoder_data_test)/timer.seconds,
+                    'batch latency ms': 1000*timer.seconds/max(batches, 1), 'peak rss MB': peakRss()}
+  printReport("predict " + model.precision, predict_report)
+
+  mean, scale = loadScaler(output_dir, assets[0] + '_daily')
+  reverted_target_test = (target_eth_test*scale[3])+mean[3]
+  reverted_prediction_test = (saved_predictions*scale[3])+mean[3]
+  np.save(os.path.join(output_dir, "predictions.npy"), reverted_prediction_test)
+  if plot:
+    from .plots import plotTargetVsPrediction
+    plotTargetVsPrediction(reverted_target_test, reverted_prediction_test, filename=os.path.join(output_dir, "target_vs_prediction.png"))
+  return {'mape': float(mape_value), 'predictions': reverted_prediction_test, 'targets': reverted_target_test, 'report': predict_report}
+
+def intervals(output_dir='artifacts', samples=100, quantiles=(0.05, 0.5, 0.95), max_batch=4096, seed=None):
+  #monte carlo dropout intervals of the 7 day forecast of the test split, the (reverted) mean, std and quantiles per horizon
+  #are stored in intervals.npz, prints the coverage of the outer quantiles
+  import numpy as np
+  import tensorflow as tf
+  from .resources import Timer, peakRss
+
+  if seed is not None:
+    tf.keras.utils.set_random_seed(seed)
+  config = loadConfig(output_dir)
+  arrays = loadPreparedArrays(output_dir)
+  assets = config.get('assets', ASSETS)
+  test_windows = tuple(arrays[asset + '_test_windows'] for asset in assets)
+  target_eth_test, decoder_data_test = arrays['target_test'], arrays['decoder_test']
+
+  model = loadTrainedModel(output_dir, config)
+  quantiles = sorted(quantiles)
+  with Timer() as timer:
+    distribution = model.forecastIntervals(test_windows + (decoder_data_test,), samples, quantiles, horizon=7, max_batch=max_batch)
+
+  #the scaler is affine with a positive scale, so the quantiles of the scaled forecasts revert to the quantiles of the prices
+  mean, scale = loadScaler(output_dir, assets[0] + '_daily')
+  reverted_mean = (distribution['mean']*scale[3])+mean[3]
+  reverted_std = distribution['std']*scale[3]
+  reverted_quantiles = (distribution['quantiles']*scale[3])+mean[3]
+  reverted_target_test = (target_eth_test*scale[3])+mean[3]
+  np.savez(os.path.join(output_dir, "intervals.npz"), mean=reverted_mean, std=reverted_std, quantiles=reverted_quantiles,
+           levels=np.array(quantiles))
+  coverage = np.mean((reverted_target_test >= reverted_quantiles[0]) & (reverted_target_test <= reverted_quantiles[-1]), axis=0)
+  intervals_report = {'samples': samples, 'seconds': timer.seconds, 'forecasts/sec': samples*len(decoder_data_test)/timer.seconds,
+                      'coverage %g-%g' % (quantiles[0], quantiles[-1]): float(np.mean(coverage)),
+                      'mean width': float(np.mean(reverted_quantiles[-1] - reverted_quantiles[0])), 'peak rss MB': peakRss()}
+  printReport("intervals", intervals_report)
+  print("coverage per horizon:", " ".join("%.2f" % value for value in coverage))
+  return {'mean': reverted_mean, 'std': reverted_std, 'quantiles': reverted_quantiles, 'coverage': coverage, 'report': intervals_report}
+
+def backtest(data_dir='.', output_dir='artifacts', folds=8, first_cutoff=0.6, last_cutoff=0.87, test_fraction=0.1, epochs=5, batch_size=16,
+             processes=None, from_weights=False):
+  #walk-forward backtest with the model config of the output directory, the per fold, per horizon errors are written to backtest.csv
+  #from_weights refits the trained model of the output directory at every cutoff instead of training from scratch
+  from .backtest import foldCutoffs, runBacktest, summarizeByHorizon
+
+  if os.path.exists(os.path.join(output_dir, CONFIG_FILE)):
+    config = loadConfig(output_dir)
+  else:
+    config = {'model': {}, 'sequence_length': 42, 'week_length': 8}
+  os.makedirs(output_dir, exist_ok=True)
+  data_files = dataFiles(data_dir, config.get('assets', ASSETS))
+  initial_weights = os.path.join(output_dir, WEIGHTS_DIR, "model") if from_weights else None
+  rows = runBacktest(data_files, config, foldCutoffs(folds, first_cutoff, last_cutoff), os.path.join(output_dir, "backtest.csv"),
+                     test_fraction, epochs, batch_size, processes, initial_weights, config.get('cache_dir'))
+  for horizon, errors in summarizeByHorizon(rows).items():
+    print("day %d: mape %.3f, mae %.2f, rmse %.2f" % (horizon, errors['mape'], errors['mae'], errors['rmse']))
+  return rows
+
+def sweep(space, data_dir='.', output_dir='artifacts', trials=None, epochs=10, processes=None, threads=None, grace_epochs=2, testsize=0.13, seed=0,
+          assets=ASSETS):
+  #space is {parameter: list of values} or the path of a json file with it, the ranked trials are written to leaderboard.csv
+  from .sweep import runSweep
+
+  if isinstance(space, str):
+    with open(space) as space_file:
+      space = json.load(space_file)
+  os.makedirs(output_dir, exist_ok=True)
+  data_files = dataFiles(data_dir, assets)
+  return runSweep(data_files, space, os.path.join(output_dir, "leaderboard.csv"), trials, epochs, processes, threads, testsize, grace_epochs, seed=seed)
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog="eth_forecast", description="Ethereum price forecast with a Time2Vec transformer")
+  parser.add_argument('--output-dir', default='artifacts', help="directory of the prepared data, weights and predictions")
+  commands = parser.add_subparsers(dest='command', required=True)
+
+  ingest_parser = commands.add_parser('ingest', help="convert the csv files to the columnar float32 store")
+  ingest_parser.add_argument('--data-dir', default='.', help="directory with the four csv files")
+  ingest_parser.add_argument('--assets', nargs='+', default=ASSETS, help="assets of which the daily and weekly csv files are ingested")
+
+  prepare_parser = commands.add_parser('prepare', help="scale the csv files and store the series")
+  prepare_parser.add_argument('--data-dir', default='.', help="directory with the four csv files")
+  prepare_parser.add_argument('--sequence-length', type=int, default=42)
+  prepare_parser.add_argument('--week-length', type=int, default=8)
+  prepare_parser.add_argument('--testsize', type=float, default=0.13)
+  prepare_parser.add_argument('--cache-dir', default=None, help="preprocessing cache, $ETH_FORECAST_CACHE or ~/.cache/eth_forecast by default")
+  prepare_parser.add_argument('--cache-size', type=int, default=None, help="maximum size of the cache in bytes, old entries are evicted")
+  prepare_parser.add_argument('--refresh', action='store_true', help="rebuild the cache entry even when it exists")
+  prepare_parser.add_argument('--assets', nargs='+', default=ASSETS,
+                              help="an encoder tower per asset (daily and weekly csv file \"<ASSET>-USD - daily.csv\"), the first one is forecast")
+
+  train_parser = commands.add_parser('train', help="train the transformer on the prepared data")
+  train_parser.add_argument('--epochs', type=int, default=25)
+  train_parser.add_argument('--batch-size', type=int, default=16)
+  train_parser.add_argument('--device', choices=['tpu', 'gpu', 'cpu'], default=None, help="detected when not given")
+  train_parser.add_argument('--jit-compile', action='store_true', help="compile the train and predict steps with XLA")
+  train_parser.add_argument('--plot', action='store_true')
+  train_parser.add_argument('--precision', choices=['float32', 'mixed_float16', 'mixed_bfloat16'], default=None,
+                            help="mixed computes the attention and feed forward layers in 16 bit, float32 by default")
+  train_parser.add_argument('--log-dir', default=None, help="log samples/sec, step time, input wait and peak memory per epoch to this directory")
+  train_parser.add_argument('--profile-blocks', action='store_true', help="also log the forward time of the towers, fusion, decoders and head")
+  train_parser.add_argument('--profile-steps', type=int, nargs=2, default=None, metavar=('FIRST', 'LAST'), help="capture a profiler trace of these steps")
+  train_parser.add_argument('--keep-last', type=int, default=3, help="amount of epoch checkpoints to keep, next to the best one")
+  train_parser.add_argument('--resume', action='store_true', help="continue from the latest checkpoint")
+  train_parser.add_argument('--export', action='store_true', help="save the best checkpoint as a full SavedModel at the end")
+  train_parser.add_argument('--shared-encoder', action=argparse.BooleanOptionalAction, default=None,
+                            help="one encoder for all assets, run as a single batched call (--no-shared-encoder: one per asset), the stored one when not given")
+  train_parser.add_argument('--workers', type=int, default=1, help="data parallel training in this amount of local processes, each on its own cores")
+  train_parser.add_argument('--seed', type=int, default=None, help="seed of the weights and the shuffling (0 with --workers when not given)")
+  train_parser.add_argument('--attention-mode', choices=['joint', 'time', 'axial'], default=None,
+                            help="attention of the encoders and cross attention of the decoders: over time and heads jointly (default), time only or axial")
+  train_parser.add_argument('--steps-per-execution', type=int, default=1, help="train steps per call of the train function")
+  train_parser.add_argument('--accumulation-steps', type=int, default=1, help="compute every batch in this amount of micro batches")
+  train_parser.add_argument('--auto-batch-size', action='store_true',
+                            help="probe the largest micro batch that fits --memory-budget, at most --batch-size (the probe does not try larger "
+                                 "ones), and accumulate the gradients up to --batch-size")
+  train_parser.add_argument('--memory-budget', type=float, default=None, help="peak memory in MB of --auto-batch-size, 80%% of the available memory by default")
+  train_parser.add_argument('--decoding', choices=['autoregressive', 'direct'], default=None,
+                            help="feed every predicted day back to the decoders (default) or predict all 7 days in one pass")
+  train_parser.add_argument('--fusion', choices=['sum', 'mean', 'concat'], default=None, help="how the encoded assets are combined, sum by default")
+
+  predict_parser = commands.add_parser('predict', help="7 day forecast over the prepared test data")
+  predict_parser.add_argument('--batch-size', type=int, default=32)
+  predict_parser.add_argument('--plot', action='store_true')
+
+  intervals_parser = commands.add_parser('intervals', help="monte carlo dropout intervals of the 7 day forecast over the prepared test data")
+  intervals_parser.add_argument('--samples', type=int, default=100, help="forecasts per window, each with its own dropout")
+  intervals_parser.add_argument('--quantiles', type=float, nargs='+', default=[0.05, 0.5, 0.95])
+  intervals_parser.add_argument('--max-batch', type=int, default=4096, help="most rows (windows times samples) forecast at once")
+  intervals_parser.add_argument('--seed', type=int, default=None)
+
+  backtest_parser = commands.add_parser('backtest', help="walk-forward backtest over many cutoffs, in parallel processes")
+  backtest_parser.add_argument('--data-dir', default='.', help="directory with the four csv files")
+  backtest_parser.add_argument('--folds', type=int, default=8)
+  backtest_parser.add_argument('--first-cutoff', type=float, default=0.6, help="end of the train data of the first fold, as fraction of the series")
+  backtest_parser.add_argument('--last-cutoff', type=float, default=0.87)
+  backtest_parser.add_argument('--test-fraction', type=float, default=0.1, help="test data of every fold, as fraction of the series")
+  backtest_parser.add_argument('--epochs', type=int, default=5)
+  backtest_parser.add_argument('--batch-size', type=int, default=16)
+  backtest_parser.add_argument('--processes', type=int, default=None, help="amount of folds trained at the same time, one per core by default")
+  backtest_parser.add_argument('--from-weights', action='store_true', help="refit the trained model instead of training every fold from scratch")
+
+  sweep_parser = commands.add_parser('sweep', help="train the trials of a search space in parallel processes and rank them")
+  sweep_parser.add_argument('space', help="json file with {parameter: [values]}, e.g. {\"dropout\": [0.1, 0.4], \"learning_rate\": [0.005, 0.001]}")
+  sweep_parser.add_argument('--data-dir', default='.', help="directory with the four csv files")
+  sweep_parser.add_argument('--trials', type=int, default=None, help="amount of random trials, every combination by default")
+  sweep_parser.add_argument('--epochs', type=int, default=10)
+  sweep_parser.add_argument('--processes', type=int, default=None, help="amount of trials trained at the same time, one per core by default")
+  sweep_parser.add_argument('--threads', type=int, default=None, help="tensorflow threads per process, the cores divided over the processes by default")
+  sweep_parser.add_argument('--grace-epochs', type=int, default=2, help="epochs before a trial can be pruned")
+  sweep_parser.add_argument('--testsize', type=float, default=0.13)
+  sweep_parser.add_argument('--seed', type=int, default=0)
+  sweep_parser.add_argument('--assets', nargs='+', default=ASSETS, help="an encoder tower per asset, the first one is forecast")
+
+  serve_parser = commands.add_parser('serve', help="http service that forecasts the newest window, new bars are posted to it")
+  serve_parser.add_argument('--host', default='127.0.0.1')
+  serve_parser.add_argument('--port', type=int, default=8000)
+
+  export_parser = commands.add_parser('export', help="save the forecast graph of the trained weights for inference only")
+  export_parser.add_argument('--horizon', type=int, default=7)
+  export_parser.add_argument('--jit-compile', action='store_true', help="compile the forecast graph with XLA")
+
+  quantize_parser = commands.add_parser('quantize', help="int8 tensorflow lite forecast of the trained weights, checked against the float mape")
+  quantize_parser.add_argument('--mode', choices=['dynamic', 'int8'], default='dynamic',
+                               help="dynamic range (int8 weights) or full integer (also int8 activations, needs --attention-mode time or axial)")
+  quantize_parser.add_argument('--max-mape-drift', type=float, default=1.0, help="largest accepted change of the test mape, in percentage points")
+  quantize_parser.add_argument('--calibration-samples', type=int, default=200, help="train windows to calibrate the int8 activations on")
+
+  args = parser.parse_args(argv)
+  if args.command == 'sweep' and args.epochs < 1:
+    parser.error("--epochs must be at least 1")
+  if args.command == 'train' and args.workers > 1 and args.auto_batch_size:
+    parser.error("--auto-batch-size probes a single process, pass --accumulation-steps with --workers")
+  if args.command == 'quantize' and args.mode == 'int8' and os.path.exists(os.path.join(args.output_dir, CONFIG_FILE)) and \
+     loadConfig(args.output_dir)['model'].get('attention_mode', 'joint') == 'joint':
+    #the int8 kernels of tensorflow lite abort on the joint attention (see quantize.convert)
+    parser.error("--mode int8 needs a model trained with --attention-mode time or axial, use --mode dynamic for the joint attention")
+  if args.command == 'train' and args.workers > 1:
+    from .cluster import isWorker, runCluster
+    if not isWorker():
+      #the same command in every worker process, which see that they are a worker in their TF_CONFIG
+      import sys
+      sys.exit(runCluster(args.workers, sys.argv[1:] if argv is None else argv))
+  if args.command == 'ingest':
+    ingest(args.data_dir, args.assets)
+  elif args.command == 'prepare':
+    prepare(args.data_dir, args.output_dir, args.sequence_length, args.week_length, args.testsize, args.cache_dir, args.cache_size, args.refresh, args.assets)
+  elif args.command == 'train':
+    train(args.output_dir, args.epochs, args.batch_size, args.device, args.jit_compile, args.plot, args.precision, args.log_dir, args.profile_blocks,
+          args.profile_steps, args.keep_last, args.resume, args.export, args.shared_encoder, args.fusion, args.attention_mode,
+          args.seed, args.decoding, args.steps_per_execution, args.accumulation_steps, args.auto_batch_size, args.memory_budget)
+  elif args.command == 'predict':
+    predict(args.output_dir, args.batch_size, args.plot)
+  elif args.command == 'intervals':
+    intervals(args.output_dir, args.samples, args.quantiles, args.max_batch, args.seed)
+  elif args.command == 'backtest':
+    backtest(args.data_dir, args.output_dir, args.folds, args.first_cutoff, args.last_cutoff, args.test_fraction, args.epochs, args.batch_size,
+             args.processes, args.from_weights)
+  elif args.command == 'sweep':
+    sweep(args.space, args.data_dir, args.output_dir, args.trials, args.epochs, args.processes, args.threads, args.grace_epochs, args.testsize, args.seed, args.assets)
+  elif args.command == 'serve':
+    from .service import serve
+    serve(args.output_dir, args.host, args.port)
+  elif args.command == 'export':
+    exportInference(args.output_dir, args.horizon, args.jit_compile)
+  elif args.command == 'quantize':
+    quantize(args.output_dir, args.mode, args.max_mape_drift, args.calibration_samples)
@@ -0,0 +1,93 @@
+"""Data-parallel cpu training with a cluster of local worker processes (python -m eth_forecast train --workers N).
+
+Every worker is a copy of the train command with its own TF_CONFIG (a MultiWorkerMirroredStrategy cluster over localhost),
+pinned to its own subset of the cores with its own TensorFlow thread pools. The batches of batch_size samples are split
+over the workers and the gradients are all-reduced, so a step is the same step as in a single process with that batch size.
+Only the chief (worker 0) writes the weights, checkpoints, history and logs.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+CORES_VARIABLE = 'ETH_FORECAST_WORKER_CORES'
+
+
+def freePorts(amount):
+  #ports that are free now, the sockets are kept open until all are picked such that no port is returned twice
+  sockets = []
+  try:
+    for _ in range(amount):
+      sock = socket.socket()
+      sock.bind(('localhost', 0))
+      sockets.append(sock)
+    return [sock.getsockname()[1] for sock in sockets]
+  finally:
+    for sock in sockets:
+      sock.close()
+
+def coreSubsets(workers, cores=None):
+  #the available cores split into workers contiguous parts (neighbouring cores share caches and the socket),
+  #with fewer cores than workers the workers share them round robin
+  cores = sorted(cores if cores is not None else os.sched_getaffinity(0))
+  if len(cores) < workers:
+    return [[cores[index % len(cores)]] for index in range(workers)]
+  size, remainder = divmod(len(cores), workers)
+  subsets, start = [], 0
+  for index in range(workers):
+    end = start + size + (1 if index < remainder else 0)
+    subsets.append(cores[start:end])
+    start = end
+  return subsets
+
+def workerEnvironment(index, ports, cores):
+  environment = dict(os.environ)
+  environment['TF_CONFIG'] = json.dumps({'cluster': {'worker': ['localhost:%d' % port for port in ports]}, 'task': {'type': 'worker', 'index': index}})
+  environment[CORES_VARIABLE] = ",".join(str(core) for core in cores)
+  return environment
+
+def isWorker():
+  return 'TF_CONFIG' in os.environ
+
+def isChief():
+  #worker 0 of the cluster, or a single process
+  if not isWorker():
+    return True
+  task = json.loads(os.environ['TF_CONFIG']).get('task', {})
+  return task.get('type', 'worker') in ('worker', 'chief') and task.get('index', 0) == 0
+
+def pinWorker():
+  #pins this worker to its cores and sizes the thread pools to them, it has to run before tensorflow starts its thread pools
+  if CORES_VARIABLE not in os.environ:
+    return
+  cores = [int(core) for core in os.environ[CORES_VARIABLE].split(",")]
+  os.sched_setaffinity(0, cores)
+  import tensorflow as tf
+  tf.config.threading.set_intra_op_parallelism_threads(len(cores))
+  tf.config.threading.set_inter_op_parallelism_threads(1)
+
+def runCluster(workers, argv, cores=None):
+  #runs python -m eth_forecast argv in workers processes as one cluster, returns the exit code (the first failing one)
+  ports = freePorts(workers)
+  processes = []
+  for index, worker_cores in enumerate(coreSubsets(workers, cores)):
+    #only the chief prints, the other workers would repeat the same progress bars
+    output = None if index == 0 else subprocess.DEVNULL
+    processes.append(subprocess.Popen([sys.executable, '-m', 'eth_forecast'] + list(argv), env=workerEnvironment(index, ports, worker_cores),
+                                      stdout=output))
+  try:
+    while True:
+      codes = [process.poll() for process in processes]
+      failed = [code for code in codes if code not in (None, 0)]
+      if failed or all(code == 0 for code in codes):
+        break
+      time.sleep(0.5)
+  finally:
+    #a failed worker leaves the others waiting for it in the all-reduce
+    for process in processes:
+      if process.poll() is None:
+        process.terminate()
+        process.wait()
+  return failed[0] if failed else 0
@@ -0,0 +1,225 @@
+"""Loading, scaling and windowing of the daily and weekly OHLCV data, only depends on numpy."""
+import math
+
+import numpy as np
+
+# Variables: ['Open', 'High','Low', 'Close', 'Volume'], the close price (index 3) is forecasted
+COLUMNS = ['Open', 'High','Low', 'Close', 'Volume']
+
+def retrieve_data(filename, start=None, end=None):
+  #filename is a csv file or a columnar store (see storage.py), an up to date store of a csv file is used instead of the csv
+  #start and end limit the rows to start <= Date < end
+  from .storage import openStore, isStore, resolveDataPath
+  filename = resolveDataPath(filename)
+  if isStore(filename):
+    return openStore(filename, start, end)[1]
+  #pandas and sklearn are only imported when data is loaded, so importing this module stays cheap
+  import pandas as pd
+  # Remove redundant features if they are found
+  if start is None and end is None:
+    data = pd.read_csv(filename, usecols=COLUMNS)
+  else:
+    data = pd.read_csv(filename, usecols=['Date'] + COLUMNS, parse_dates=['Date'])
+    if start is not None:
+      data = data[data['Date'] >= pd.Timestamp(start)]
+    if end is not None:
+      data = data[data['Date'] < pd.Timestamp(end)]
+  #usecols does not keep the order of the list, the order of COLUMNS is the order of the features
+  return data[COLUMNS].to_numpy()
+
+def scaleAndFilterData(data, testsize=0.13, dtype=np.float32):
+  # Split the train and test data, not at random, only last section for test set such that
+  # the model has not seen already seen any of the data it is tested on (more realistic scenario)
+  split_index = math.floor((1-testsize)*len(data))
+  train_data = data[:split_index]
+  test_data = data[split_index:]
+  #perform standardization (not norm) to scale data, in this case i think its better, with minmaxscaling prices like 80$ will be squashed to almost zero
+  #when we have also prices of 3000 or something like that, scale train and test data separately
+  # Perform minmax-scaling (separately for train and test data)
+  from sklearn.preprocessing import StandardScaler
+  train_scaler = StandardScaler()
+  #the scaler is fitted in float64, the scaled data is float32 from here on (the dtype of the model inputs, no cast or copy later)
+  scaled_train = np.asarray(train_scaler.fit_transform(train_data), dtype=dtype)
+  scaled_test = np.asarray(train_scaler.transform(test_data), dtype=dtype)
+  return train_scaler, scaled_train, scaled_test
+
+def shuffleLists(eth_train, btc_train, y, decoder_data):
+  "shuffle the data at random, so that we (hopefully) learn better, otherwise, within a batch, all patters are really similar, just forcing it to learn a certain pattern"
+  "for each batch, however, now a batch consists of random samples over time, forcing the model to (hopefully) learn a global pattern from a batch"
+  "instead of forcing a (potential) local pattern"
+  #one random permutation of the indices is applied to all four arrays, so the samples stay aligned (also btc)
+  #and every array is copied only once instead of going through a list of tuples
+  permutation = np.random.permutation(len(eth_train))
+  y = np.take(np.asarray(y), permutation, axis=0)
+  y = np.reshape(y,(y.shape[0],y.shape[1]))
+  decoder_data = np.take(np.asarray(decoder_data), permutation, axis=0)
+  decoder_data = np.reshape(decoder_data,(decoder_data.shape[0],decoder_data.shape[1],2))
+  return (np.take(np.asarray(eth_train), permutation, axis=0), np.take(np.asarray(btc_train), permutation, axis=0), y, decoder_data)
+
+def createTimeEmbeddingsInput( data_slice, sequence_length, week_length):
+  time_vector_days =  np.linspace(0, 1, sequence_length, dtype=np.float32)
+  time_vector_week = np.linspace(0,1,week_length, dtype=np.float32)
+  complete_time_embedding = np.concatenate((time_vector_week, time_vector_days))
+  reshape = np.reshape(complete_time_embedding,(len(complete_time_embedding),1))
+  return reshape
+
+def createTimeEmbeddingsOutput(data_slice, sequence_length, week_length):
+  target_embedding = np.linspace(0,1,7, dtype=np.float32)
+  reshape = np.reshape(target_embedding, (len(target_embedding),1))
+  return reshape
+
+#windowing engine, shared by all the prepare functions below
+#instead of slicing and concatenating every sample in a python loop, all windows are taken at once as strided views
+#on the original arrays (no copy) and then written a single time into one preallocated array
+def slidingWindows(data, window_length):
+  #view of shape (amount_of_windows, window_length, ...) where window i is data[i:i+window_length]
+  data = np.asarray(data)
+  if data.shape[0] < window_length:
+    return np.empty((0, window_length) + data.shape[1:], dtype=data.dtype)
+  windows = np.lib.stride_tricks.sliding_window_view(data, window_length, axis=0)
+  #sliding_window_view puts the window axis last, move it back next to the sample axis
+  return np.moveaxis(windows, -1, 1)
+
+def amountOfInputWindows(amount_of_days, amount_of_weeks, sequence_length, week_length):
+  #a sample i needs the days i..i+sequence_length and the weeks i//7..i//7+week_length,
+  #the old loops stopped at the first sample for which one of the two did not fit anymore
+  daily_windows = amount_of_days - sequence_length + 1
+  weekly_windows = 7*(amount_of_weeks - week_length + 1)
+  return max(0, min(daily_windows, weekly_windows))
+
+def buildInputWindows(data_daily, data_weekly, sequence_length, week_length, dtype=np.float32, time_column=True):
+  #creates all (week_length+sequence_length, 1+features) samples: [time embedding, weekly rows followed by daily rows]
+  #with time_column=False the samples are (week_length+sequence_length, features), for Transformer(time_table=True)
+  data_daily = np.asarray(data_daily)
+  data_weekly = np.asarray(data_weekly)
+  amount = amountOfInputWindows(data_daily.shape[0], data_weekly.shape[0], sequence_length, week_length)
+  features = data_daily.shape[-1]
+  first = 1 if time_column else 0
+  all_sequences = np.empty((amount, week_length+sequence_length, first+features), dtype=dtype)
+  if amount == 0:
+    return all_sequences
+  #the time embedding is the same for every sample, so it is created once and broadcast
+  if time_column:
+    all_sequences[:, :, 0] = createTimeEmbeddingsInput(None, sequence_length, week_length)[:, 0]
+  all_sequences[:, week_length:, first:] = slidingWindows(data_daily, sequence_length)[:amount]
+  #sample i uses weekly window i//7, so every 7th sample (starting at offset r) uses consecutive weekly windows,
+  #this gathers the weekly windows without creating an index array or an intermediate copy
+  weekly_windows = slidingWindows(data_weekly, week_length)
+  for offset in range(min(7, amount)):
+    samples = all_sequences[offset::7]
+    samples[:, :week_length, first:] = weekly_windows[:samples.shape[0]]
+  return all_sequences
+
+def buildTargetWindows(data, horizon=7, amount=None, dtype=np.float32):
+  #creates all (horizon, 1) windows data[i:i+horizon] of a 1d series
+  windows = slidingWindows(data, horizon)
+  if amount is not None:
+    windows = windows[:max(0, amount)]
+  all_targets = np.empty((windows.shape[0], horizon, 1), dtype=dtype)
+  all_targets[:, :, 0] = windows
+  return all_targets
+
+#the slicing of the series is kept in separate functions, such that the numpy prepare functions below
+#and the tf.data pipeline use exactly the same alignment of the dates
+def trainInputSeries(data_daily_og, data_weekly_og, week_length):
+  #we need want to start at same data of weeks and daily and then 8 weeks prior, so thats 56 days already discarded
+  #and we need to start on same date, first date in common is 11-13, so we start from there, that means already 1 input of week discarded and first 4 days discarded,
+  #which means 60 days and 1 week discarded from the dataset
+  #then discard last 7 entries from daily and 1 from weekly as we predict 7 days ahead with model
+  data_daily = data_daily_og[3:-2] #skip first 4 entries and last 2 to line up dates with the weekly
+  data_weekly = data_weekly_og[1:-2] #same here
+  data_daily = data_daily[week_length*6+3:-7]
+  return data_daily, data_weekly
+
+def trainTargetSeries(data_daily_og, sequence_length, week_length):
+  data = data_daily_og[3:-2,3] #skip first 4 entries and last 2 to line up dates with the weekly
+  return data[week_length*6 + sequence_length+3:]
+
+def trainDecoderSeries(data_daily_og, sequence_length, week_length):
+  data = data_daily_og[3:-2,3] #skip first 4 entries and last 2 to line up dates with the weekly
+  return data[week_length*6 + sequence_length+2:]
+
+def prepareTrainDataX(data_daily_og, data_weekly_og,sequence_length, week_length, time_column=True):
+  data_daily, data_weekly = trainInputSeries(data_daily_og, data_weekly_og, week_length)
+  return buildInputWindows(data_daily, data_weekly, sequence_length, week_length, time_column=time_column)
+
+
+
+def prepareTargetDataY(data_daily_og, sequence_length, week_length, train=True):
+  #we do the original modification of the train data, getting rid of the fist 3 entries
+  #then we get rid of the first 56 as with train, as this was required to have the 8 week historic price action
+  #then we get rid of 28, days as these are used for the first set of training data, so no prediction is made using these dayts
+  #so in total, get rid of 84 entries then, first entry is a target value, we predict 7 values ahead of the close price (3 index in array)
+  data = trainTargetSeries(data_daily_og, sequence_length, week_length)
+  return buildTargetWindows(data, 7)
+
+def prepareDecoderData(data_daily_og, sequence_length, week_length, train=True, time_column=True):
+  #we do the original modification of the train data, getting rid of the fist 3 entries
+  #then we get rid of the first 56 as with train, as this was required to have the 8 week historic price action
+  #then we get rid of 28, days as these are used for the first set of training data, so no prediction is made using these dayts
+  #so in total, get rid of 84 entries then, first entry is a target value, we predict 7 values ahead of the close price (3 index in array)
+  data = trainDecoderSeries(data_daily_og, sequence_length, week_length)
+  #the last window is dropped as it has no target anymore
+  decoder_windows = buildTargetWindows(data, 7, amount=len(data)-7)
+  if not time_column:
+    return decoder_windows
+  timevec = createTimeEmbeddingsOutput(None, sequence_length, week_length)
+  sequence_y = np.empty((decoder_windows.shape[0], 7, 2), dtype=decoder_windows.dtype)
+  sequence_y[:, :, 0] = timevec[:, 0]
+  sequence_y[:, :, 1:] = decoder_windows
+  return sequence_y
+
+def testWindowFirstWeek(first_day, week_length):
+  #index of the first weekly row of the input window whose first daily row is first_day, both are indices of the series that
+  #prepareTestDataX gets (its window i starts at day week_length*6+6+i and at week i//7), for windows after the test split
+  #(the service) with the same alignment
+  return (first_day - (week_length*6 + 6))//7
+
+def prepareTestDataX(data_daily_og, data_weekly_og,sequence_length, week_length, time_column=True):
+  #we need want to start at same data of weeks and daily and then 8 weeks prior, so thats 56 days already discarded
+  #and we need to start on same date, first date in common is 11-13, so we start from there, that means already 1 input of week discarded and first 4 days discarded,
+  #which means 60 days and 1 week discarded from the dataset
+  #then discard last 7 entries from daily and 1 from weekly as we predict 7 days ahead with model
+  data_daily_test = data_daily_og[4:] #skip first 4 entries and last 2 to line up dates with the weekly
+  data_weekly_test = data_weekly_og #same here
+  data_daily_test = data_daily_test[week_length*6+2:-7]
+  return buildInputWindows(data_daily_test, data_weekly_test, sequence_length, week_length, time_column=time_column)
+
+
+
+def prepareTargetDataYTest(data_daily_og, sequence_length, week_length):
+  #we do the original modification of the train data, getting rid of the fist 3 entries
+  #then we get rid of the first 56 as with train, as this was required to have the 8 week historic price action
+  #then we get rid of 28, days as these are used for the first set of training data, so no prediction is made using these dayts
+  #so in total, get rid of 84 entries then, first entry is a target value, we predict 7 values ahead of the close price (3 index in array)
+  data = data_daily_og[4:,3] #skip first 4 entries and last 2 to line up dates with the weekly
+  data = data[week_length*6 + sequence_length+2:]
+  return buildTargetWindows(data, 7)
+
+def prepareDecoderDataTest(data_daily_og, sequence_length, week_length):
+  #we do the original modification of the train data, getting rid of the fist 3 entries
+  #then we get rid of the first 56 as with train, as this was required to have the 8 week historic price action
+  #then we get rid of 28, days as these are used for the first set of training data, so no prediction is made using these dayts
+  #so in total, get rid of 84 entries then, first entry is a target value, we predict 7 values ahead of the close price (3 index in array)
+
+  data = data_daily_og[4:,3] #skip first 4 entries and last 2 to line up dates with the weekly
+  data = data[week_length*6 + sequence_length+1:]
+  #now only the first as in the test set, to make it completely realistic, we will not know the next prices for the coming days
+  return buildTargetWindows(data, 1, amount=len(data)-7)
+
+
+def stackData(eth_test, btc_test, y_test, decoder_data_test):
+  #the prepare functions already return stacked arrays, asarray does not copy them again
+  y_test = np.asarray(y_test)
+  y_test = np.reshape(y_test,(y_test.shape[0],y_test.shape[1]))
+  decoder_data_test = np.asarray(decoder_data_test)
+  decoder_data_test = np.reshape(decoder_data_test,(decoder_data_test.shape[0],decoder_data_test.shape[1],1))
+  return (np.asarray(eth_test), np.asarray(btc_test), y_test, decoder_data_test)
+
+#prediction on test set
+def createTimeEmbeddingsOutputSpecial(batch_size, amount_of_time_embeddings):
+  #create time embeddings for the time2vec layer in batches
+  target_embeddings = np.linspace(0,1,7, dtype=np.float32)
+  target_embeddings = target_embeddings[:amount_of_time_embeddings+1]
+  reshape = np.reshape(target_embeddings, (1, len(target_embeddings), 1))
+  return np.tile(reshape, (batch_size,1,1))
@@ -0,0 +1,81 @@
+"""Inference-only export of a trained Transformer: the forecast graph as a SavedModel with fixed input signatures.
+
+The export holds the variables and one concrete function (asset windows..., decoder_start) -> forecast, with the encoders,
+the Time2Vec tables and the autoregressive decoder loop inside the graph and training=False (no dropout, no optimizer).
+The window inputs are (None, week_length+sequence_length, 5) per asset as prepare creates them (the time embedding is
+part of the graph), decoder_start is (None, 1, 1). InferenceModel loads it without the model code and warms it up.
+"""
+import json
+import os
+
+import numpy as np
+import tensorflow as tf
+
+META_FILE = "inference.json"
+
+
+def inputSignature(assets, window_length, features=5):
+  return [tf.TensorSpec([None, window_length, features], tf.float32, name=asset) for asset in assets] + \
+         [tf.TensorSpec([None, 1, 1], tf.float32, name='decoder_start')]
+
+def servingFunctions(model, horizon=7, jit_compile=False):
+  #(forecast, serving) with the fixed input signature, serving returns {'forecast': forecast} as the serving_default signature
+  signature = inputSignature(model.assets, model.sequence_length + model.week_length)
+  forecast = model.forecastFunction(horizon, jit_compile, input_signature=signature)
+  serving = tf.function(lambda *inputs: {'forecast': forecast(*inputs)}, input_signature=signature)
+  return forecast, serving
+
+def inferenceMeta(model, horizon):
+  return {'assets': list(model.assets), 'sequence_length': model.sequence_length, 'week_length': model.week_length,
+          'window_length': model.sequence_length + model.week_length, 'horizon': horizon, 'precision': model.precision}
+
+def exportInference(model, path, horizon=7, jit_compile=False):
+  #the model must be built (called once), the variables are saved as they are
+  forecast, serving = servingFunctions(model, horizon, jit_compile)
+  module = tf.Module()
+  #only the variables and the forecast function are saved, not the keras model (its call and train functions)
+  module.model_variables = list(model.variables)
+  module.forecast = forecast
+  tf.saved_model.save(module, path, signatures={'serving_default': serving.get_concrete_function()})
+  with open(os.path.join(path, META_FILE), 'w') as meta_file:
+    json.dump(inferenceMeta(model, horizon), meta_file, indent=2)
+  return path
+
+class InferenceModel:
+    #predictBatch of an exported forecast graph, the first (slow) call is done when it is loaded instead of in the first request
+
+    def __init__(self, path, warmup=True):
+      with open(os.path.join(path, META_FILE)) as meta_file:
+        self.meta = json.load(meta_file)
+      self.assets = self.meta['assets']
+      self.window_length = self.meta['window_length']
+      self.horizon = self.meta['horizon']
+      self.forecast_function = self.loadForecastFunction(path)
+      if warmup:
+        self.predictBatch([np.zeros((1, self.window_length, 5), np.float32) for _ in self.assets])
+
+    def loadForecastFunction(self, path):
+      #the loaded object owns the variables, the function alone would not keep them alive
+      self.loaded = tf.saved_model.load(path)
+      return self.loaded.forecast
+
+    def predictBatch(self, windows, decoder_start=None, batch_size=None):
+      #windows has a (batch, window_length, 5) array of scaled windows per asset, in the order of self.assets
+      #decoder_start is (batch, 1, 1), by default the last close of the first asset (as prepareDecoderDataTest)
+      #returns the (batch, horizon) scaled forecasts, batch_size splits large batches into parts of at most that size
+      if len(windows) != len(self.assets):
+        raise ValueError("expected a window per asset (%s), got %d" % (", ".join(self.assets), len(windows)))
+      windows = [np.asarray(window, np.float32) for window in windows]
+      for window in windows:
+        if window.shape[1:] != (self.window_length, 5):
+          raise ValueError("windows must be (batch, %d, 5), got %s" % (self.window_length, window.shape))
+      if decoder_start is None:
+        decoder_start = windows[0][:, -1:, 3:4]
+      decoder_start = np.asarray(decoder_start, np.float32).reshape(-1, 1, 1)
+      amount = len(decoder_start)
+      batch_size = batch_size or max(amount, 1)
+      forecasts = []
+      for start in range(0, amount, batch_size):
+        end = start + batch_size
+        forecasts.append(np.asarray(self.forecast_function(*[window[start:end] for window in windows], decoder_start[start:end])))
+      return np.concatenate(forecasts) if forecasts else np.zeros((0, self.horizon), np.float32)
@@ -0,0 +1,155 @@
+"""Training instrumentation: throughput, step time and input wait per epoch, per block forward timings and profiler traces.
+
+Everything is written to a log directory: metrics.jsonl (one line per epoch), TensorBoard scalars and the profiler trace.
+Nothing of this is created when it is not asked for, the model only has timing ops with Transformer(profile_blocks=True).
+"""
+import json
+import os
+import time
+
+import tensorflow as tf
+
+from .resources import peakRss
+
+#the blocks of Transformer.call of the eth/btc model, in the order they run (a tower per asset, or assets_tower when it is shared)
+BLOCKS = ('eth_tower', 'btc_tower', 'fusion', 'decoder', 'linear_head')
+
+
+class BlockTimer:
+    #accumulates the forward time of the blocks of Transformer.call in variables, so it also works inside the traced train step
+    #every block waits for the end of the previous one (control dependencies), which serializes the eth and btc towers,
+    #the timestamps are host time, so the timings are for cpu and gpu without XLA (jit_compile=False)
+    #this is a plain object, not a layer, such that the variables are not part of the weights of the model
+
+    def __init__(self, names=BLOCKS):
+      aggregation = tf.VariableAggregation.ONLY_FIRST_REPLICA
+      self.seconds = {name: tf.Variable(0.0, dtype=tf.float64, trainable=False, aggregation=aggregation, name=name + "_seconds") for name in names}
+      self.calls = tf.Variable(0, dtype=tf.int64, trainable=False, aggregation=aggregation, name="block_calls")
+      self.step_start = tf.Variable(0.0, dtype=tf.float64, trainable=False, aggregation=aggregation, name="step_start")
+      self.last = None
+
+    def gate(self, dependency, tensors):
+      #tensors that are only available after dependency ran
+      with tf.control_dependencies([dependency]):
+        return tf.nest.map_structure(tf.identity, tensors)
+
+    def start(self, tensors):
+      #starts the first block once tensors are available, returns the gated tensors
+      with tf.control_dependencies(tf.nest.flatten(tensors)):
+        self.last = tf.timestamp()
+      self.calls.assign_add(1)
+      return self.gate(self.last, tensors)
+
+    def lap(self, name, tensors):
+      #the time since the previous block ended is added to name once tensors are available, returns the gated tensors
+      with tf.control_dependencies(tf.nest.flatten(tensors)):
+        end = tf.timestamp()
+      self.seconds[name].assign_add(end - self.last)
+      self.last = end
+      return self.gate(end, tensors)
+
+    def markStepStart(self, data):
+      #host time at which the train step has its batch, the callback takes the time before it as input wait
+      with tf.control_dependencies(tf.nest.flatten(data)):
+        assign = self.step_start.assign(tf.timestamp())
+      return self.gate(assign, data)
+
+    def read(self):
+      #{block: milliseconds per call} since the last reset
+      calls = max(int(self.calls.numpy()), 1)
+      return {name: 1000*float(seconds.numpy())/calls for name, seconds in self.seconds.items()}
+
+    def reset(self):
+      for seconds in self.seconds.values():
+        seconds.assign(0.0)
+      self.calls.assign(0)
+
+class InstrumentationCallback(tf.keras.callbacks.Callback):
+    #logs samples/sec, step time, input wait time, peak rss and (when the model has a BlockTimer) the block timings per epoch
+    #profile_steps=(first, last) captures a profiler trace of those train steps (counted over all epochs) into log_dir/profile
+    #steps_per_execution is that of model.compile, the batch hooks are then called once per execution of that many steps
+
+    def __init__(self, log_dir, batch_size, profile_steps=None, verbose=True, steps_per_execution=1):
+      super().__init__()
+      self.log_dir = log_dir
+      self.batch_size = batch_size
+      self.profile_steps = profile_steps
+      self.verbose = verbose
+      self.steps_per_execution = steps_per_execution
+      self.step = 0
+      self.profiling = False
+      self.profiled = False
+      #the first execution traces the train function, its input wait would include the tracing
+      self.traced = False
+      os.makedirs(log_dir, exist_ok=True)
+      self.writer = tf.summary.create_file_writer(os.path.join(log_dir, "metrics"))
+
+    def blockTimer(self):
+      return getattr(self.model, 'block_timer', None)
+
+    def on_epoch_begin(self, epoch, logs=None):
+      self.epoch_start = time.perf_counter()
+      self.step_seconds, self.input_wait_seconds, self.samples, self.steps, self.waited_executions = 0.0, 0.0, 0, 0, 0
+      self.block_ms = None
+      if self.blockTimer() is not None:
+        self.blockTimer().reset()
+
+    def on_train_batch_begin(self, batch, logs=None):
+      #the trace starts with the execution that contains the first profiled step
+      if self.profile_steps and not self.profiling and not self.profiled and self.step + self.steps_per_execution > self.profile_steps[0]:
+        tf.profiler.experimental.start(os.path.join(self.log_dir, "profile"))
+        self.profiling = True
+      self.batch_begin = time.time()
+      self.batch_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+      #keras converts the logs to numpy for a callback with batch hooks, so the step is done here and the time includes its compute
+      #with steps_per_execution the hooks are called once per execution, batch is the index of its last step
+      self.step_seconds += time.perf_counter() - self.batch_start
+      steps = batch + 1 - self.steps
+      self.samples += steps*self.batch_size
+      self.steps += steps
+      if self.blockTimer() is not None and self.traced:
+        self.input_wait_seconds += max(0.0, float(self.blockTimer().step_start.numpy()) - self.batch_begin)
+        self.waited_executions += 1
+      self.traced = True
+      self.step += steps
+      if self.profiling and self.step > self.profile_steps[1]:
+        tf.profiler.experimental.stop()
+        self.profiling = False
+        self.profiled = True
+
+    def on_test_begin(self, logs=None):
+      #the validation also calls the model, the block timings of the train steps are read before it
+      if self.blockTimer() is not None and self.block_ms is None:
+        self.block_ms = self.blockTimer().read()
+
+    def on_epoch_end(self, epoch, logs=None):
+      steps = max(self.steps, 1)
+      record = {'epoch': epoch, 'seconds': time.perf_counter() - self.epoch_start, 'samples/sec': self.samples/max(self.step_seconds, 1e-9),
+                'step_ms': 1000*self.step_seconds/steps, 'peak_rss_mb': peakRss()}
+      if self.blockTimer() is not None:
+        #the input wait can only be measured inside the train step, so only with the block timer, and only with one step per
+        #execution (the step start of the last step of an execution would also include the compute of the steps before it)
+        if self.steps_per_execution == 1:
+          record['input_wait_ms'] = 1000*self.input_wait_seconds/max(self.waited_executions, 1)
+        record['block_forward_ms'] = self.block_ms if self.block_ms is not None else self.blockTimer().read()
+      record.update({key: float(value) for key, value in (logs or {}).items()})
+      with open(os.path.join(self.log_dir, "metrics.jsonl"), 'a') as metrics_file:
+        metrics_file.write(json.dumps(record) + "\n")
+      with self.writer.as_default(step=epoch):
+        for key, value in record.items():
+          if isinstance(value, dict):
+            for name, block_value in value.items():
+              tf.summary.scalar(key + "/" + name, block_value)
+          elif key != 'epoch':
+            tf.summary.scalar(key, value)
+      self.writer.flush()
+      if self.verbose:
+        print("epoch %d: %.1f samples/sec, step %.1f ms, peak rss %.0f MB" % (epoch, record['samples/sec'], record['step_ms'], record['peak_rss_mb']),
+              record.get('block_forward_ms', ""))
+
+    def on_train_end(self, logs=None):
+      if self.profiling:
+        tf.profiler.experimental.stop()
+        self.profiling = False
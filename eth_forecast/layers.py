@@ -0,0 +1,295 @@
+"""Keras layers of the transformer: Time2Vec, Encoder, Decoder, the horizon queries and the Linear head."""
+import tensorflow as tf
+from keras.layers import Dense
+from keras.layers import Layer
+from keras.layers import LayerNormalization
+from keras.layers import LeakyReLU
+from keras.layers import MultiHeadAttention
+from keras.layers import TimeDistributed
+from keras.layers import concatenate
+from keras.regularizers import L2
+
+#time2vec layer
+class Time2Vec(Layer):
+
+    def __init__(self, k=4, **kwargs):
+        self.k = k
+        super(Time2Vec, self).__init__(**kwargs)
+
+    def build(self, input_shape):
+        #times the input, so amount of rows of w must be equal to amount of colums of input, we multiple input * weights instead of the opposite (used in paper)
+      self.w = self.add_weight(name='w', shape=(input_shape[-1], self.k), initializer='uniform',trainable=True,regularizer=L2(0.001))#weights if i>0
+      self.fi = self.add_weight(name='fi', shape=(input_shape[1],self.k),initializer='uniform',trainable=True, regularizer=L2(0.001))#weights if i>0
+
+      self.w0 = self.add_weight(name='w0', shape=(input_shape[-1],1),initializer='uniform', trainable=True,regularizer=L2(0.001)) #weights for i=0
+      self.fi0 = self.add_weight(name='fi0', shape=(input_shape[1],1),initializer='uniform', trainable=True,regularizer=L2(0.001)) #weights for i=0
+      super(Time2Vec, self).build(input_shape)
+
+    def call(self, inputs, offset=0):
+      #offset is the sequence position of the first input row, used when only the newest positions are fed (incremental decoding)
+      input_shape = tf.shape(inputs)
+      first_entry = tf.matmul(inputs,self.w0) +self.fi0[offset:offset+input_shape[1]]
+      rest_of_time_vector = tf.matmul(inputs,self.w) + self.fi[offset:offset+input_shape[1]]
+      output = tf.math.sin(rest_of_time_vector)
+      return_value = concatenate([first_entry,output], -1)
+      #also flatten output? but what is the point then of the timedistributed layer
+      return return_value
+
+    def get_config(self):
+      config = super().get_config().copy()
+      config.update({
+        'k': self.k
+      })
+      return config
+
+def applyDenseLayers(layers, inputs, fused=True):
+  #Dense already works on the last axis of 3d inputs, so the layers are applied directly (one graph, no new layer objects per call)
+  #wrapping every layer in a new TimeDistributed is the old (unfused) path, only kept to compare against
+  forward = inputs
+  for layer in layers:
+    forward = layer(forward) if fused else TimeDistributed(layer)(forward)
+  return forward
+
+class CachedMultiHeadAttention(MultiHeadAttention):
+    #MultiHeadAttention that can also attend to keys and values that are already projected,
+    #such that the keys/values of previous positions (or of the encoder output) are computed only once when decoding
+    #the layer must be built (called once with normal inputs) before these functions are used
+
+    def projectKeyValue(self, key, value=None):
+      if value is None:
+        value = key
+      return self._key_dense(key), self._value_dense(value)
+
+    def attendCached(self, query, projected_key, projected_value, training=None):
+      query = self._query_dense(query)
+      attention_output, _ = self._compute_attention(query, projected_key, projected_value, None, training)
+      return self._output_dense(attention_output)
+
+    def _masked_softmax(self, attention_scores, attention_mask=None):
+      #with a mixed precision policy the softmax is computed in float32 (the projections stay in float16/bfloat16)
+      if attention_scores.dtype == tf.float32:
+        return super()._masked_softmax(attention_scores, attention_mask)
+      scores = tf.cast(attention_scores, tf.float32)
+      if attention_mask is not None:
+        mask_expansion_axis = -len(self._attention_axes) * 2 - 1
+        for _ in range(len(attention_scores.shape) - len(attention_mask.shape)):
+          attention_mask = tf.expand_dims(attention_mask, axis=mask_expansion_axis)
+        scores += (1.0 - tf.cast(attention_mask, tf.float32)) * -1e9
+      #same as the Softmax layer over the attention axes
+      normalized = tf.exp(scores - tf.reduce_logsumexp(scores, axis=self._softmax.axis, keepdims=True))
+      return tf.cast(normalized, attention_scores.dtype)
+
+#the attention_axes of the projected (batch, positions, heads, size_of_head) tensors per attention mode:
+#'joint' attends over all (position, head) pairs at once (the original layers), its cost grows with (positions*heads)^2,
+#'time' attends over the positions only, every head on its own as in the standard transformer
+ATTENTION_AXES = {'joint': (1, 2), 'time': (1,)}
+ATTENTION_MODES = ('joint', 'time', 'axial')
+
+class AxialAttention(Layer):
+    #factorized version of the joint attention: first over the positions (time), then over the heads (features) of every position,
+    #the cost grows with positions^2 + positions*heads^2 instead of (positions*heads)^2
+    #it has the functions of CachedMultiHeadAttention, the keys/values of the time attention are the ones that can be cached
+
+    def __init__(self, key_dim, num_heads, value_dim=None, dropout=0.0, use_bias=True, kernel_regularizer=None, **kwargs):
+      super(AxialAttention, self).__init__(**kwargs)
+      attention_kwargs = dict(key_dim=key_dim, num_heads=num_heads, value_dim=value_dim, dropout=dropout, use_bias=use_bias,
+                              kernel_regularizer=kernel_regularizer, dtype=self.dtype_policy)
+      self.time_attention = CachedMultiHeadAttention(attention_axes=(1,), **attention_kwargs)
+      self.feature_attention = CachedMultiHeadAttention(attention_axes=(2,), **attention_kwargs)
+
+    def call(self, query, value, key=None, training=None):
+      forward = self.time_attention(query, value, key, training=training)
+      return self.feature_attention(forward, forward, training=training)
+
+    def projectKeyValue(self, key, value=None):
+      return self.time_attention.projectKeyValue(key, value)
+
+    def attendCached(self, query, projected_key, projected_value, training=None):
+      forward = self.time_attention.attendCached(query, projected_key, projected_value, training=training)
+      return self.feature_attention(forward, forward, training=training)
+
+def createAttention(attention_mode, **kwargs):
+  #the attention layer of an Encoder or the cross attention of a Decoder
+  if attention_mode == 'axial':
+    return AxialAttention(**kwargs)
+  if attention_mode not in ATTENTION_AXES:
+    raise ValueError("attention_mode must be one of %s, not %r" % (", ".join(ATTENTION_MODES), attention_mode))
+  return CachedMultiHeadAttention(attention_axes=ATTENTION_AXES[attention_mode], **kwargs)
+
+
+#Encoder and Decoder can run with a mixed precision policy (created with dtype=policy and autocast=False by the Transformer):
+#the attention and feed forward layers then compute in float16/bfloat16, while the residual stream and the layer
+#normalizations stay float32, the outputs of the low precision layers are cast back before they are added
+#attention_mode is the attention of the Encoder and the cross attention of the Decoder (see ATTENTION_AXES and AxialAttention),
+#the masked self attention of the Decoder is over time only
+
+class Encoder(Layer):
+
+    def __init__(self, dropout=0.2, amount_of_heads=8, size_of_head= 128,number_ff_layers=3,output_dim =10,fused_ffn=True,attention_mode='joint',**kwargs):
+        super(Encoder,self).__init__(**kwargs)
+        self.fused_ffn = fused_ffn
+        self.attention_mode = attention_mode
+        self.dropout = dropout
+        self.amount_of_heads= amount_of_heads
+        self.size_of_head = size_of_head
+        self.output_dim = output_dim
+        self.number_ff_layers = number_ff_layers
+
+    def build(self, input_shape):
+        self.multi_Attention = createAttention(self.attention_mode, key_dim=self.size_of_head, num_heads=self.amount_of_heads, value_dim= self.size_of_head, dropout=self.dropout, kernel_regularizer=L2(0.0005), dtype=self.dtype_policy)
+        self.norm_att = LayerNormalization(dtype='float32')
+        self.ff_layers =[]
+        for i in range(self.number_ff_layers):
+          self.ff_layers.append(Dense((10*self.number_ff_layers)/(i+1), use_bias=True,kernel_regularizer=L2(0.001), dtype=self.dtype_policy))
+          self.ff_layers.append(LeakyReLU(alpha=0.3, dtype=self.dtype_policy))
+        self.norm_ff = LayerNormalization(axis=-1, dtype='float32')
+        super(Encoder, self).build(input_shape)
+
+    def call(self, inputs, training = None):
+        forward = self.multi_Attention(inputs, inputs, training = training)
+        normalization_output = self.norm_att(inputs+tf.cast(forward, inputs.dtype))
+        forward = applyDenseLayers(self.ff_layers, normalization_output, self.fused_ffn)
+        forward = self.norm_ff(tf.cast(forward, normalization_output.dtype)+normalization_output)
+        return forward
+
+    def get_config(self):
+      config = super().get_config().copy()
+      config.update({
+        'dropout': self.dropout,
+        'amount_of_heads': self.amount_of_heads,
+        'size_of_head': self.size_of_head,
+        'output_dim' : self.output_dim,
+        'number_ff_layers' : self.number_ff_layers,
+        'fused_ffn' : self.fused_ffn,
+        'attention_mode' : self.attention_mode,
+      })
+      return config
+
+#decoder
+class Decoder(Layer):
+
+    def __init__(self, dropout=0.2, amount_of_heads=8, size_of_head= 128 , output_dim=10,amount_of_heads_masked=4, size_of_head_masked=32 ,dim_list=None,fused_ffn=True,attention_mode='joint',causal=True,**kwargs ):
+      super(Decoder,self).__init__(**kwargs)
+      self.fused_ffn = fused_ffn
+      #causal=False lets every position attend to all others, for the horizon queries of the direct decoding (no value of a later day is in them)
+      self.causal = causal
+      self.attention_mode = attention_mode
+      self.dropout = dropout
+      self.amount_of_heads= amount_of_heads
+      self.size_of_head = size_of_head
+      self.output_dim = output_dim
+      self.size_of_head_masked= size_of_head_masked
+      self.amount_of_heads_masked = amount_of_heads_masked
+      self.dim_list = dim_list
+
+    def build(self, input_shape):
+      self.masked_multi_attention = CachedMultiHeadAttention(key_dim=self.size_of_head_masked ,num_heads=self.amount_of_heads_masked, value_dim= self.size_of_head_masked, dropout=self.dropout, use_bias=True,kernel_regularizer=L2(0.0005), dtype=self.dtype_policy)
+      self.multi_Attention = createAttention(self.attention_mode, key_dim=self.size_of_head, num_heads=self.amount_of_heads, value_dim= self.size_of_head, dropout=self.dropout, use_bias=True,kernel_regularizer=L2(0.0005), dtype=self.dtype_policy)
+      self.norm_att = LayerNormalization(dtype='float32')
+      self.ff_layers =[]
+      for i in self.dim_list:
+        self.ff_layers.append(Dense(i, use_bias=True, kernel_regularizer=L2(0.001), dtype=self.dtype_policy))
+        self.ff_layers.append(LeakyReLU(alpha=0.3, dtype=self.dtype_policy))
+      self.norm_before_ff = LayerNormalization(dtype='float32')
+      self.norm_after_ff = LayerNormalization(dtype='float32')
+      super(Decoder, self).build(input_shape)
+
+    def call(self, inputs, training = None):
+      encoder_input, target = inputs
+      attention_output_masked = self.masked_multi_attention(query =target, key = target, value = target, training = training, use_causal_mask=self.causal)
+      norm_output_masked = self.norm_att(tf.cast(attention_output_masked, target.dtype)+target)
+      #this is not self, the key and value input are encoder input, query is previous output from norm
+      attention_output = self.multi_Attention(query =norm_output_masked, key = encoder_input, value = encoder_input, training = training)
+      return self.feedForward(tf.cast(attention_output, norm_output_masked.dtype)+norm_output_masked)
+
+    def feedForward(self, attention_output):
+      norm_output = self.norm_before_ff(attention_output)
+      forward = applyDenseLayers(self.ff_layers, norm_output, self.fused_ffn)
+      forward = self.norm_after_ff(tf.cast(forward, norm_output.dtype)+norm_output)
+      return forward
+
+    def createCache(self, encoder_input):
+      #the keys and values of the encoder output are the same for every decoding step, so they are projected once here,
+      #the keys and values of the masked self attention are added step by step
+      memory_key, memory_value = self.multi_Attention.projectKeyValue(encoder_input)
+      return {'memory_key': memory_key, 'memory_value': memory_value, 'key': None, 'value': None}
+
+    def callStep(self, target_step, cache, training = None):
+      #incremental version of call for only the newest position (batch, 1, dim), the other positions are in the cache
+      #attending to all cached positions is the same as the causal mask for the newest position
+      key, value = self.masked_multi_attention.projectKeyValue(target_step)
+      if cache['key'] is not None:
+        key = tf.concat([cache['key'], key], axis=1)
+        value = tf.concat([cache['value'], value], axis=1)
+      attention_output_masked = self.masked_multi_attention.attendCached(target_step, key, value, training = training)
+      norm_output_masked = self.norm_att(tf.cast(attention_output_masked, target_step.dtype)+target_step)
+      attention_output = self.multi_Attention.attendCached(norm_output_masked, cache['memory_key'], cache['memory_value'], training = training)
+      new_cache = dict(cache, key=key, value=value)
+      return self.feedForward(tf.cast(attention_output, norm_output_masked.dtype)+norm_output_masked), new_cache
+
+    def get_config(self):
+      config = super().get_config().copy()
+      config.update({
+        'dropout': self.dropout,
+        'amount_of_heads': self.amount_of_heads,
+        'size_of_head': self.size_of_head,
+        'output_dim' : self.output_dim,
+        'dim_list' : self.dim_list,
+        'size_of_head_masked': self.size_of_head_masked,
+        'amount_of_heads_masked' : self.amount_of_heads_masked,
+        'fused_ffn' : self.fused_ffn,
+        'attention_mode' : self.attention_mode,
+        'causal' : self.causal,
+      })
+      return config
+
+#decoder input of the direct (non-autoregressive) decoding
+class HorizonQueries(Layer):
+
+    def __init__(self, horizon=7, **kwargs):
+      super(HorizonQueries,self).__init__(**kwargs)
+      self.horizon = horizon
+
+    def build(self, input_shape):
+      #a learned value per horizon day, it takes the place of the value predicted the day before
+      self.offsets = self.add_weight(name='offsets', shape=(1, self.horizon, 1), initializer='zeros', trainable=True)
+      super(HorizonQueries, self).build(input_shape)
+
+    def call(self, inputs):
+      #inputs = (Time2Vec decoder embedding (batch, horizon, k+1), last known value (batch, 1, 1))
+      #returns (batch, horizon, k+2) = [Time2Vec, last known value + offset of the day], the layout of the autoregressive decoder input
+      time2vec, start = inputs
+      return concatenate([time2vec, start + self.offsets], axis=-1)
+
+    def get_config(self):
+      config = super().get_config().copy()
+      config.update({
+        'horizon': self.horizon,
+      })
+      return config
+
+#linear layer
+class Linear(Layer):
+
+    def __init__(self, dim_list, fused_ffn=True, **kwargs):
+        super(Linear,self).__init__(**kwargs)
+        self.dim_list = dim_list
+        self.fused_ffn = fused_ffn
+        self.dense_layers = []
+
+    def build(self, input_shape):
+        for i in self.dim_list:
+            self.dense_layers.append(Dense(i,activation='linear', kernel_regularizer=L2(0.001)))
+        super(Linear, self).build(input_shape)
+
+    def call(self, inputs, training = None):
+        return applyDenseLayers(self.dense_layers, inputs, self.fused_ffn)
+
+    def get_config(self):
+      config = super().get_config().copy()
+      config.update({
+        'dim_list' : self.dim_list,
+        'dense_layers' : [],
+        'fused_ffn' : self.fused_ffn,
+      })
+      return config
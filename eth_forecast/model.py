@@ -0,0 +1,404 @@
+"""The Transformer model, its learning rate schedule and the checkpoint callback."""
+import numpy as np
+import tensorflow as tf
+from keras import Model
+from keras.layers import Dense
+from keras.layers import Flatten
+from keras.layers import LayerNormalization
+from keras.layers import concatenate
+
+from .data import createTimeEmbeddingsInput, createTimeEmbeddingsOutput
+from .layers import Decoder, Encoder, HorizonQueries, Linear, Time2Vec
+
+#constructing the models with all the layers
+class Transformer(Model):
+
+    def __init__(self, k=4, encoder_number=4, decoder_number=4, dropout=0.4,amount_of_heads=16,size_of_head=64,batch_size=16, fused_ffn=True, precision='float32',
+                 time_table=False, sequence_length=42, week_length=8, profile_blocks=False, assets=('eth', 'btc'), shared_encoder=False, fusion='sum',
+                 attention_mode='joint', decoding='autoregressive', **kwargs): #ff dim must be equal to amount of features to work
+        #k=5? because hour, day, week,month, year to identify time? dimension for each thing
+        super().__init__(**kwargs)
+        #precision is 'float32', 'mixed_float16' or 'mixed_bfloat16' (the latter is the one that helps on cpu),
+        #with a mixed policy only the encoders and decoders compute in 16 bit, Time2Vec, the layer normalizations
+        #and the Linear head stay float32
+        self.precision = precision
+        block_kwargs = {} if precision == 'float32' else {'dtype': tf.keras.mixed_precision.Policy(precision), 'autocast': False}
+        #the time embedding column is the same linspace for every sample, with time_table=True the inputs do not have it
+        #(eth and btc are (batch, week_length+sequence_length, 5), the decoder input (batch, days, 1)) and each Time2Vec
+        #layer is computed once per sequence position as a table that is broadcast over the batch
+        self.time_table = time_table
+        self.sequence_length = sequence_length
+        self.week_length = week_length
+        if time_table:
+          self.input_time_vector = tf.constant(createTimeEmbeddingsInput(None, sequence_length, week_length)[:, 0])
+        #decoding 'autoregressive' feeds every predicted day to the decoders (teacher forcing in training), 'direct' predicts
+        #all 7 days in one pass of the decoders from horizon queries: the Time2Vec decoder embedding of every day and the
+        #last known value with a learned offset per day (layers.HorizonQueries), the decoder input is then only that value
+        if decoding not in ('autoregressive', 'direct'):
+          raise ValueError("decoding must be 'autoregressive' or 'direct', not %r" % (decoding,))
+        self.decoding = decoding
+        if time_table or decoding == 'direct':
+          self.decoder_time_vector = tf.constant(createTimeEmbeddingsOutput(None, sequence_length, week_length)[:, 0])
+        #assets are the names of the encoder inputs, in the order they are passed, the first one is the asset that is forecast
+        #every asset has its own Time2Vec and encoders (time2Vec_encoder_<asset>, encoders_<asset>, so eth and btc keep the
+        #names and weights of the two tower model), with shared_encoder=True all assets go through one Time2Vec and one stack of
+        #encoders in a single call, stacked on the batch axis
+        #fusion combines the encoded assets: 'sum' (as eth + btc before), 'mean' or 'concat' (followed by a Dense back to the width)
+        if fusion not in ('sum', 'mean', 'concat'):
+          raise ValueError("fusion must be 'sum', 'mean' or 'concat', not %r" % (fusion,))
+        for asset in assets:
+          if not asset.isidentifier() or asset in ('assets', 'decoder'):
+            raise ValueError("invalid asset name %r" % (asset,))
+        self.assets = tuple(assets)
+        #attention_mode of the encoders and the cross attention of the decoders: 'joint' over time and heads (as before),
+        #'time' only over time or 'axial' over time and then over the heads, see layers.ATTENTION_AXES
+        self.attention_mode = attention_mode
+        self.shared_encoder = shared_encoder
+        self.fusion = fusion
+        tower_names = ['assets'] if shared_encoder else list(self.assets)
+        for name in tower_names:
+            setattr(self, 'time2Vec_encoder_' + name, Time2Vec(k))
+        self.time2Vec_decoder = Time2Vec(k)
+        for name in tower_names:
+            setattr(self, 'encoders_' + name, [])
+        #the joint encoders and their norms keep their names of the eth/btc model
+        self.encoder_eth_btc = []
+        self.decoders = []
+        self.batch_size = batch_size
+        self.dropout = dropout
+        for _ in range(encoder_number):
+            for name in tower_names:
+                getattr(self, 'encoders_' + name).append(Encoder(dropout,amount_of_heads,size_of_head, output_dim = k+5, fused_ffn=fused_ffn, attention_mode=attention_mode, **block_kwargs))
+        if fusion == 'concat':
+            #back to the width of the encoders: k+1 Time2Vec features and the 5 OHLCV features
+            self.fusion_projection = Dense(k+6)
+        for _ in range(2):
+            self.encoder_eth_btc.append(Encoder(dropout,amount_of_heads,size_of_head, output_dim = k+5, fused_ffn=fused_ffn, attention_mode=attention_mode, **block_kwargs))
+        for _ in range(decoder_number):
+            self.decoders.append(Decoder(dropout = dropout,amount_of_heads= amount_of_heads,size_of_head= size_of_head, output_dim = k+5, dim_list=[36,18,6], fused_ffn=fused_ffn, attention_mode=attention_mode,
+                                         causal=decoding == 'autoregressive', **block_kwargs))
+        if decoding == 'direct':
+            self.horizon_queries = HorizonQueries(7)
+        self.norm_eth_btc = LayerNormalization()
+        self.norm_after_encode_eth_btc = LayerNormalization()
+        self.linear_layer = Linear(dim_list= [32,16,1], fused_ffn=fused_ffn)
+        self.flatten = Flatten()
+        #profile_blocks=True records the forward time of the towers, fusion, decoders and head (see instrumentation.BlockTimer),
+        #without it call has no timing ops at all
+        self.block_timer = None
+        #accumulation_steps > 1 computes the gradient of every train batch in that amount of micro batches (set by cli.compileModel)
+        self.accumulation_steps = 1
+        if profile_blocks:
+          from .instrumentation import BlockTimer
+          self.block_timer = BlockTimer([name + '_tower' for name in tower_names] + ['fusion', 'decoder', 'linear_head'])
+
+    def train_step(self, data):
+      if self.block_timer is not None:
+        data = self.block_timer.markStepStart(data)
+      if self.accumulation_steps > 1:
+        return self.accumulatedTrainStep(data)
+      return super().train_step(data)
+
+    def accumulatedTrainStep(self, data):
+      #one optimizer step for the whole batch, of which the gradient is summed over accumulation_steps micro batches that run
+      #after each other, such that only the activations of one micro batch are in memory
+      #the first micro batch creates the variables of a model that is not built yet, the others run in a while loop (one copy
+      #of the forward and backward graph instead of one per micro batch) without parallel iterations
+      x, y = data
+      batch_size = tf.shape(y)[0]
+      gradients = self.microBatchGradients(x, y, 0, batch_size)
+      def accumulate(index, gradients):
+        micro_gradients = self.microBatchGradients(x, y, index, batch_size)
+        return index + 1, [total + gradient for total, gradient in zip(gradients, micro_gradients)]
+      _, gradients = tf.while_loop(lambda index, _: index < self.accumulation_steps, accumulate, (tf.constant(1), gradients),
+                                   parallel_iterations=1)
+      self.optimizer.apply_gradients(zip(gradients, self.trainable_variables))
+      return self.get_metrics_result()
+
+    def microBatchGradients(self, x, y, index, batch_size):
+      #gradients of micro batch index of accumulatedTrainStep (zeros for the variables without one), its loss is weighted by its
+      #share of the batch, so the sum over the micro batches is the gradient of the mean loss of the batch
+      start = index*batch_size//self.accumulation_steps
+      end = (index + 1)*batch_size//self.accumulation_steps
+      micro_x = tf.nest.map_structure(lambda tensor: tensor[start:end], x)
+      micro_y = y[start:end]
+      scaled = isinstance(self.optimizer, tf.keras.mixed_precision.LossScaleOptimizer)
+      with tf.GradientTape() as tape:
+        y_pred = self(micro_x, training=True)
+        loss = self.compute_loss(micro_x, micro_y, y_pred)*tf.cast((end - start)/batch_size, tf.float32)
+        if scaled:
+          loss = self.optimizer.get_scaled_loss(loss)
+      variables = self.trainable_variables
+      gradients = tape.gradient(loss, variables)
+      if scaled:
+        gradients = self.optimizer.get_unscaled_gradients(gradients)
+      self.compute_metrics(micro_x, micro_y, y_pred, None)
+      return [tf.zeros_like(variable) if gradient is None else gradient for variable, gradient in zip(variables, gradients)]
+
+    def call(self, inputs, training=None):
+      #inputs = (one input per asset..., input_decoder)
+      if len(inputs) != len(self.assets) + 1:
+        raise ValueError("expected %d asset inputs and the decoder input, got %d inputs" % (len(self.assets), len(inputs)))
+      *asset_inputs, input_decoder = inputs
+      #the tables are computed from the current Time2Vec weights on every call, so they are trained as before
+      tables = self.timeTables() if self.time_table else None
+      input_btc_eth = self.encode(asset_inputs, training=training, tables=tables, timer=self.block_timer)
+      timer = self.block_timer
+      #do the target part (decoder)
+      if self.decoding == 'direct':
+        input_decoder = self.directQueries(input_decoder, tables)
+      elif self.time_table:
+        input_decoder = concatenate([self.broadcastTable(tables['decoder'][:, :tf.shape(input_decoder)[1]], input_decoder), input_decoder], axis=-1)
+      else:
+        time_feature_decoder, input_decoder = self.splitTimeEmbeddingInputFromData(input_decoder)
+        time2vec_decoder =self.time2Vec_decoder(time_feature_decoder)
+        input_decoder = concatenate([time2vec_decoder,input_decoder], axis=-1)
+      for decoder in self.decoders:
+          input_decoder = decoder((input_btc_eth, input_decoder), training =training)
+      if timer is not None:
+        input_decoder = timer.lap('decoder', input_decoder)
+      #flattened_output = self.flatten(input_decoder)
+      output = self.linear_layer(input_decoder)
+      if timer is not None:
+        output = timer.lap('linear_head', output)
+      return output
+
+    def encode(self, inputs, training=None, tables=None, timer=None):
+      #runs the encoders of every asset and the joint encoders, the output is the memory the decoders attend to
+      #inputs has one input per asset, timer is the BlockTimer when the blocks are timed (only from call)
+      inputs = list(inputs)
+      if self.time_table and tables is None:
+        tables = self.timeTables()
+      if timer is not None:
+        inputs = list(timer.start(tuple(inputs)))
+      if self.shared_encoder:
+        towers = self.encodeShared(inputs, training, tables)
+        if timer is not None:
+          towers = list(timer.lap('assets_tower', tuple(towers)))
+      else:
+        towers = []
+        for index, asset in enumerate(self.assets):
+          towers.append(self.encodeAsset(asset, inputs[index], training, tables))
+          if timer is not None:
+            #the next asset only starts when this one is done, such that the time of every tower is its own
+            towers[-1], rest = timer.lap(asset + '_tower', (towers[-1], tuple(inputs[index+1:])))
+            inputs[index+1:] = list(rest)
+      #combine all assets
+      input_from_encoders = self.norm_eth_btc(self.fuse(towers))
+      input_btc_eth =input_from_encoders
+      for encoder in self.encoder_eth_btc:
+        input_btc_eth=encoder(input_btc_eth, training=training)
+      input_btc_eth = self.norm_after_encode_eth_btc(input_btc_eth+input_from_encoders)
+      if timer is not None:
+        input_btc_eth = timer.lap('fusion', input_btc_eth)
+      return input_btc_eth
+
+    def timeEmbedding(self, name, data, tables):
+      #returns (Time2Vec features, data without the time column) of one tower
+      if self.time_table:
+        return self.broadcastTable(tables[name], data), data
+      time_feature, data = self.splitTimeEmbeddingInputFromData(data)
+      return getattr(self, 'time2Vec_encoder_' + name)(time_feature), data
+
+    def encodeAsset(self, asset, data, training=None, tables=None):
+      time2vec, data = self.timeEmbedding(asset, data, tables)
+      forward = concatenate([time2vec, data])
+      for encoder in getattr(self, 'encoders_' + asset):
+        forward = encoder(forward, training=training)
+      return forward
+
+    def encodeShared(self, inputs, training=None, tables=None):
+      #all assets in one call of the shared encoders, stacked on the batch axis, returns the encoded assets
+      time2vec, data = self.timeEmbedding('assets', tf.concat(inputs, axis=0), tables)
+      forward = concatenate([time2vec, data])
+      for encoder in self.encoders_assets:
+        forward = encoder(forward, training=training)
+      return tf.split(forward, len(inputs), axis=0)
+
+    def fuse(self, towers):
+      if self.fusion == 'concat':
+        return self.fusion_projection(concatenate(towers, axis=-1))
+      fused = tf.add_n(towers)
+      if self.fusion == 'mean':
+        fused = fused/len(towers)
+      return fused
+
+    def timeTables(self):
+      #Time2Vec output of every sequence position for the constant time vectors, (1, positions, k+1) per layer
+      #the full decoder vector is used, such that the decoder table is the same for any amount of decoder days
+      names = ['assets'] if self.shared_encoder else list(self.assets)
+      tables = {name: getattr(self, 'time2Vec_encoder_' + name)(self.input_time_vector[tf.newaxis, :, tf.newaxis]) for name in names}
+      tables['decoder'] = self.time2Vec_decoder(self.decoder_time_vector[tf.newaxis, :, tf.newaxis])
+      return tables
+
+    def broadcastTable(self, table, data):
+      #repeats the (1, positions, k+1) table for every sample of data
+      return tf.broadcast_to(table, tf.concat([tf.shape(data)[:1], tf.shape(table)[1:]], axis=0))
+
+    def directQueries(self, input_decoder, tables=None):
+      #decoder input of the direct decoding, of the input only the last known value (the first day, last column) is used, so
+      #both the (batch, 1, 1) decoder start and the teacher forced decoder windows can be passed
+      start = input_decoder[:, :1, -1:]
+      if tables is not None:
+        table = tables['decoder']
+      else:
+        table = self.time2Vec_decoder(self.decoder_time_vector[tf.newaxis, :, tf.newaxis])
+      return self.horizon_queries((self.broadcastTable(table, start), start))
+
+    def decodeDirect(self, encoder_output, decoder_start, horizon=7, training=None, tables=None):
+      #all days in one pass of the decoders, returns (batch, horizon) as decodeDays
+      forward = self.directQueries(decoder_start, tables)
+      for decoder in self.decoders:
+        forward = decoder((encoder_output, forward), training=training)
+      return self.linear_layer(forward)[:, :horizon, 0]
+
+    def createDecoderCaches(self, encoder_output):
+      return [decoder.createCache(encoder_output) for decoder in self.decoders]
+
+    def decodeStep(self, input_decoder_step, caches, position, training=None, tables=None):
+      #decodes only the newest position (batch, 1, 2) = [time embedding, value], with the caches of all previous positions
+      #(with time_table=True the step is only the value (batch, 1, 1) and the row of the decoder table is used)
+      #returns the prediction for this position (batch, 1) and the updated caches
+      if self.time_table:
+        if tables is None:
+          tables = self.timeTables()
+        input_decoder = input_decoder_step
+        time2vec_decoder = self.broadcastTable(tables['decoder'][:, position:position+1], input_decoder)
+      else:
+        time_feature_decoder, input_decoder = self.splitTimeEmbeddingInputFromData(input_decoder_step)
+        time2vec_decoder = self.time2Vec_decoder(time_feature_decoder, offset=position)
+      forward = concatenate([time2vec_decoder,input_decoder], axis=-1)
+      new_caches = []
+      for decoder, cache in zip(self.decoders, caches):
+        forward, cache = decoder.callStep(forward, cache, training=training)
+        new_caches.append(cache)
+      output = self.linear_layer(forward)
+      return output[:, -1, :], new_caches
+
+    def forecast(self, inputs, horizon=7, batch_size=None, training=None):
+      #autoregressive forecast: the encoders run once, after which every day only the newest decoder position is computed
+      #(with decoding='direct' all days are one pass of the decoders)
+      #inputs = (one input per asset..., decoder_start) with decoder_start the last known value (batch, 1, 1) without time embedding
+      #returns (batch, horizon), the same values as calling the model on the growing decoder input day by day
+      *asset_inputs, decoder_start = inputs
+      amount = len(decoder_start)
+      if batch_size is None:
+        batch_size = max(amount, 1)
+      #same time embedding as createTimeEmbeddingsOutput, the model is trained on 7 decoder positions
+      time_vector = np.linspace(0,1,7)
+      if horizon > len(time_vector):
+        raise ValueError("horizon can be at most %d, the amount of decoder positions the model is trained on" % len(time_vector))
+      #in table mode the Time2Vec tables are computed once for the whole forecast, not per batch or day
+      tables = self.timeTables() if self.time_table else None
+      if self.decoding == 'direct':
+        encode = lambda *assets: self.encode(assets, training=training, tables=tables)
+        decode = lambda encoder_output, value: self.decodeDirect(encoder_output, value, horizon, training=training, tables=tables)
+      else:
+        encode = lambda *assets: self.createDecoderCaches(self.encode(assets, training=training, tables=tables))
+        decode_step = lambda step, caches, day_index: self.decodeStep(step, caches, day_index, training=training, tables=tables)
+      if self.jit_compile:
+        #with jit_compile=True the steps are compiled with XLA, traced once per batch shape and day,
+        #otherwise they run eagerly as tracing costs more than a single forecast over the test set
+        encode = tf.function(encode, jit_compile=True)
+        if self.decoding == 'direct':
+          decode = tf.function(decode, jit_compile=True)
+        else:
+          decode_step = tf.function(decode_step, jit_compile=True)
+      if self.decoding != 'direct':
+        decode = lambda caches, value: self.decodeDays(caches, value, horizon, decode_step)
+      predictions = []
+      for start in range(0, amount, batch_size):
+        end = start+batch_size
+        encoded = encode(*[tf.constant(asset_input[start:end], tf.float32) for asset_input in asset_inputs])
+        predictions.append(decode(encoded, tf.constant(decoder_start[start:end], tf.float32)))
+      return tf.concat(predictions, axis=0).numpy()
+
+    def decodeDays(self, caches, value, horizon, decode_step):
+      #feeds every predicted day back to the decoders, decode_step(step, caches, day_index) is decodeStep or a compiled version of it
+      time_vector = np.linspace(0,1,7)
+      predictions = []
+      for day_index in range(horizon):
+        if self.time_table:
+          step = value
+        else:
+          time_feature = tf.fill(tf.shape(value), tf.cast(time_vector[day_index], value.dtype))
+          step = tf.concat([time_feature, value], axis=-1)
+        prediction, caches = decode_step(step, caches, day_index)
+        predictions.append(prediction)
+        value = prediction[:, :, tf.newaxis]
+      return tf.concat(predictions, axis=-1)
+
+    def forecastFunction(self, horizon=7, jit_compile=False, input_signature=None, training=False):
+      #the whole forecast (encoders, Time2Vec tables and the horizon decoder steps) as one tf.function of
+      #(one input per asset..., decoder_start) -> (batch, horizon), for forecasting a few windows at a time with a low latency
+      #(forecast is for the test set), it is traced once per input shape or only once for input_signature
+      #training=True keeps the dropout on, for the monte carlo samples of forecastIntervals
+      if horizon > 7:
+        raise ValueError("horizon can be at most 7, the amount of decoder positions the model is trained on")
+      def forecastGraph(*inputs):
+        *asset_inputs, decoder_start = inputs
+        tables = self.timeTables() if self.time_table else None
+        encoder_output = self.encode(asset_inputs, training=training, tables=tables)
+        if self.decoding == 'direct':
+          return self.decodeDirect(encoder_output, decoder_start, horizon, training=training, tables=tables)
+        caches = self.createDecoderCaches(encoder_output)
+        decode_step = lambda step, caches, day_index: self.decodeStep(step, caches, day_index, training=training, tables=tables)
+        return self.decodeDays(caches, decoder_start, horizon, decode_step)
+      return tf.function(forecastGraph, jit_compile=jit_compile, input_signature=input_signature)
+
+    def forecastIntervals(self, inputs, samples=100, quantiles=(0.05, 0.5, 0.95), horizon=7, max_batch=4096):
+      #monte carlo dropout forecast: every window is forecast samples times with the dropout on, the copies are tiled on the
+      #batch axis so all samples of a chunk of windows are one call of the forecast graph (a chunk has at most max_batch rows)
+      #and they are reduced per chunk, inputs are as in forecast
+      #returns {'mean', 'std': (batch, horizon), 'quantiles': (len(quantiles), batch, horizon)} of the scaled values
+      *asset_inputs, decoder_start = inputs
+      amount = len(decoder_start)
+      chunk_size = max(1, max_batch//samples)
+      forecast = self.forecastFunction(horizon, training=True)
+      means, stds, quantile_values = [], [], []
+      for start in range(0, amount, chunk_size):
+        end = min(start + chunk_size, amount)
+        #row s*(end-start)+i is sample s of window start+i
+        tiled = [tf.tile(tf.constant(values[start:end], tf.float32), [samples, 1, 1]) for values in list(asset_inputs) + [decoder_start]]
+        forecasts = forecast(*tiled).numpy().reshape(samples, end - start, horizon)
+        means.append(forecasts.mean(axis=0))
+        stds.append(forecasts.std(axis=0))
+        quantile_values.append(np.quantile(forecasts, quantiles, axis=0))
+      return {'mean': np.concatenate(means), 'std': np.concatenate(stds), 'quantiles': np.concatenate(quantile_values, axis=1)}
+
+    def splitTimeEmbeddingInputFromData(self,data):
+      time_feature = data[:, :, 0:1]
+      rest_of_features = data[:, :, 1:]
+      return (time_feature, rest_of_features)
+
+class CustomLearningRateSchedule(tf.keras.optimizers.schedules.LearningRateSchedule):
+    #with samples_per_step (the batch size) the decay is in samples seen instead of steps: a step counts as
+    #samples_per_step/reference_batch_size steps of the batch size of 16 the schedule was tuned for, so a larger batch
+    #does not decay the learning rate slower over the same epochs
+    def __init__(self, initial_learning_rate=0.005, samples_per_step=None, reference_batch_size=16):
+        super(CustomLearningRateSchedule, self).__init__()
+        self.initial_learning_rate = initial_learning_rate
+        self.samples_per_step = samples_per_step
+        self.reference_batch_size = reference_batch_size
+
+    def __call__(self, step):
+      #the optimizer passes its iterations as an int64 variable
+      step = tf.cast(step, tf.float32)
+      if self.samples_per_step is not None:
+        step = step*self.samples_per_step/self.reference_batch_size
+      return self.initial_learning_rate / (1 + 0.05 * step)
+
+    def get_config(self):
+      return {'initial_learning_rate': self.initial_learning_rate, 'samples_per_step': self.samples_per_step,
+              'reference_batch_size': self.reference_batch_size}
+
+#kept for the notebook, the command line uses checkpoints.CheckpointCallback (background writes, rotation, resume)
+class SaveModelH5(tf.keras.callbacks.Callback):
+    def on_train_begin(self, logs=None):
+         self.val_loss = []
+    def on_epoch_end(self, epoch, logs=None):
+        current_val_loss = logs.get("val_loss")
+        self.val_loss.append(logs.get("val_loss"))
+        if current_val_loss <= min(self.val_loss):
+            print('Find lowest val_loss. Saving entire model.')
+            self.model.save('best_model', save_format='tf') # < ----- Here
@@ -0,0 +1,69 @@
+"""tf.data input pipeline that creates the train windows on the fly from the scaled series."""
+import math
+
+import numpy as np
+import tensorflow as tf
+
+from .data import (amountOfInputWindows, createTimeEmbeddingsInput, createTimeEmbeddingsOutput, trainDecoderSeries,
+                   trainInputSeries, trainTargetSeries)
+
+#the dataset only holds the scaled series and the sample indices, every batch of windows is gathered on the fly,
+#so the (sample, 50, 6) arrays are never materialized and the windowing runs in parallel with the training steps
+def gatherInputWindows(indices, data_daily, data_weekly, time_embedding, sequence_length, week_length):
+  #batched version of buildInputWindows: sample i is [time embedding, weeks i//7..i//7+week_length, days i..i+sequence_length]
+  daily_index = indices[:, tf.newaxis] + tf.range(sequence_length, dtype=indices.dtype)[tf.newaxis, :]
+  weekly_index = indices[:, tf.newaxis]//7 + tf.range(week_length, dtype=indices.dtype)[tf.newaxis, :]
+  windows = tf.concat([tf.gather(data_weekly, weekly_index), tf.gather(data_daily, daily_index)], axis=1)
+  if time_embedding is None:
+    return windows
+  time_embedding = tf.broadcast_to(time_embedding, [tf.shape(indices)[0], week_length+sequence_length, 1])
+  return tf.concat([time_embedding, windows], axis=-1)
+
+def gatherTargetWindows(indices, data, horizon=7):
+  #batched version of buildTargetWindows, returns (batch, horizon)
+  return tf.gather(data, indices[:, tf.newaxis] + tf.range(horizon, dtype=indices.dtype)[tf.newaxis, :])
+
+def createTrainDataset(asset_series, sequence_length, week_length, batch_size, validation_split=0.1, seed=None, dtype=tf.float32, time_column=True,
+                       decoding='autoregressive'):
+  #asset_series is [(daily, weekly)] per asset, the first asset is forecast (its daily series gives the targets and the decoder input)
+  #returns (train_dataset, validation_dataset) with elements ((asset windows..., decoder), target), for eth and btc the layout
+  #model.fit got before, with time_column=False the windows do not have the time embedding column, for Transformer(time_table=True)
+  #with decoding='direct' the decoder input is only the last known value (batch, 1, 1) without time column instead of the
+  #teacher forced 7 days, the targets are the same 7 days (the windows of prepareTargetDataY)
+  input_series = [trainInputSeries(daily, weekly, week_length) for daily, weekly in asset_series]
+  target_daily = asset_series[0][0]
+  target_series = trainTargetSeries(target_daily, sequence_length, week_length)
+  decoder_series = trainDecoderSeries(target_daily, sequence_length, week_length)
+  amount = min([amountOfInputWindows(len(daily_x), len(weekly_x), sequence_length, week_length) for daily_x, weekly_x in input_series] +
+               [len(target_series)-6, len(decoder_series)-7])
+  amount = max(0, amount)
+
+  input_series = [(tf.constant(daily_x, dtype), tf.constant(weekly_x, dtype)) for daily_x, weekly_x in input_series]
+  target_series = tf.constant(target_series, dtype)
+  decoder_series = tf.constant(decoder_series, dtype)
+  input_time_embedding, decoder_time_embedding = None, None
+  if time_column:
+    input_time_embedding = tf.constant(createTimeEmbeddingsInput(None, sequence_length, week_length), dtype)
+    decoder_time_embedding = tf.constant(createTimeEmbeddingsOutput(None, sequence_length, week_length), dtype)
+
+  def createBatch(indices):
+    windows = tuple(gatherInputWindows(indices, daily_x, weekly_x, input_time_embedding, sequence_length, week_length) for daily_x, weekly_x in input_series)
+    if decoding == 'direct':
+      return windows + (gatherTargetWindows(indices, decoder_series, 1)[:, :, tf.newaxis],), gatherTargetWindows(indices, target_series)
+    decoder = gatherTargetWindows(indices, decoder_series)[:, :, tf.newaxis]
+    if time_column:
+      decoder = tf.concat([tf.broadcast_to(decoder_time_embedding, tf.shape(decoder)), decoder], axis=-1)
+    target = gatherTargetWindows(indices, target_series)
+    return windows + (decoder,), target
+
+  #same as validation_split in model.fit on the shuffled arrays: a random 10% of the samples is held out once,
+  #the train indices are then reshuffled every epoch (only the indices, not the data)
+  indices = np.random.default_rng(seed).permutation(amount)
+  split_index = math.floor((1-validation_split)*amount)
+  train_indices, validation_indices = indices[:split_index], indices[split_index:]
+  train_dataset = tf.data.Dataset.from_tensor_slices(train_indices)
+  train_dataset = train_dataset.shuffle(len(train_indices), seed=seed, reshuffle_each_iteration=True)
+  train_dataset = train_dataset.batch(batch_size).map(createBatch, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
+  validation_dataset = tf.data.Dataset.from_tensor_slices(validation_indices)
+  validation_dataset = validation_dataset.batch(batch_size).map(createBatch, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
+  return train_dataset, validation_dataset
@@ -0,0 +1,61 @@
+"""Plots of the training progression and of the forecasts against the targets."""
+import numpy as np
+
+#matplotlib is imported in the functions, it is only loaded when something is plotted
+
+def plotLossProgression(history, filename="loss_metric_progression.png"):
+  #wanted plots: ->
+  # 1) the loss/metrics during training
+  import matplotlib.pyplot as plt
+
+  training_loss = history['loss']
+  validation_loss = history['val_loss']
+  training_accuracy = history['mape']
+  validation_accuracy = history['val_mape']
+
+  epochs = range(1, len(training_loss) + 1)
+
+  # Creating subplots
+  plt.figure(figsize=(12, 6))
+
+  # Subplot for training and validation loss
+  plt.subplot(1, 2, 1)  # 1 row, 2 columns, subplot 1
+  plt.plot(epochs, training_loss, label='Training Loss', color='blue')
+  plt.plot(epochs, validation_loss, label='Validation Loss', color='green')
+  plt.title('Training and Validation Loss')
+  plt.xlabel('Epochs')
+  plt.ylabel('Loss')
+  plt.legend()
+
+  # Subplot for training and validation accuracy
+  plt.subplot(1, 2, 2)  # 1 row, 2 columns, subplot 2
+  plt.plot(epochs, training_accuracy, label='Training MAPE', color='red')
+  plt.plot(epochs, validation_accuracy, label='Validation MAPE', color='orange')
+  plt.title('Training and Validation MAPE')
+  plt.xlabel('Epochs')
+  plt.ylabel('MAPE')
+  plt.legend()
+  plt.savefig(filename)
+  plt.close()
+  return filename
+
+def plotTargetVsPrediction(reverted_target_test, reverted_prediction_test, sample_indices=(10, 120, 80, 191, 150, 40), filename="target_vs_prediction.png"):
+  # 2) the results target vs prediction, for a few samples of the test set (already reverted to prices)
+  import matplotlib.pyplot as plt
+
+  plt.figure(figsize=(16, 10))
+  horizon = reverted_target_test.shape[1]
+  for plot_index, sample_index in enumerate(sample_indices):
+    if sample_index >= len(reverted_target_test):
+      continue
+    plt.subplot(2, 3, plot_index+1)
+    plt.plot(np.arange(1, horizon+1), reverted_target_test[sample_index,:], label='Target value', color='blue')
+    plt.plot(np.arange(1, horizon+1), reverted_prediction_test[sample_index,:], label='Prediction', color='green')
+    plt.title('Target vs Prediction')
+    plt.xlabel('Days')
+    plt.ylabel('Value')
+    if plot_index == 0:
+      plt.legend()
+  plt.savefig(filename)
+  plt.close()
+  return filename
@@ -0,0 +1,122 @@
+"""Post-training quantization of the forecast graph to TensorFlow Lite, for CPU hosts that run many models side by side.
+
+'dynamic' (dynamic range) stores the weights as int8 and quantizes the activations on the fly, 'int8' (full integer) also
+quantizes the activations, with ranges calibrated on a sample of the train windows. The quantized 7 day forecast of the test
+windows is compared with the float model and the artifact is only written when its MAPE (on the scaled targets, as predict)
+drifts at most max_mape_drift from the float MAPE. The report (latency, size and MAPE of both) is written in either case.
+"""
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from .inference import META_FILE, InferenceModel, exportInference, inferenceMeta, servingFunctions
+
+MODES = ('dynamic', 'int8')
+MODEL_FILE = "forecast.tflite"
+REPORT_FILE = "report.json"
+
+
+def representativeDataset(arrays, assets, samples=200, seed=0):
+  #the calibration inputs of the full integer quantization, a random sample of the train windows one at a time
+  amount = min([len(arrays[asset + '_train_windows']) for asset in assets] + [len(arrays['decoder_train'])])
+  indices = np.sort(np.random.default_rng(seed).choice(amount, min(samples, amount), replace=False))
+  def generator():
+    for index in indices:
+      inputs = {asset: np.asarray(arrays[asset + '_train_windows'][index:index+1], np.float32) for asset in assets}
+      #the decoder starts from the last known value, the first position of the decoder windows
+      inputs['decoder_start'] = np.asarray(arrays['decoder_train'][index:index+1, :1], np.float32)
+      yield inputs
+  return generator
+
+def convert(model, mode='dynamic', representative_dataset=None, horizon=7):
+  #returns the tensorflow lite flatbuffer of the forecast graph of a built model
+  if mode not in MODES:
+    raise ValueError("mode must be one of %s, not %r" % (", ".join(MODES), mode))
+  if mode == 'int8' and model.attention_mode == 'joint':
+    #the joint attention has rank 6 attention tensors, on which the int8 kernels of tensorflow lite abort
+    raise ValueError("full integer quantization needs attention_mode 'time' or 'axial', use mode 'dynamic' for the joint attention")
+  _, serving = servingFunctions(model, horizon)
+  converter = tf.lite.TFLiteConverter.from_concrete_functions([serving.get_concrete_function()], model)
+  converter.optimizations = [tf.lite.Optimize.DEFAULT]
+  if mode == 'int8':
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+  return converter.convert()
+
+class QuantizedModel(InferenceModel):
+    #predictBatch of a quantized export, the same as InferenceModel for the SavedModel export
+
+    def __init__(self, path, warmup=True, threads=None, model_file=MODEL_FILE):
+      self.threads = threads
+      self.model_file = model_file
+      super().__init__(path, warmup)
+
+    def loadForecastFunction(self, path):
+      self.interpreter = tf.lite.Interpreter(model_path=os.path.join(path, self.model_file), num_threads=self.threads)
+      #the signature runner resizes the inputs to the batch size of every call
+      runner = self.interpreter.get_signature_runner()
+      return lambda *inputs: runner(decoder_start=inputs[-1], **dict(zip(self.assets, inputs[:-1])))['forecast']
+
+def forecastMape(predictions, targets):
+  #same as predict
+  return float(100*np.mean(np.abs(targets - predictions)/np.maximum(np.abs(targets), 1e-7)))
+
+def singleWindowLatency(inference_model, windows, repeats=20):
+  #median milliseconds of a forecast of one window, as the service runs it
+  single = [window[:1] for window in windows]
+  seconds = []
+  for _ in range(repeats):
+    start = time.perf_counter()
+    inference_model.predictBatch(single)
+    seconds.append(time.perf_counter() - start)
+  return 1000*float(np.median(seconds))
+
+def directorySize(path):
+  return sum(os.path.getsize(os.path.join(directory, filename)) for directory, _, filenames in os.walk(path) for filename in filenames)
+
+def quantizeModel(model, arrays, path, mode='dynamic', max_mape_drift=1.0, calibration_samples=200, batch_size=64, seed=0):
+  #quantizes a built (trained) model, arrays is its prepared cache entry, returns the report
+  #the artifact is only written to path when report['accepted']: the test MAPE drifts at most max_mape_drift percentage points
+  #from the float model, which is compared as the SavedModel of inference.exportInference
+  assets = list(model.assets)
+  windows = [np.asarray(arrays[asset + '_test_windows'], np.float32) for asset in assets]
+  decoder_start, targets = np.asarray(arrays['decoder_test'], np.float32), np.asarray(arrays['target_test'])
+  flatbuffer = convert(model, mode, representativeDataset(arrays, assets, calibration_samples, seed))
+
+  os.makedirs(path, exist_ok=True)
+  with open(os.path.join(path, META_FILE), 'w') as meta_file:
+    json.dump(inferenceMeta(model, 7), meta_file, indent=2)
+  #the flatbuffer is evaluated from a temporary file, which only becomes the artifact when it is accepted
+  temporary_file = MODEL_FILE + ".tmp%d" % os.getpid()
+  with open(os.path.join(path, temporary_file), 'wb') as model_file:
+    model_file.write(flatbuffer)
+  try:
+    quantized = QuantizedModel(path, model_file=temporary_file)
+    quantized_predictions = quantized.predictBatch(windows, decoder_start, batch_size)
+    quantized_latency = singleWindowLatency(quantized, windows)
+    with tempfile.TemporaryDirectory() as float_path:
+      exportInference(model, float_path)
+      float_model = InferenceModel(float_path)
+      float_predictions = float_model.predictBatch(windows, decoder_start, batch_size)
+      float_latency, float_size = singleWindowLatency(float_model, windows), directorySize(float_path)
+  except Exception:
+    os.remove(os.path.join(path, temporary_file))
+    raise
+
+  float_mape, quantized_mape = forecastMape(float_predictions, targets), forecastMape(quantized_predictions, targets)
+  report = {'mode': mode, 'float_mape': float_mape, 'quantized_mape': quantized_mape, 'mape_drift': quantized_mape - float_mape,
+            'max_mape_drift': max_mape_drift, 'max_forecast_difference': float(np.max(np.abs(quantized_predictions - float_predictions))),
+            'float_latency_ms': float_latency, 'quantized_latency_ms': quantized_latency,
+            'float_size_bytes': float_size, 'quantized_size_bytes': len(flatbuffer), 'calibration_samples': calibration_samples if mode == 'int8' else 0}
+  report['accepted'] = abs(report['mape_drift']) <= max_mape_drift
+  if report['accepted']:
+    os.replace(os.path.join(path, temporary_file), os.path.join(path, MODEL_FILE))
+  else:
+    os.remove(os.path.join(path, temporary_file))
+  with open(os.path.join(path, REPORT_FILE), 'w') as report_file:
+    json.dump(report, report_file, indent=2)
+  return report
@@ -0,0 +1,39 @@
+"""Speed and memory measurements that are reported next to the mape."""
+import resource
+import time
+
+
+def peakRss():
+  #peak resident memory of this process in MB, VmHWM is the peak of this process only, ru_maxrss also keeps the
+  #peak of the parent before the process was started
+  try:
+    with open('/proc/self/status') as status:
+      for line in status:
+        if line.startswith('VmHWM:'):
+          return int(line.split()[1])/1024
+  except OSError:
+    pass
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+
+def availableMemory():
+  #memory in MB that can be used without swapping (MemAvailable), None when /proc/meminfo is not there
+  try:
+    with open('/proc/meminfo') as meminfo:
+      for line in meminfo:
+        if line.startswith('MemAvailable:'):
+          return int(line.split()[1])/1024
+  except OSError:
+    pass
+  return None
+
+class Timer:
+    #with Timer() as timer: ..., timer.seconds is the wall time of the block
+
+    def __enter__(self):
+      self.start = time.perf_counter()
+      self.seconds = None
+      return self
+
+    def __exit__(self, *exc_info):
+      self.seconds = time.perf_counter() - self.start
+      return False
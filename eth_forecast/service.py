@@ -0,0 +1,207 @@
+"""Online forecasting service: the newest bars are kept in ring buffers and only the newest window is forecast.
+
+The last sequence_length daily and week_length+ceil(sequence_length/7)+1 weekly bars of every asset of the model (eth and btc)
+are kept scaled (with the stored scaler parameters) in fixed size ring buffers, a new bar replaces the oldest one. The bars
+continue the test split of prepare, so the window of the newest daily bars is combined with the weeks before it as
+prepareTestDataX does (data.testWindowFirstWeek), not with the newest weeks. A forecast runs the traced forecast graph of the
+Transformer on that single window. The service is exposed over http (python -m eth_forecast serve):
+  GET  /forecast      {"forecast": [7 close prices], "latency_ms": ...}
+  POST /bar           {"series": "eth_daily", "bar": [open, high, low, close, volume]}
+  GET  /health
+"""
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from .data import testWindowFirstWeek
+
+
+def seriesNames(assets):
+  #('eth_daily', 'eth_weekly', 'btc_daily', 'btc_weekly') for the eth/btc model
+  return tuple(asset + "_" + period for asset in assets for period in ('daily', 'weekly'))
+
+
+class RingBuffer:
+    #the last capacity rows of a series in a preallocated array, appending overwrites the oldest row
+    #total counts all rows ever appended, row index (of the whole series) i is at position i % capacity
+
+    def __init__(self, capacity, features, dtype=np.float32):
+      self.data = np.zeros((capacity, features), dtype=dtype)
+      self.capacity = capacity
+      self.next = 0
+      self.count = 0
+      self.total = 0
+
+    def append(self, row):
+      self.data[self.next] = row
+      self.next = (self.next + 1) % self.capacity
+      self.count = min(self.count + 1, self.capacity)
+      self.total += 1
+
+    def extend(self, rows):
+      rows = np.asarray(rows)
+      #only the last capacity rows are stored, the skipped ones still count
+      skipped = max(0, len(rows) - self.capacity)
+      self.total += skipped
+      self.next = (self.next + skipped) % self.capacity
+      for row in rows[skipped:]:
+        self.append(row)
+
+    def contains(self, first, amount):
+      return self.total - self.count <= first and first + amount <= self.total
+
+    def rows(self, first, out):
+      #the rows first..first+len(out) of the series, which must still be in the buffer
+      for offset in range(len(out)):
+        out[offset] = self.data[(first + offset) % self.capacity]
+      return out
+
+    def isFull(self):
+      return self.count == self.capacity
+
+    def window(self, out=None):
+      #the rows oldest first, written to out when given (no allocation)
+      if out is None:
+        out = np.empty_like(self.data)
+      first = self.capacity - self.next
+      out[:first] = self.data[self.next:]
+      out[first:] = self.data[:self.next]
+      return out
+
+class ForecastService:
+    #scalers is {series: (mean, scale)} of the standardscalers of prepare, the model is a loaded Transformer(time_table=True)
+
+    def __init__(self, model, scalers, sequence_length, week_length, horizon=7):
+      self.model = model
+      self.scalers = {name: (np.asarray(mean, np.float32), np.asarray(scale, np.float32)) for name, (mean, scale) in scalers.items()}
+      self.sequence_length = sequence_length
+      self.week_length = week_length
+      self.horizon = horizon
+      #the series of the assets of the model, the first asset is forecast
+      self.assets = model.assets
+      self.series = seriesNames(self.assets)
+      self.target = self.assets[0] + '_daily'
+      features = len(self.scalers[self.target][0])
+      #the weeks of the window end before its first day, so more weeks than week_length are kept
+      week_capacity = week_length + math.ceil(sequence_length/7) + 1
+      self.buffers = {name: RingBuffer(sequence_length if name.endswith('daily') else week_capacity, features) for name in self.series}
+      #model inputs are preallocated and filled from the buffers, weekly rows first as in buildInputWindows
+      self.inputs = [np.zeros((1, week_length + sequence_length, features), np.float32) for _ in self.assets]
+      self.decoder_start = np.zeros((1, 1, 1), np.float32)
+      self.forecast_function = model.forecastFunction(horizon)
+      self.lock = threading.Lock()
+
+    def scale(self, name, bar):
+      mean, scale = self.scalers[name]
+      return (np.asarray(bar, np.float32) - mean)/scale
+
+    def addBar(self, name, bar):
+      #a new raw (not scaled) bar [open, high, low, close, volume] of one of the series
+      if name not in self.buffers:
+        raise KeyError("unknown series %r, expected one of %s" % (name, ", ".join(self.series)))
+      scaled = self.scale(name, bar)
+      with self.lock:
+        self.buffers[name].append(scaled)
+
+    def warmStart(self, scaled_series):
+      #fills the buffers with the last rows of already scaled series, the test split of prepare (or series with the same start)
+      with self.lock:
+        for name in self.series:
+          self.buffers[name].extend(scaled_series[name])
+
+    def firstWeek(self, asset):
+      #index of the first weekly row of the window of the newest daily rows of asset
+      return testWindowFirstWeek(self.buffers[asset + '_daily'].total - self.sequence_length, self.week_length)
+
+    def isReady(self):
+      return all(self.buffers[asset + '_daily'].isFull() and self.buffers[asset + '_weekly'].contains(self.firstWeek(asset), self.week_length)
+                 for asset in self.assets)
+
+    def forecast(self):
+      #the next horizon close prices (reverted to prices) after the newest daily bar
+      with self.lock:
+        if not self.isReady():
+          raise RuntimeError("not enough bars yet, every series needs a full window and the weeks before it")
+        for asset, inputs in zip(self.assets, self.inputs):
+          self.buffers[asset + '_weekly'].rows(self.firstWeek(asset), inputs[0, :self.week_length])
+          self.buffers[asset + '_daily'].window(inputs[0, self.week_length:])
+        #the decoder starts from the last known close, as prepareDecoderDataTest
+        self.decoder_start[0, 0, 0] = self.inputs[0][0, -1, 3]
+        prediction = self.forecast_function(*self.inputs, self.decoder_start).numpy()[0]
+      mean, scale = self.scalers[self.target]
+      return prediction*scale[3] + mean[3]
+
+def loadService(output_dir='artifacts'):
+  #the trained model of the output directory, ready to forecast from the last windows of the prepared test split
+  from .cli import loadPreparedArrays, loadConfig, loadTrainedModel
+  config = loadConfig(output_dir)
+  arrays = loadPreparedArrays(output_dir)
+  model = loadTrainedModel(output_dir, config)
+  series = seriesNames(model.assets)
+  scalers = {name: (arrays[name + "_scaler_mean"], arrays[name + "_scaler_scale"]) for name in series}
+  service = ForecastService(model, scalers, config['sequence_length'], config['week_length'])
+  service.warmStart({name: arrays[name + "_test"] for name in series})
+  #the first forecast traces the graph, it is done here instead of in the first request
+  service.forecast()
+  return service
+
+def createHandler(service):
+
+  class ForecastHandler(BaseHTTPRequestHandler):
+
+      def sendJson(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+      def do_GET(self):
+        if self.path == '/health':
+          self.sendJson(200, {'ready': service.isReady()})
+        elif self.path == '/forecast':
+          start = time.perf_counter()
+          try:
+            forecast = service.forecast()
+          except RuntimeError as error:
+            self.sendJson(409, {'error': str(error)})
+            return
+          self.sendJson(200, {'forecast': [float(value) for value in forecast], 'latency_ms': 1000*(time.perf_counter() - start)})
+        else:
+          self.sendJson(404, {'error': "unknown path"})
+
+      def do_POST(self):
+        if self.path != '/bar':
+          self.sendJson(404, {'error': "unknown path"})
+          return
+        try:
+          body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+          service.addBar(body['series'], body['bar'])
+        except (KeyError, ValueError, TypeError) as error:
+          self.sendJson(400, {'error': str(error)})
+          return
+        self.sendJson(200, {'ready': service.isReady()})
+
+      def log_message(self, format, *args):
+        #no line per request, it would dominate the latency under load
+        pass
+
+  return ForecastHandler
+
+def createServer(service, host='127.0.0.1', port=8000):
+  return ThreadingHTTPServer((host, port), createHandler(service))
+
+def serve(output_dir='artifacts', host='127.0.0.1', port=8000):
+  server = createServer(loadService(output_dir), host, port)
+  print("serving forecasts on http://%s:%d" % server.server_address[:2])
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
@@ -0,0 +1,92 @@
+"""Columnar float32 storage of the OHLCV csv files, opened with memory mapping.
+
+An ingested csv file becomes a directory <csv file>.ohlcv with one .npy file per column (float32), the dates as
+datetime64 and a meta.json. Loading maps the files and only reads the rows of the asked date range.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from .data import COLUMNS
+
+STORE_SUFFIX = ".ohlcv"
+META_FILE = "meta.json"
+DATES_FILE = "Date.npy"
+
+
+def fileHash(filename, chunk_size=1024*1024):
+  file_hash = hashlib.sha256()
+  with open(filename, 'rb') as data_file:
+    for chunk in iter(lambda: data_file.read(chunk_size), b''):
+      file_hash.update(chunk)
+  return file_hash.hexdigest()
+
+def storePath(csv_path):
+  return csv_path + STORE_SUFFIX
+
+def isStore(path):
+  return os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+def readStoreMeta(store_path):
+  with open(os.path.join(store_path, META_FILE)) as meta_file:
+    return json.load(meta_file)
+
+def ingestCsv(csv_path, store_path=None, columns=COLUMNS):
+  #converts a csv file with a Date column and the OHLCV columns once, returns the path of the store
+  import pandas as pd
+
+  store_path = store_path or storePath(csv_path)
+  data = pd.read_csv(csv_path, usecols=['Date'] + list(columns), parse_dates=['Date'])
+  temporary_path = store_path + ".tmp%d" % os.getpid()
+  os.makedirs(temporary_path, exist_ok=True)
+  np.save(os.path.join(temporary_path, DATES_FILE), data['Date'].to_numpy().astype('datetime64[s]'))
+  for column in columns:
+    np.save(os.path.join(temporary_path, column + ".npy"), data[column].to_numpy(dtype=np.float32))
+  stat = os.stat(csv_path)
+  meta = {'columns': list(columns), 'rows': len(data), 'source': os.path.abspath(csv_path),
+          'source_size': stat.st_size, 'source_mtime': stat.st_mtime, 'source_sha256': fileHash(csv_path)}
+  with open(os.path.join(temporary_path, META_FILE), 'w') as meta_file:
+    json.dump(meta, meta_file, indent=2)
+  #replace an older store of the same csv file in one step
+  if os.path.isdir(store_path):
+    shutil.rmtree(store_path)
+  os.rename(temporary_path, store_path)
+  return store_path
+
+def findStore(csv_path):
+  #returns the store of a csv file when it exists and the csv file did not change since it was ingested, otherwise None
+  store_path = storePath(csv_path)
+  if not isStore(store_path):
+    return None
+  if os.path.exists(csv_path):
+    meta = readStoreMeta(store_path)
+    stat = os.stat(csv_path)
+    if stat.st_size != meta['source_size'] or stat.st_mtime != meta['source_mtime']:
+      return None
+  return store_path
+
+def resolveDataPath(path):
+  #a store path stays as it is, a csv path is replaced by its store when that is up to date
+  if isStore(path):
+    return path
+  return findStore(path) or path
+
+def sourceHash(path):
+  #hash of the data behind a csv file or a store, a store is identified by the csv it was created from (and its dtype)
+  if isStore(path):
+    return readStoreMeta(path)['source_sha256'] + ":float32"
+  return fileHash(path)
+
+def openStore(store_path, start=None, end=None, columns=COLUMNS):
+  #returns (dates, data) of the rows with start <= date < end, data is (rows, columns) float32
+  #the column files are memory mapped, only the rows of the date range are read from disk
+  dates = np.load(os.path.join(store_path, DATES_FILE), mmap_mode='r')
+  first = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start, 's'), side='left'))
+  last = len(dates) if end is None else int(np.searchsorted(dates, np.datetime64(end, 's'), side='left'))
+  data = np.empty((max(0, last-first), len(columns)), dtype=np.float32)
+  for index, column in enumerate(columns):
+    data[:, index] = np.load(os.path.join(store_path, column + ".npy"), mmap_mode='r')[first:last]
+  return np.array(dates[first:last]), data
@@ -0,0 +1,42 @@
+"""Selection of the distribution strategy (tpu, gpu or cpu), only initialized when it is asked for."""
+import os
+
+import tensorflow as tf
+
+def createStrategy(device=None):
+  #picks the distribution strategy, device is 'tpu', 'gpu', 'cpu' or None to detect what is available (tpu, then gpus, then cpu)
+  #nothing is initialized before this is called, so the module also runs on machines without an accelerator
+  #'workers' is a worker process of a local cpu cluster (cluster.runCluster), the cluster is described by TF_CONFIG,
+  #it has to be created before any other tensorflow op runs
+  if device is None:
+    device = os.environ.get('ETH_FORECAST_DEVICE')
+  if device == 'workers':
+    communication = tf.distribute.experimental.CommunicationOptions(implementation=tf.distribute.experimental.CommunicationImplementation.RING)
+    strategy = tf.distribute.MultiWorkerMirroredStrategy(communication_options=communication)
+    print("REPLICAS: ", strategy.num_replicas_in_sync)
+    return strategy
+  if device in (None, 'tpu'):
+    try:
+      tpu = tf.distribute.cluster_resolver.TPUClusterResolver()
+    except (ValueError, KeyError):
+      #no tpu found
+      if device == 'tpu':
+        raise
+      tpu = None
+    if tpu is not None:
+      print('Running on TPU ', tpu.cluster_spec().as_dict()['worker'])
+      tf.config.experimental_connect_to_cluster(tpu)
+      tf.tpu.experimental.initialize_tpu_system(tpu)
+      strategy = tf.distribute.TPUStrategy(tpu)
+      print("REPLICAS: ", strategy.num_replicas_in_sync)
+      return strategy
+  if device in (None, 'gpu'):
+    gpus = tf.config.list_physical_devices('GPU')
+    if len(gpus) > 1:
+      strategy = tf.distribute.MirroredStrategy()
+      print("REPLICAS: ", strategy.num_replicas_in_sync)
+      return strategy
+    if device == 'gpu' and not gpus:
+      raise ValueError("no gpu found")
+  #single gpu or cpu, tensorflow places the ops itself
+  return tf.distribute.get_strategy()
@@ -0,0 +1,144 @@
+"""Hyperparameter sweep: trials of a search space are trained in a pool of processes and ranked on their validation loss.
+
+The data of every (sequence_length, week_length) in the space is preprocessed once into the preprocessing cache and memory mapped
+read only by all workers. A trial is pruned when its val_loss after an epoch is worse than the median of the other trials on the
+same data at the same epoch (median stopping), the leaderboard csv is rewritten every time a trial is done.
+"""
+import csv
+import itertools
+import multiprocessing
+import os
+import random
+import time
+
+import numpy as np
+
+from .backtest import initWorker
+
+#the knobs of a trial and their defaults (the values the notebook used)
+MODEL_PARAMETERS = {'k': 4, 'encoder_number': 4, 'decoder_number': 4, 'dropout': 0.4, 'amount_of_heads': 16, 'size_of_head': 64,
+                    'shared_encoder': False, 'fusion': 'sum', 'attention_mode': 'joint', 'decoding': 'autoregressive'}
+TRAIN_PARAMETERS = {'batch_size': 16, 'learning_rate': 0.005}
+DATA_PARAMETERS = {'sequence_length': 42, 'week_length': 8}
+
+
+def sampleTrials(space, trials=None, seed=0):
+  #space is {parameter: list of values}, returns every combination (grid) or trials random combinations
+  unknown = set(space) - set(MODEL_PARAMETERS) - set(TRAIN_PARAMETERS) - set(DATA_PARAMETERS)
+  if unknown:
+    raise ValueError("unknown parameters in the search space: %s" % ", ".join(sorted(unknown)))
+  names = sorted(space)
+  if trials is None:
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+  rng = random.Random(seed)
+  return [{name: rng.choice(space[name]) for name in names} for _ in range(trials)]
+
+def trialConfig(parameters):
+  #splits the parameters of a trial into the config of createModel and the training parameters
+  model = {name: parameters.get(name, default) for name, default in MODEL_PARAMETERS.items()}
+  config = {'model': model}
+  config.update({name: parameters.get(name, default) for name, default in DATA_PARAMETERS.items()})
+  return config, {name: parameters.get(name, default) for name, default in TRAIN_PARAMETERS.items()}
+
+def shouldPrune(progress, trial, key, epoch, val_loss, grace_epochs=2, min_trials=3):
+  #median stopping: prune when val_loss is worse than the median of the other trials that reached this epoch
+  #only trials on the same data (cache key) are compared, the val_loss of other window lengths is over other windows
+  if epoch + 1 < grace_epochs:
+    return False
+  others = [losses[epoch] for other, (other_key, losses) in progress.items() if other != trial and other_key == key and len(losses) > epoch]
+  return len(others) >= min_trials and val_loss > float(np.median(others))
+
+def createPruningCallback(progress, trial, key, grace_epochs, min_trials):
+  import tensorflow as tf
+
+  class MedianPruning(tf.keras.callbacks.Callback):
+      #progress is shared between the workers: {trial: (cache key of its data, [val_loss of every epoch])}
+      def __init__(self):
+        super().__init__()
+        self.val_losses = []
+        self.pruned = False
+
+      def on_epoch_end(self, epoch, logs=None):
+        val_loss = float(logs['val_loss'])
+        self.val_losses.append(val_loss)
+        progress[trial] = (key, list(self.val_losses))
+        if shouldPrune(dict(progress), trial, key, epoch, val_loss, grace_epochs, min_trials):
+          self.pruned = True
+          self.model.stop_training = True
+
+  return MedianPruning()
+
+def runTrial(task):
+  #trains one trial on its memory mapped cache entry, returns a leaderboard row
+  import tensorflow as tf
+  from .cache import loadEntry
+  from .cli import compileModel, createModel
+  from .pipeline import createTrainDataset
+
+  arrays = loadEntry(task['cache_dir'], task['key'])
+  if arrays is None:
+    raise FileNotFoundError("the data of trial %d is not in the cache anymore, use a larger cache" % task['trial'])
+  config, train_parameters = trialConfig(task['parameters'])
+  config['assets'] = task['assets']
+  tf.keras.utils.set_random_seed(task['seed'])
+  asset_series = [(arrays[asset + '_daily_train'], arrays[asset + '_weekly_train']) for asset in config['assets']]
+  train_dataset, validation_dataset = createTrainDataset(asset_series, config['sequence_length'], config['week_length'],
+                                                         train_parameters['batch_size'], validation_split=0.1, seed=task['seed'], time_column=False,
+                                                         decoding=config['model']['decoding'])
+  model = createModel(config, batch_size=train_parameters['batch_size'])
+  compileModel(model, learning_rate=train_parameters['learning_rate'], batch_size=train_parameters['batch_size'])
+  pruning = createPruningCallback(task['progress'], task['trial'], task['key'], task['grace_epochs'], task['min_trials'])
+  start = time.perf_counter()
+  model.fit(train_dataset, epochs=task['epochs'], validation_data=validation_dataset, callbacks=[pruning], verbose=0)
+  #a trial without any epoch has no validation loss, it is ranked last instead of failing the worker
+  val_losses = pruning.val_losses or [float('inf')]
+  return dict(task['parameters'], trial=task['trial'], best_val_loss=min(val_losses), last_val_loss=val_losses[-1],
+              epochs=len(pruning.val_losses), pruned=pruning.pruned, seconds=time.perf_counter() - start)
+
+def writeLeaderboard(rows, filename, parameter_names):
+  fields = ['rank', 'trial'] + parameter_names + ['best_val_loss', 'last_val_loss', 'epochs', 'pruned', 'seconds']
+  with open(filename, 'w', newline='') as file:
+    writer = csv.DictWriter(file, fields, extrasaction='ignore')
+    writer.writeheader()
+    for rank, row in enumerate(sorted(rows, key=lambda row: row['best_val_loss'])):
+      writer.writerow(dict(row, rank=rank + 1))
+
+def runSweep(data_files, space, leaderboard_file, trials=None, epochs=10, processes=None, threads=None, testsize=0.13,
+             grace_epochs=2, min_trials=3, cache_dir=None, max_bytes=None, seed=0):
+  #returns the leaderboard rows, best first
+  if epochs < 1:
+    raise ValueError("a trial needs at least 1 epoch, not %d" % epochs)
+  from .cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, assetNames, cacheKey, preprocess
+  from .data import retrieve_data
+
+  cache_dir = os.path.abspath(cache_dir or DEFAULT_CACHE_DIR)
+  all_parameters = sampleTrials(space, trials, seed)
+  #one cache entry per window length in the space, shared by all trials with those lengths
+  raw_data = {name: retrieve_data(filename) for name, filename in data_files.items()}
+  keys = {}
+  for parameters in all_parameters:
+    config, _ = trialConfig(parameters)
+    lengths = (config['sequence_length'], config['week_length'])
+    if lengths not in keys:
+      keys[lengths] = cacheKey(data_files, lengths[0], lengths[1], testsize)
+  #storing an entry must not evict the entries of the other lengths, the trials need all of them
+  for lengths in keys:
+    preprocess(data_files, lengths[0], lengths[1], testsize, cache_dir, max_bytes or DEFAULT_MAX_BYTES, raw_data=raw_data, keep=tuple(keys.values()))
+  processes = processes or min(len(all_parameters), os.cpu_count() or 1)
+  threads = threads or max(1, (os.cpu_count() or 1)//processes)
+  parameter_names = sorted(space)
+  rows = []
+  context = multiprocessing.get_context('spawn')
+  with context.Manager() as manager, context.Pool(processes, initializer=initWorker, initargs=(threads,)) as pool:
+    progress = manager.dict()
+    tasks = []
+    for trial, parameters in enumerate(all_parameters):
+      config, _ = trialConfig(parameters)
+      tasks.append({'trial': trial, 'parameters': parameters, 'key': keys[(config['sequence_length'], config['week_length'])],
+                    'assets': assetNames(data_files), 'cache_dir': cache_dir, 'epochs': epochs, 'seed': seed, 'progress': progress, 'grace_epochs': grace_epochs,
+                    'min_trials': min_trials})
+    for row in pool.imap_unordered(runTrial, tasks):
+      rows.append(row)
+      writeLeaderboard(rows, leaderboard_file, parameter_names)
+      print("trial %d%s: best val_loss %.4f after %d epochs" % (row['trial'], " (pruned)" if row['pruned'] else "", row['best_val_loss'], row['epochs']))
+  return sorted(rows, key=lambda row: row['best_val_loss'])
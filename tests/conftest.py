@@ -0,0 +1,28 @@
+"""Shared fixtures: small synthetic csv files in the layout of the downloaded ones and a tiny Transformer config."""
+import os
+
+import numpy as np
+import pytest
+
+SMALL_MODEL = {'encoder_number': 1, 'decoder_number': 1, 'amount_of_heads': 2, 'size_of_head': 8}
+
+
+def writeCsvFiles(data_dir, assets=('eth', 'btc'), days=1400, seed=0):
+  #a daily and a weekly csv file per asset ("ETH-USD - daily.csv"), the weekly bars are the means of 7 days
+  import pandas as pd
+  rng = np.random.default_rng(seed)
+  for asset in assets:
+    close = 300*np.exp(np.cumsum(rng.normal(0, 0.03, days)))
+    daily = pd.DataFrame({'Date': pd.date_range('2017-11-09', periods=days, freq='D'), 'Open': close*0.99, 'High': close*1.02,
+                          'Low': close*0.97, 'Close': close, 'Adj Close': close, 'Volume': rng.uniform(1e9, 2e9, days)})
+    weekly = daily.iloc[3:3 + 7*((days - 3)//7)].groupby(np.arange(7*((days - 3)//7))//7).agg(
+      {'Date': 'first', 'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Adj Close': 'last', 'Volume': 'sum'})
+    daily.to_csv(os.path.join(data_dir, "%s-USD - daily.csv" % asset.upper()), index=False)
+    weekly.to_csv(os.path.join(data_dir, "%s-USD - weekly.csv" % asset.upper()), index=False)
+
+@pytest.fixture
+def data_dir(tmp_path):
+  directory = tmp_path / "data"
+  directory.mkdir()
+  writeCsvFiles(str(directory))
+  return str(directory)
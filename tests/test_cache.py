@@ -0,0 +1,21 @@
+from eth_forecast.backtest import foldCutoffs, prepareFolds
+from eth_forecast.cache import cacheKey, loadEntry, preprocess
+from eth_forecast.cli import dataFiles
+
+
+def testPreprocessKeepsTheOtherEntries(data_dir, tmp_path):
+  #a cache that only has room for one entry: the entries in keep survive, the others are evicted
+  cache_dir, data_files = str(tmp_path / "cache"), dataFiles(data_dir)
+  first, _ = preprocess(data_files, 42, 8, 0.13, cache_dir)
+  second_key = cacheKey(data_files, 28, 8, 0.13)
+  second, _ = preprocess(data_files, 28, 8, 0.13, cache_dir, max_bytes=1, keep=(first, second_key))
+  assert second == second_key
+  assert loadEntry(cache_dir, first) is not None and loadEntry(cache_dir, second) is not None
+  preprocess(data_files, 35, 8, 0.13, cache_dir, max_bytes=1, keep=(second,))
+  assert loadEntry(cache_dir, first) is None and loadEntry(cache_dir, second) is not None
+
+def testBacktestFoldsStayCached(data_dir, tmp_path):
+  cache_dir = str(tmp_path / "cache")
+  folds = prepareFolds(dataFiles(data_dir), {'sequence_length': 42, 'week_length': 8}, foldCutoffs(3, 0.6, 0.8), cache_dir=cache_dir, max_bytes=1)
+  assert len({fold['key'] for fold in folds}) == 3
+  assert all(loadEntry(cache_dir, fold['key']) is not None for fold in folds)
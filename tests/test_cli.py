@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import pytest
+
+from eth_forecast.cli import EXPORT_DIR, loadConfig, main, saveConfig
+
+from .conftest import SMALL_MODEL
+
+
+def testTrainWithProfiledBlocksExports(data_dir, tmp_path):
+  output_dir, log_dir = str(tmp_path / "artifacts"), str(tmp_path / "logs")
+  main(['--output-dir', output_dir, 'prepare', '--data-dir', data_dir, '--cache-dir', str(tmp_path / "cache")])
+  config = loadConfig(output_dir)
+  config['model'].update(SMALL_MODEL)
+  saveConfig(output_dir, config)
+  main(['--output-dir', output_dir, 'train', '--epochs', '1', '--batch-size', '64', '--device', 'cpu', '--seed', '0', '--log-dir', log_dir,
+        '--profile-blocks', '--export'])
+  assert os.path.exists(os.path.join(output_dir, EXPORT_DIR, "saved_model.pb"))
+  assert os.path.exists(os.path.join(log_dir, "metrics.jsonl"))
+
+  import tensorflow as tf
+  exported = tf.saved_model.load(os.path.join(output_dir, EXPORT_DIR))
+  assert not any('block_calls' in variable.name for variable in exported.variables)
+  assert all(np.all(np.isfinite(variable.numpy())) for variable in exported.trainable_variables)
+
+def testInt8QuantizeOfJointAttentionIsAUsageError(tmp_path, capsys):
+  output_dir = str(tmp_path / "artifacts")
+  os.makedirs(output_dir)
+  saveConfig(output_dir, {'model': {}, 'sequence_length': 42, 'week_length': 8})
+  with pytest.raises(SystemExit) as exit_info:
+    main(['--output-dir', output_dir, 'quantize', '--mode', 'int8'])
+  assert exit_info.value.code == 2
+  assert "--attention-mode time or axial" in capsys.readouterr().err
+
+@pytest.mark.parametrize('flags, shared_encoder', [([], None), (['--shared-encoder'], True), (['--no-shared-encoder'], False)])
+def testSharedEncoderFlags(monkeypatch, flags, shared_encoder):
+  #None keeps the shared_encoder of the stored config
+  import eth_forecast.cli
+  calls = []
+  monkeypatch.setattr(eth_forecast.cli, 'train', lambda *args: calls.append(args))
+  main(['train'] + flags)
+  assert calls[0][13] is shared_encoder
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from eth_forecast.data import buildInputWindows, buildTargetWindows, createTimeEmbeddingsInput, slidingWindows
+
+
+def referenceInputWindows(data_daily, data_weekly, sequence_length, week_length, time_column=True):
+  #the per sample loop the windows were built with before buildInputWindows, it stops at the first incomplete sample
+  all_sequences = []
+  for i in range(data_daily.shape[0]):
+    slice_daily = data_daily[i:i+sequence_length]
+    if slice_daily.shape[0] < sequence_length:
+      break
+    slice_weekly = data_weekly[i//7:i//7+week_length]
+    combined_data = np.concatenate((slice_weekly, slice_daily))
+    if combined_data.shape[0] < sequence_length+week_length:
+      break
+    if time_column:
+      combined_data = np.concatenate((createTimeEmbeddingsInput(combined_data, sequence_length, week_length), combined_data), axis=-1)
+    all_sequences.append(combined_data)
+  return np.array(all_sequences, dtype=np.float32).reshape(-1, week_length+sequence_length, data_daily.shape[1] + time_column)
+
+def referenceTargetWindows(data, horizon):
+  return np.array([np.reshape(data[i:i+horizon], (horizon, 1)) for i in range(len(data)-horizon+1)], dtype=np.float32).reshape(-1, horizon, 1)
+
+@pytest.mark.parametrize('days, weeks', [(300, 60), (300, 30), (300, 9), (300, 8), (300, 7), (40, 60), (41, 60)])
+@pytest.mark.parametrize('time_column', [True, False])
+def testInputWindowsMatchTheLoop(days, weeks, time_column):
+  #(300, 30) and (300, 9) run out of weeks before days, (300, 7) and (40, 60) do not have a single sample
+  rng = np.random.default_rng(days + weeks)
+  data_daily, data_weekly = rng.normal(size=(days, 5)), rng.normal(size=(weeks, 5))
+  windows = buildInputWindows(data_daily, data_weekly, 42, 8, time_column=time_column)
+  reference = referenceInputWindows(data_daily, data_weekly, 42, 8, time_column)
+  assert windows.dtype == np.float32
+  assert windows.shape == reference.shape
+  np.testing.assert_array_equal(windows, reference)
+
+def testSlidingWindowsMatchTheLoop():
+  data = np.arange(60).reshape(20, 3)
+  windows = slidingWindows(data, 6)
+  assert windows.shape == (15, 6, 3)
+  for i in range(15):
+    np.testing.assert_array_equal(windows[i], data[i:i+6])
+  assert slidingWindows(data, 21).shape == (0, 21, 3)
+
+@pytest.mark.parametrize('length', [30, 7, 6])
+def testTargetWindowsMatchTheLoop(length):
+  data = np.random.default_rng(length).normal(size=length)
+  np.testing.assert_array_equal(buildTargetWindows(data, 7), referenceTargetWindows(data, 7))
+  #amount drops the last windows (the decoder inputs of which the target is not known)
+  np.testing.assert_array_equal(buildTargetWindows(data, 7, amount=len(data)-7), referenceTargetWindows(data, 7)[:max(0, len(data)-7)])
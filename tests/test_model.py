@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from eth_forecast.data import createTimeEmbeddingsInput, createTimeEmbeddingsOutput
+from eth_forecast.model import Transformer
+
+from .conftest import SMALL_MODEL
+
+SEQUENCE_LENGTH, WEEK_LENGTH = 42, 8
+
+
+def randomInputs(amount, assets=2, seed=0):
+  rng = np.random.default_rng(seed)
+  windows = tuple(rng.normal(size=(amount, SEQUENCE_LENGTH + WEEK_LENGTH, 5)).astype(np.float32) for _ in range(assets))
+  return windows, rng.normal(size=(amount, 1, 1)).astype(np.float32)
+
+def createModel(seed=0, **kwargs):
+  tf.keras.utils.set_random_seed(seed)
+  return Transformer(sequence_length=SEQUENCE_LENGTH, week_length=WEEK_LENGTH, **dict(SMALL_MODEL, **kwargs))
+
+def recomputedForecast(model, windows, decoder_start, horizon=7):
+  #the model called on the whole growing decoder input every day, the last position is the forecast of that day
+  decoder_input = decoder_start
+  for _ in range(horizon):
+    prediction = model(windows + (decoder_input,), training=False).numpy()[:, -1:, :]
+    decoder_input = np.concatenate([decoder_input, prediction.astype(np.float32)], axis=1)
+  return decoder_input[:, 1:, 0]
+
+@pytest.mark.parametrize('attention_mode', ['joint', 'time'])
+def testCachedForecastMatchesTheRecomputedOne(attention_mode):
+  model = createModel(time_table=True, attention_mode=attention_mode)
+  windows, decoder_start = randomInputs(5)
+  reference = recomputedForecast(model, windows, decoder_start)
+  np.testing.assert_allclose(model.forecast(windows + (decoder_start,), horizon=7, batch_size=2), reference, rtol=1e-4, atol=1e-5)
+  forecast = model.forecastFunction(7)
+  np.testing.assert_allclose(forecast(*windows, decoder_start).numpy(), reference, rtol=1e-4, atol=1e-5)
+  np.testing.assert_allclose(model.forecast(windows + (decoder_start,), horizon=3), reference[:, :3], rtol=1e-4, atol=1e-5)
+
+def testTimeTablesMatchTheTimeColumn():
+  #the same weights with the Time2Vec of the time column per sample and as a table per position
+  windows, _ = randomInputs(4, seed=1)
+  decoder_input = np.random.default_rng(2).normal(size=(4, 7, 1)).astype(np.float32)
+  input_time = np.broadcast_to(createTimeEmbeddingsInput(None, SEQUENCE_LENGTH, WEEK_LENGTH), (4, SEQUENCE_LENGTH + WEEK_LENGTH, 1))
+  decoder_time = np.broadcast_to(createTimeEmbeddingsOutput(None, SEQUENCE_LENGTH, WEEK_LENGTH), (4, 7, 1))
+  column_inputs = tuple(np.concatenate([input_time, window], axis=-1) for window in windows) + (np.concatenate([decoder_time, decoder_input], axis=-1),)
+  column_model, table_model = createModel(time_table=False), createModel(seed=1, time_table=True)
+  expected = column_model(column_inputs, training=False).numpy()
+  table_model(windows + (decoder_input,))
+  table_model.set_weights(column_model.get_weights())
+  np.testing.assert_allclose(table_model(windows + (decoder_input,), training=False).numpy(), expected, rtol=1e-4, atol=1e-5)
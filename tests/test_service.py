@@ -0,0 +1,44 @@
+import numpy as np
+
+from eth_forecast.cache import preprocess
+from eth_forecast.cli import dataFiles
+from eth_forecast.data import prepareTestDataX
+from eth_forecast.model import Transformer
+from eth_forecast.service import ForecastService, RingBuffer, seriesNames
+
+from .conftest import SMALL_MODEL
+
+
+def testRingBufferRowsKeepTheirIndex():
+  buffer = RingBuffer(4, 1)
+  buffer.extend(np.arange(10)[:, np.newaxis])
+  buffer.append([10])
+  assert buffer.total == 11
+  assert buffer.contains(7, 4) and not buffer.contains(6, 4)
+  np.testing.assert_array_equal(buffer.rows(7, np.empty((4, 1)))[:, 0], [7, 8, 9, 10])
+  np.testing.assert_array_equal(buffer.window()[:, 0], [7, 8, 9, 10])
+
+def testWarmStartedWindowIsTheLastTestWindow(data_dir, tmp_path):
+  sequence_length, week_length = 42, 8
+  _, arrays = preprocess(dataFiles(data_dir), sequence_length, week_length, 0.13, cache_dir=str(tmp_path / "cache"))
+  model = Transformer(time_table=True, sequence_length=sequence_length, week_length=week_length, **SMALL_MODEL)
+  window_length = sequence_length + week_length
+  model((np.zeros((1, window_length, 5), np.float32),)*2 + (np.zeros((1, 7, 1), np.float32),))
+  series = seriesNames(model.assets)
+  scalers = {name: (arrays[name + "_scaler_mean"], arrays[name + "_scaler_scale"]) for name in series}
+  service = ForecastService(model, scalers, sequence_length, week_length)
+
+  #the last test window ends 7 days before the end of the test split (they are its targets), the service gets the bars up to
+  #that day and the weeks that started before it (daily row 4+7j is the first day of weekly row j)
+  windows = {asset: prepareTestDataX(arrays[asset + "_daily_test"], arrays[asset + "_weekly_test"], sequence_length, week_length, time_column=False)
+             for asset in model.assets}
+  last_day = week_length*6 + 6 + len(windows['eth']) - 1 + sequence_length
+  scaled_series = {}
+  for asset in model.assets:
+    scaled_series[asset + "_daily"] = arrays[asset + "_daily_test"][:last_day]
+    scaled_series[asset + "_weekly"] = arrays[asset + "_weekly_test"][:(last_day - 1 - 4)//7 + 1]
+  service.warmStart(scaled_series)
+  assert service.isReady()
+  service.forecast()
+  for asset, inputs in zip(model.assets, service.inputs):
+    np.testing.assert_array_equal(inputs[0], windows[asset][-1])
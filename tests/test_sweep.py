@@ -0,0 +1,14 @@
+from eth_forecast.sweep import shouldPrune
+
+
+def testPruningComparesTrialsOnTheSameData():
+  #the trials on the longer windows have much lower losses, they must not prune the trials on the short ones
+  progress = {0: ('short', [1.0, 0.9]), 1: ('short', [1.1, 1.0]), 2: ('short', [1.2, 1.1]),
+              3: ('long', [0.2, 0.1]), 4: ('long', [0.3, 0.2]), 5: ('long', [0.4, 0.3])}
+  assert not shouldPrune(progress, 6, 'short', 1, 1.0)
+  assert shouldPrune(progress, 6, 'short', 1, 1.05)
+  assert shouldPrune(progress, 6, 'long', 1, 1.0)
+  #not enough trials on the same data yet
+  assert not shouldPrune(progress, 6, 'other', 1, 100.0)
+  #the grace epochs are never pruned
+  assert not shouldPrune(progress, 6, 'short', 0, 100.0)